@@ -0,0 +1,417 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from mlxtend.frequent_patterns import association_rules
+
+from catalog_matcher import CatalogMatcher, CatalogIndex
+from jobs import StageProgress
+from mining import MINING_ENGINES, MiningPreflight
+from transactions import build_text_soups, transaction_keys
+
+# Pipeline stages, in order, as reported to /analyze/{job_id}
+STAGES = ("extract", "encode", "mine", "rules", "validate")
+SWEEP_STAGES = ("extract", "encode", "mine", "rules", "grid")
+
+# Orderings for the top_k rule limit: metric first, then the other one, then support
+RULE_RANKINGS = {"lift": ("lift", "confidence", "support"), "confidence": ("confidence", "lift", "support")}
+
+
+class BudgetExceeded(Exception):
+    """A mining run predicted to exceed the itemset / memory budget that could not (or may not) be adjusted."""
+
+
+def detect_columns(df):
+    """Pick the transaction id column and the item columns from the header names."""
+    # Attempt to find Transaction and Item columns (refined for Indonesian/English)
+    id_keywords = ['id', 'trans', 'client', 'pelanggan', 'user', 'no', 'kode', 'nama']
+
+    # Try to find best fit for ID (Transaction)
+    id_col = next((c for c in df.columns if any(k in str(c).lower() for k in id_keywords)), df.columns[0])
+
+    # Identify all potential item columns (Event, Paket, Service, etc.)
+    item_keywords = ['item', 'nama', 'product', 'paket', 'event', 'layanan', 'service', 'barang', 'produk']
+    item_cols = [c for c in df.columns if any(k in str(c).lower() for k in item_keywords) and c != id_col]
+
+    if not item_cols:
+        item_cols = [next((c for c in df.columns if c != id_col), df.columns[0])]
+    return id_col, item_cols
+
+
+def prepare_dataset(dataset):
+    """Clean column names, pick id/item columns, drop rows without id and detect long/wide format."""
+    # Ensure column names are clean. set_axis returns a new frame sharing the data
+    # (copy-on-write): the uploaded dataset, possibly memory-mapped, is never copied
+    df = dataset.set_axis([str(c).strip() for c in dataset.columns], axis=1)
+
+    id_col, item_cols = detect_columns(df)
+    print(f"DEBUG: Using ID column: {id_col}")
+    print(f"DEBUG: Using Item columns: {item_cols}")
+
+    # Preprocessing:
+    # 1. Drop rows where ID is missing
+    df = df.dropna(subset=[id_col])
+
+    # Check if Long or Wide format
+    # Long format: ID appears multiple times (multiple rows per client) -> Merge columns in row to form item
+    # Wide format: ID is unique (one row per client) -> Columns are separate items
+    is_long_format = bool(df[id_col].duplicated().any())
+
+    print(f"DEBUG: Dataset format detected as {'LONG (Multi-row transactions)' if is_long_format else 'WIDE (Single-row transactions)'}")
+    return df, id_col, item_cols, is_long_format
+
+
+def extract_keyed_transactions(df, id_col, item_cols, is_long_format, catalog_matcher):
+    """
+    Catalog items per transaction key (client id in long format, row label in
+    wide format) for a prepared dataset. Transactions without catalog matches are
+    left out, like in extract_transactions.
+    """
+    text_soups = build_text_soups(df, id_col, item_cols, is_long_format)
+    keyed = {}
+    for key, text_soup in zip(transaction_keys(df, id_col, is_long_format), text_soups):
+        identified_items = catalog_matcher.match(text_soup)
+        if identified_items:
+            keyed[key] = identified_items
+    return keyed
+
+
+def extract_transactions(dataset, catalog_matcher, progress=None):
+    """Turn the uploaded sheet into a list of transactions (lists of catalog product keys)."""
+    df, id_col, item_cols, is_long_format = prepare_dataset(dataset)
+
+    # Build one text soup per transaction in a single columnar pass
+    # Long format: all of a client's rows are merged; Wide format: one row per transaction
+    text_soups = build_text_soups(df, id_col, item_cols, is_long_format)
+
+    transactions = []
+    for i, text_soup in enumerate(text_soups):
+        if progress is not None and i % 5000 == 0:
+            progress.update(i / len(text_soups))
+        # ONLY use catalog items - no fallback to raw text
+        # The matcher finds exact product names and significant name components
+        # (e.g. "Engagement" for "Engagement, Siraman, Midodareni, ...") in one pass
+        identified_items = catalog_matcher.match(text_soup)
+
+        # Skip transactions with no catalog matches (will be filtered out later)
+        if identified_items:
+            transactions.append(list(identified_items))
+    return transactions
+
+
+def encode_transactions(transactions, sparse=False):
+    """One-hot TransactionEncoder frame of the transactions (sparse: CSR-backed, never densified)."""
+    from mlxtend.preprocessing import TransactionEncoder
+
+    te = TransactionEncoder()
+    te.fit(transactions)
+    if sparse:
+        # CSR matrix -> sparse DataFrame; the engines mine it without densifying
+        te_ary = te.transform(transactions, sparse=True)
+        return pd.DataFrame.sparse.from_spmatrix(te_ary, columns=te.columns_)
+    te_ary = te.transform(transactions)
+    return pd.DataFrame(te_ary, columns=te.columns_)
+
+
+def plan_mining(preflight, params, min_support, adjust=True):
+    """
+    Fit a run into params' max_itemsets / max_memory_mb (None: no limit) using
+    the MiningPreflight bounds. With adjust, the itemset length is capped first
+    (down to pairs, which is what /recommendations mostly uses), then min_support
+    is raised to the lowest value that fits. Otherwise, or if nothing fits,
+    raises BudgetExceeded. Returns the limits report (see run_analysis).
+    """
+    algorithm = params["algorithm"]
+    max_len = params.get("max_len")
+    max_itemsets, max_memory_mb = params.get("max_itemsets"), params.get("max_memory_mb")
+
+    def fits(estimate):
+        return (max_itemsets is None or estimate["itemsets"] <= max_itemsets) and \
+            (max_memory_mb is None or estimate["memory_mb"] <= max_memory_mb)
+
+    def refuse(estimate, reason):
+        return BudgetExceeded(
+            f"{reason}: predicted up to {estimate['itemsets']} itemsets and ~{estimate['memory_mb']} MB, "
+            f"budget is {max_itemsets} itemsets and {max_memory_mb} MB. Raise min_support or set max_len.")
+
+    requested = (min_support, max_len)
+    applied = []
+    estimate = preflight.estimate(min_support, max_len, algorithm)
+    if not fits(estimate):
+        if not adjust:
+            raise refuse(estimate, "Run refused")
+        longest = len(estimate["by_length"])
+        for cap in range(min(longest, max_len or longest) - 1, 1, -1):
+            capped = preflight.estimate(min_support, cap, algorithm)
+            if fits(capped):
+                max_len, estimate = cap, capped
+                applied.append("max_len")
+                break
+        else:
+            # Even pairs alone are too many: keep pairs and raise min_support
+            if longest > 2 and (max_len is None or max_len > 2):
+                max_len = 2
+                applied.append("max_len")
+            # Smallest transaction count (support = count / n) whose estimate fits
+            low, high = preflight.min_count(min_support), preflight.n
+            if not fits(preflight.estimate(high / preflight.n, max_len, algorithm)):
+                raise refuse(estimate, "No min_support fits the budget")
+            while low < high:
+                mid = (low + high) // 2
+                if fits(preflight.estimate(mid / preflight.n, max_len, algorithm)):
+                    high = mid
+                else:
+                    low = mid + 1
+            min_support = low / preflight.n
+            estimate = preflight.estimate(min_support, max_len, algorithm)
+            applied.append("min_support")
+        print(f"DEBUG: Mining budget: {requested} -> min_support={min_support}, max_len={max_len} ({applied})")
+
+    return {
+        "min_support": min_support,
+        "max_len": max_len,
+        "requested_min_support": requested[0],
+        "requested_max_len": requested[1],
+        "top_k": params.get("top_k"),
+        "rank_by": params.get("rank_by", "lift"),
+        "max_itemsets": max_itemsets,
+        "max_memory_mb": max_memory_mb,
+        "estimated_itemsets": estimate["itemsets"],
+        "estimated_memory_mb": estimate["memory_mb"],
+        # Which limits changed the result: "max_len", "min_support" (auto-adjusted), "top_k"
+        "applied": applied,
+    }
+
+
+def top_k_rules(rules, top_k, rank_by="lift"):
+    """The top_k rules by rank_by (see RULE_RANKINGS), kept in their original order."""
+    if top_k is None or len(rules) <= top_k:
+        return rules
+    keys = RULE_RANKINGS[rank_by]
+    ranked = sorted(range(len(rules)), key=lambda i: tuple(rules[i][k] for k in keys), reverse=True)
+    keep = set(ranked[:top_k])
+    return [rule for i, rule in enumerate(rules) if i in keep]
+
+
+def run_analysis(dataset, products, params, progress=None):
+    """
+    Full mining pipeline: extraction -> one-hot encoding -> frequent itemsets ->
+    association rules -> catalog validation.
+
+    Pure function of its inputs so it can run in a worker process: it never
+    touches the server's globals or files. `params` holds min_support,
+    min_confidence, sparse and algorithm, plus the optional limits max_len,
+    top_k / rank_by and the budget max_itemsets / max_memory_mb / on_budget
+    ("adjust" or "refuse", see plan_mining), and trace_memory; `progress` is an
+    optional shared dict for stage reporting and cancellation. result["limits"]
+    reports the parameters actually used and which limits applied;
+    result["stage_seconds"] the time taken by each stage that ran.
+    """
+    tracker = StageProgress(progress, STAGES)
+    catalog_index = CatalogIndex(products)
+
+    tracker.stage("extract")
+    transactions = extract_transactions(dataset, CatalogMatcher(products.keys()), tracker)
+
+    # Collect all unique items and validate against catalog
+    unique_items = sorted(list(set([item for sublist in transactions for item in sublist])))
+
+    # STRICT VALIDATION: Only include items that exist in catalog
+    validated_items = [item for item in unique_items if catalog_index.is_catalog_item(item)]
+    print(f"DEBUG: Total unique items: {len(unique_items)}, Validated (catalog): {len(validated_items)}")
+
+    result = {
+        "rules": [],
+        "items": validated_items,
+        # Every extracted transaction, kept for the debug_transactions.json audit log
+        "transactions": transactions,
+        "algorithm": params["algorithm"],
+        "encoding": "sparse" if params["sparse"] else "dense",
+        "peak_memory_mb": None,
+        "frequent_itemsets": [],
+        "limits": None,
+    }
+
+    # Filter out transactions with only 1 item (Apriori needs at least 2)
+    transactions = [t for t in transactions if len(t) > 1]
+
+    if not transactions:
+        result["stage_seconds"] = tracker.done()
+        result["message"] = "Pola tidak ditemukan. Pastikan satu Client memiliki minimal 2 item/transaksi yang berbeda agar bisa dianalisis."
+        return result
+
+    # Peak memory of encoding + mining (the part that grows with transactions x items), on
+    # request only: tracemalloc slows down every allocation of the stages it measures
+    trace_memory = params.get("trace_memory", False)
+    already_tracing = tracemalloc.is_tracing()
+    if trace_memory:
+        if not already_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    try:
+        # One-Hot Encoding
+        tracker.stage("encode")
+        one_hot_df = encode_transactions(transactions, params["sparse"])
+
+        # Frequent itemsets (Apriori / FP-Growth / Eclat), within the budget
+        tracker.stage("mine")
+        limits = plan_mining(MiningPreflight(one_hot_df), params, params["min_support"],
+                             adjust=params.get("on_budget", "adjust") == "adjust")
+        result["limits"] = limits
+        frequent_itemsets = MINING_ENGINES[params["algorithm"]](one_hot_df, limits["min_support"], limits["max_len"])
+
+        # Association Rules
+        tracker.stage("rules")
+        if not frequent_itemsets.empty:
+            res_rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=params["min_confidence"])
+    finally:
+        if trace_memory:
+            result["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 3)
+            if not already_tracing:
+                tracemalloc.stop()
+
+    print(f"DEBUG: {result['encoding']} encoding, {one_hot_df.shape[0]}x{one_hot_df.shape[1]}, {params['algorithm']}: {len(frequent_itemsets)} itemsets, peak memory {result['peak_memory_mb']} MB")
+
+    if frequent_itemsets.empty:
+        result["stage_seconds"] = tracker.done()
+        result["message"] = "No frequent itemsets found with this support level"
+        return result
+
+    result["frequent_itemsets"] = [
+        {"itemset": sorted(itemset), "support": float(support)}
+        for itemset, support in zip(frequent_itemsets['itemsets'], frequent_itemsets['support'])
+    ]
+
+    # Convert to JSON friendly format and VALIDATE against catalog
+    tracker.stage("validate")
+    processed_rules = []
+    for _, row in res_rules.iterrows():
+        rule_data = {
+            "antecedents": list(row['antecedents']),
+            "consequents": list(row['consequents']),
+            "support": float(row['support']),
+            "confidence": float(row['confidence']),
+            "lift": float(row['lift'])
+        }
+
+        # VALIDATE: Check if all items in this rule exist in catalog
+        all_items_in_rule = list(row['antecedents']) + list(row['consequents'])
+        all_valid = all(catalog_index.is_catalog_item(str(item)) for item in all_items_in_rule)
+
+        if all_valid:
+            processed_rules.append(rule_data)
+        else:
+            print(f"DEBUG: Skipping rule with non-catalog items: {all_items_in_rule}")
+    result["stage_seconds"] = tracker.done()
+
+    print(f"DEBUG: Total rules generated: {len(res_rules)}, Validated (catalog): {len(processed_rules)}")
+    result["rules"] = top_k_rules(processed_rules, limits["top_k"], limits["rank_by"])
+    if len(result["rules"]) < len(processed_rules):
+        limits["applied"].append("top_k")
+    limits["rules_before_top_k"] = len(processed_rules)
+    result["message"] = f"Analysis complete. Found {len(result['rules'])} rules and {len(validated_items)} unique items."
+    if limits["applied"]:
+        result["message"] += f" Limits applied: {', '.join(limits['applied'])}."
+    return result
+
+
+def _sweep_cell(min_support, min_confidence, itemsets_count, mask, confidence, lift, rule_items, rules):
+    cell = {
+        "min_support": min_support,
+        "min_confidence": min_confidence,
+        "rules_count": int(mask.sum()),
+        "itemsets_count": itemsets_count,
+        "items_covered": int(rule_items[mask].any(axis=0).sum()) if rule_items.size else 0,
+        "avg_confidence": None,
+        "avg_lift": None,
+        "max_lift": None,
+        "top_rule": None,
+    }
+    if cell["rules_count"]:
+        best = int(np.flatnonzero(mask)[np.argmax(lift[mask])])
+        cell.update(
+            avg_confidence=round(float(confidence[mask].mean()), 4),
+            avg_lift=round(float(lift[mask].mean()), 4),
+            max_lift=round(float(lift[best]), 4),
+            top_rule=rules[best],
+        )
+    return cell
+
+
+def run_sweep(dataset, products, params, progress=None):
+    """
+    Rule counts and summaries for every (min_support, min_confidence) pair of
+    `params["supports"]` x `params["confidences"]`, for the tuning heatmap.
+
+    Itemsets are mined once at the lowest support and rules derived once at the
+    lowest confidence. A rule's support is the support of its whole itemset, so
+    the rules /analyze would return for a cell are exactly the rules here whose
+    support and confidence reach the cell's thresholds.
+    """
+    tracker = StageProgress(progress, SWEEP_STAGES)
+    catalog_index = CatalogIndex(products)
+    supports = sorted(set(params["supports"]))
+    confidences = sorted(set(params["confidences"]))
+
+    tracker.stage("extract")
+    transactions = extract_transactions(dataset, CatalogMatcher(products.keys()), tracker)
+    transactions = [t for t in transactions if len(t) > 1]
+
+    itemset_support = np.empty(0)
+    rules = []
+    if transactions:
+        tracker.stage("encode")
+        one_hot_df = encode_transactions(transactions, params["sparse"])
+
+        # A sweep is never adjusted (that would change the grid): over budget is refused
+        tracker.stage("mine")
+        plan_mining(MiningPreflight(one_hot_df), params, supports[0], adjust=False)
+        frequent_itemsets = MINING_ENGINES[params["algorithm"]](one_hot_df, supports[0], params.get("max_len"))
+
+        tracker.stage("rules")
+        if not frequent_itemsets.empty:
+            itemset_support = frequent_itemsets['support'].to_numpy()
+            res_rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=confidences[0])
+            for antecedents, consequents, support, confidence, lift in zip(
+                    res_rules['antecedents'], res_rules['consequents'], res_rules['support'],
+                    res_rules['confidence'], res_rules['lift']):
+                # Same catalog validation as run_analysis
+                if all(catalog_index.is_catalog_item(str(item)) for item in list(antecedents) + list(consequents)):
+                    rules.append({
+                        "antecedents": sorted(antecedents),
+                        "consequents": sorted(consequents),
+                        "support": float(support),
+                        "confidence": float(confidence),
+                        "lift": float(lift),
+                    })
+
+    tracker.stage("grid")
+    support = np.array([r["support"] for r in rules])
+    confidence = np.array([r["confidence"] for r in rules])
+    lift = np.array([r["lift"] for r in rules])
+    # rules x items membership, for the number of distinct items a cell's rules cover
+    items = sorted({item for r in rules for item in r["antecedents"] + r["consequents"]})
+    item_index = {item: i for i, item in enumerate(items)}
+    rule_items = np.zeros((len(rules), len(items)), dtype=bool)
+    for i, r in enumerate(rules):
+        rule_items[i, [item_index[item] for item in r["antecedents"] + r["consequents"]]] = True
+
+    cells = []
+    for min_support in supports:
+        itemsets_count = int((itemset_support >= min_support).sum())
+        above_support = support >= min_support
+        for min_confidence in confidences:
+            mask = above_support & (confidence >= min_confidence)
+            cells.append(_sweep_cell(min_support, min_confidence, itemsets_count, mask, confidence, lift, rule_items, rules))
+    tracker.done()
+
+    print(f"DEBUG: Sweep {len(supports)}x{len(confidences)}: {len(itemset_support)} itemsets at support {supports[0]}, {len(rules)} rules at confidence {confidences[0]}")
+    return {
+        "supports": supports,
+        "confidences": confidences,
+        "transactions_count": len(transactions),
+        "algorithm": params["algorithm"],
+        "encoding": "sparse" if params["sparse"] else "dense",
+        "cells": cells,
+        "message": f"Sweep complete: {len(cells)} parameter combinations from one mining pass."
+    }
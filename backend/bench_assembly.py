@@ -0,0 +1,49 @@
+"""
+Benchmark: columnar transaction text assembly vs the old groupby/iterrows loop.
+
+Usage: python bench_assembly.py [rows ...]   (default: 10000 100000 1000000)
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from test_transactions import build_text_soups_rowwise
+from transactions import build_text_soups
+
+EVENTS = ['Wedding', 'Engagement', 'Prewedding', 'Pengajian', 'Akad', 'Siraman', None]
+PAKET = ['Platinum', 'Signature', 'Signature Plus', 'Gold', 'Titanium', 'Photo Only', 'Photo Video', None]
+
+
+def make_dataset(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    # ~3 rows per client so the long format has real groups
+    clients = rng.integers(0, max(1, n_rows // 3), n_rows)
+    return pd.DataFrame({
+        'Client': [f"Client {c}" for c in clients],
+        'Event': rng.choice(np.array(EVENTS, dtype=object), n_rows),
+        'Paket': rng.choice(np.array(PAKET, dtype=object), n_rows),
+        'Harga Paket': rng.choice(np.array([1000000, 2500000, None], dtype=object), n_rows),
+    })
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    item_cols = ['Event', 'Paket', 'Harga Paket']
+
+    print(f"{'rows':>9} {'format':>6} {'rowwise (s)':>12} {'columnar (s)':>13} {'speedup':>8}")
+    for n_rows in sizes:
+        df = make_dataset(n_rows)
+        for is_long_format in (True, False):
+            t_old, old = timed(build_text_soups_rowwise, df, 'Client', item_cols, is_long_format)
+            t_new, new = timed(build_text_soups, df, 'Client', item_cols, is_long_format)
+            assert old == new, "columnar assembly diverged from the row loop"
+            fmt = 'long' if is_long_format else 'wide'
+            print(f"{n_rows:>9} {fmt:>6} {t_old:>12.3f} {t_new:>13.3f} {t_old / t_new:>7.1f}x")
@@ -0,0 +1,198 @@
+"""
+Benchmark: /upload-catalog SQL parsing, the streaming tokenizer (sql_dump) vs
+the old decode + one regex over the whole dump, on packages.sql scaled up to
+a few sizes (its rows repeated with fresh ids and names, 500 rows per INSERT).
+
+Reports seconds, MB/s and peak Python memory (tracemalloc, measured in a
+separate run) for each, and the tokenizer's peak with the rows dropped as
+they come; the parsed catalogs must be equal.
+
+Then, for catalogs of --edit-megabytes with rules.json published, the cost
+of a one-product price edit: a full replacement (indexes rebuilt, table
+materialized again) vs update_catalog (only what the changed key reaches);
+the resulting recommendation tables must be equal.
+
+Usage: python bench_catalog.py [--megabytes 1 10 50] [--edit-megabytes 0.05 0.2] [--repeat 3] [--out FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench_pipeline import RESULTS_DIR, git_commit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PACKAGES_SQL = os.path.join(os.path.dirname(HERE), "packages.sql")
+ROWS_PER_INSERT = 500
+
+
+def legacy_catalog(contents):
+    """The old .sql branch of upload_catalog: whole dump decoded, rigid five-column pattern."""
+    content_str = contents.decode('utf-8')
+    pattern = re.compile(r"\(\s*(\d+)\s*,\s*'([^']*)'\s*,\s*'([^']*)'\s*,\s*([\d\.]+)\s*,\s*'([^']*)'\s*\)")
+    products = {}
+    for pid, name, desc, price, image in pattern.findall(content_str):
+        name = name.strip()
+        products[name] = {"id": pid, "name": name, "category": "", "price": price,
+                          "description": desc.replace('\\r\\n', '\n'), "image": image}
+    return products
+
+
+def streaming_catalog(path):
+    from main import sql_catalog_products
+    with open(path, "rb") as f:
+        return dict(sql_catalog_products(f))
+
+
+def streaming_rows(path):
+    """Rows read and dropped: the parser's own memory, without the catalog."""
+    from sql_dump import iter_insert_rows
+    with open(path, "rb") as f:
+        return sum(1 for _ in iter_insert_rows(f))
+
+
+def write_scaled_dump(path, megabytes):
+    """packages.sql with its rows repeated until the file reaches `megabytes`."""
+    with open(PACKAGES_SQL, encoding="utf-8") as f:
+        dump = f.read()
+    start = dump.index("INSERT INTO")
+    header_end = dump.index("VALUES", start) + len("VALUES")
+    rows = re.findall(r"^\((\d+), '([^']*)'(.*)\)[,;]$", dump[header_end:], re.MULTILINE)
+    with open(path, "w", encoding="utf-8") as out:
+        out.write(dump[:start])
+        n = 0
+        while out.tell() < megabytes * 1024 * 1024:
+            out.write(dump[start:header_end] + "\n")
+            batch = []
+            for _ in range(ROWS_PER_INSERT):
+                _, name, rest = rows[n % len(rows)]
+                batch.append(f"({n + 1}, '{name} {n // len(rows)}'{rest})")
+                n += 1
+            out.write(",\n".join(batch) + ";\n\n")
+    return n
+
+
+def measure(fn, repeat):
+    """(best of `repeat` seconds, peak traced bytes of one more run, result)."""
+    best = result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def edit_case(path, workdir, repeat):
+    """Seconds of a one-product price edit: full replacement vs update_catalog."""
+    import main
+    from model_store import ModelStore
+
+    products = streaming_catalog(path)
+    with open(os.path.join(HERE, "rules.json")) as f:
+        rules = json.load(f)
+    main.MODEL_STORE = ModelStore(os.path.join(workdir, f"{os.path.basename(path)}.db"))
+    main.ANALYSIS_CACHE.disk_budget = 0
+    main.PRODUCTS = products
+    main.build_catalog_indexes()
+    main.MODEL_STORE.save_products(products)
+    generation = main.MODEL_STORE.publish(rules, [])
+    main.materialized_recommendations(generation)
+    key = next(iter(products))
+    best = {"replace": None, "update": None}
+    for i in range(repeat):
+        edited = dict(main.PRODUCTS, **{key: dict(main.PRODUCTS[key], price=str(i))})
+        start = time.perf_counter()
+        main.replace_catalog(edited)
+        full = main.materialized_recommendations(generation)
+        t_replace = time.perf_counter() - start
+
+        edited = dict(edited, **{key: dict(edited[key], price=f"{i}.5")})
+        start = time.perf_counter()
+        main.update_catalog(*main.diff_catalog(main.PRODUCTS, edited, replace=False))
+        t_update = time.perf_counter() - start
+        best["replace"] = t_replace if best["replace"] is None else min(best["replace"], t_replace)
+        best["update"] = t_update if best["update"] is None else min(best["update"], t_update)
+    patched = main.MODEL_STORE.recommendations(generation, main.CATALOG_HASH)
+    rebuilt = main.build_recommendation_table(main.MODEL_STORE.packed_rules(generation), [],
+                                              main.Catalog(main.PRODUCTS))
+    assert json.loads(json.dumps(patched)) == json.loads(json.dumps(rebuilt)), "tables differ"
+    return {"products": len(products), "queries": len(full),
+            "replace_seconds": round(best["replace"], 4), "update_seconds": round(best["update"], 4)}
+
+
+def run_benchmark(sizes, repeat=3, edit_sizes=()):
+    cases = []
+    with tempfile.TemporaryDirectory(prefix="bench_catalog_") as workdir:
+        for megabytes in sizes:
+            path = os.path.join(workdir, f"packages-{megabytes}mb.sql")
+            rows = write_scaled_dump(path, megabytes)
+            size = os.path.getsize(path)
+
+            def legacy():
+                with open(path, "rb") as f:
+                    return legacy_catalog(f.read())
+
+            t_old, peak_old, old = measure(legacy, repeat)
+            t_new, peak_new, new = measure(lambda: streaming_catalog(path), repeat)
+            assert new == old, "catalogs differ"
+            _, peak_rows, _ = measure(lambda: streaming_rows(path), 0)
+            case = {
+                "megabytes": round(size / 1024 / 1024, 1),
+                "rows": rows,
+                "regex": {"seconds": round(t_old, 3), "mb_per_second": round(size / 1024 / 1024 / t_old, 1),
+                          "peak_mb": round(peak_old / 1024 / 1024, 1)},
+                "streaming": {"seconds": round(t_new, 3), "mb_per_second": round(size / 1024 / 1024 / t_new, 1),
+                              "peak_mb": round(peak_new / 1024 / 1024, 1),
+                              "parser_peak_mb": round(peak_rows / 1024 / 1024, 1)},
+            }
+            cases.append(case)
+            print(f"{case['megabytes']:>7.1f} MB {rows:>8} rows  regex {t_old:.3f}s peak {case['regex']['peak_mb']}MB"
+                  f"  streaming {t_new:.3f}s peak {case['streaming']['peak_mb']}MB"
+                  f" (parser alone {case['streaming']['parser_peak_mb']}MB)", file=sys.stderr)
+
+        edits = []
+        for megabytes in edit_sizes:
+            path = os.path.join(workdir, f"edit-{megabytes}mb.sql")
+            write_scaled_dump(path, megabytes)
+            edit = edit_case(path, workdir, repeat)
+            edits.append(edit)
+            print(f"{edit['products']:>8} products {edit['queries']:>6} queries  price edit: replace "
+                  f"{edit['replace_seconds']}s  update {edit['update_seconds']}s", file=sys.stderr)
+
+    commit, dirty = git_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "note": "peak_mb includes the parsed catalog itself, which both hold",
+        "cases": cases,
+        "price_edits": edits,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--megabytes", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--edit-megabytes", type=float, nargs="*", default=[0.05, 0.2])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="results file (default: bench_results/catalog-<commit>.json)")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.megabytes, args.repeat, args.edit_megabytes)
+    out = args.out or os.path.join(RESULTS_DIR, f"catalog-{results['commit']}{'-dirty' if results['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {out}")
@@ -0,0 +1,44 @@
+"""
+Benchmark: streaming /upload ingestion vs the old triple-parse reader.
+
+Usage: python bench_ingest.py [workbook.xlsx ...]   (default: the .xlsx files in the repo root)
+"""
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+from ingest import parse_spooled, upload_reader
+from test_ingest import read_upload_legacy
+
+
+def best_of(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == "__main__":
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(root, "*.xlsx")))
+
+    print(f"{'file':>55} {'KB':>6} {'rows':>6} {'legacy (s)':>11} {'stream (s)':>11} {'speedup':>8}")
+    for path in paths:
+        with open(path, 'rb') as f:
+            contents = f.read()
+        # Silence the DEBUG prints of both readers
+        with contextlib.redirect_stdout(io.StringIO()):
+            t_old, old = best_of(lambda: read_upload_legacy(contents, path))
+            # The parse /upload runs once the upload is spooled to disk
+            t_new, new = best_of(lambda: parse_spooled(path, upload_reader(path)))
+        pd.testing.assert_frame_equal(new, old)
+        name = os.path.basename(path)[-55:]
+        print(f"{name:>55} {len(contents) // 1024:>6} {len(new):>6} {t_old:>11.3f} {t_new:>11.3f} {t_old / t_new:>7.1f}x")
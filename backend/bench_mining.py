@@ -0,0 +1,67 @@
+"""
+Benchmark: mining engines (Apriori / FP-Growth / Eclat) on our real basket shapes.
+
+Baskets are resampled from debug_transactions.json (the transactions extracted by
+the last /analyze run), optionally spread over a wider catalog by suffixing
+item names with one of `variants` tiers.
+
+Usage: python bench_mining.py [n_transactions ...]   (default: 1000 10000 100000)
+"""
+import json
+import random
+import sys
+import time
+
+import pandas as pd
+from mlxtend.preprocessing import TransactionEncoder
+
+from mining import MINING_ENGINES
+
+SUPPORTS = [0.08, 0.02, 0.005]
+
+
+def load_baskets(path='debug_transactions.json'):
+    with open(path, 'r') as f:
+        baskets = [t for t in json.load(f) if len(t) > 1]
+    if not baskets:
+        raise SystemExit(f"No multi-item transactions in {path}; run /analyze first.")
+    return baskets
+
+
+def resample(baskets, n_transactions, variants=1, seed=0):
+    rng = random.Random(seed)
+    sampled = []
+    for _ in range(n_transactions):
+        tier = rng.randrange(variants)
+        basket = rng.choice(baskets)
+        sampled.append([f"{item} #{tier}" if variants > 1 else item for item in basket])
+    return sampled
+
+
+def one_hot(transactions):
+    te = TransactionEncoder().fit(transactions)
+    return pd.DataFrame(te.transform(transactions), columns=te.columns_)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    baskets = load_baskets()
+
+    print(f"{'transactions':>12} {'items':>6} {'support':>8} {'itemsets':>9} " +
+          " ".join(f"{name + ' (s)':>14}" for name in MINING_ENGINES))
+    for n in sizes:
+        for variants in (1, 20):
+            df = one_hot(resample(baskets, n, variants))
+            for min_support in SUPPORTS:
+                timings = []
+                reference = None
+                for name, engine in MINING_ENGINES.items():
+                    start = time.perf_counter()
+                    result = engine(df, min_support)
+                    timings.append(time.perf_counter() - start)
+                    found = set(result['itemsets'])
+                    if reference is None:
+                        reference = found
+                    assert found == reference, f"{name} found different itemsets"
+                print(f"{n:>12} {df.shape[1]:>6} {min_support:>8} {len(reference):>9} " +
+                      " ".join(f"{t:>14.4f}" for t in timings))
@@ -0,0 +1,242 @@
+"""
+Benchmark: the whole upload -> analyze -> recommend pipeline on synthetic
+"Database Client" workbooks (see synthetic_workbook.py), run in-process
+through the real endpoints against a throwaway model store and cache.
+
+Results are written as JSON (one file per run, named after the commit) so
+two commits can be compared:
+
+Usage: python bench_pipeline.py [--rows 1000 10000 100000] [--layouts long wide] [--csv]
+                                [--min-support 0.01] [--min-confidence 0.2] [--algorithm apriori]
+                                [--queries 200] [--repeat 1] [--out FILE]
+       python bench_pipeline.py --compare OLD.json NEW.json [--threshold 0.2]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import synthetic_workbook
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(HERE, "bench_data")
+RESULTS_DIR = os.path.join(HERE, "bench_results")
+SERVICES = ["wedding", "engagement", "prewedding", "siraman", "akad", "platinum", "gold", "signature plus"]
+# Differences below this are noise, whatever the ratio
+NOISE_FLOOR_SECONDS = 0.005
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=HERE,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def workbook(rows, layout, fmt, seed=0):
+    """Generated file for (rows, layout, format), reused across runs."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"synthetic_{layout}_{rows}_s{seed}.{fmt}")
+    if not os.path.exists(path):
+        t0 = time.perf_counter()
+        synthetic_workbook.write_workbook(path + ".tmp." + fmt, rows, layout, seed)
+        os.replace(path + ".tmp." + fmt, path)
+        print(f"  generated {os.path.basename(path)} in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    return path
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def run_case(client, main, path, args):
+    """One upload -> analyze -> recommend pass. Returns ({metric: seconds}, {count: n})."""
+    metrics, counts = {}, {}
+
+    with open(path, "rb") as f:
+        response, metrics["upload"] = timed(lambda: client.post("/upload", files={"file": (os.path.basename(path), f)}))
+    response.raise_for_status()
+    counts["dataset_rows"] = response.json()["rows"]
+
+    payload = {"min_support": args.min_support, "min_confidence": args.min_confidence, "algorithm": args.algorithm}
+    t0 = time.perf_counter()
+    response, metrics["analyze_submit"] = timed(lambda: client.post("/analyze", json=payload))
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    main.ANALYSIS_JOBS.wait(job_id)
+    metrics["analyze_total"] = time.perf_counter() - t0
+    status = client.get(f"/analyze/{job_id}").json()
+    if status["status"] != "completed":
+        raise RuntimeError(f"analysis {status['status']}: {status.get('error')}")
+    for stage, info in status["stages"].items():
+        metrics[f"analyze.{stage}"] = info["seconds"] or 0.0
+    result = client.get(f"/analyze/{job_id}/result").json()
+    # The published result drops the transactions; the audit log in the work dir has them
+    with open("debug_transactions.json") as f:
+        counts["transactions"] = len(json.load(f))
+    counts["items"] = len(result["items"])
+    counts["rules"] = result["rules_count"]
+
+    # First query decodes the new generation's rules; the rest are steady state
+    _, metrics["recommend_first"] = timed(lambda: client.get("/recommendations", params={"service": SERVICES[0]}))
+    latencies = []
+    for i in range(args.queries):
+        response, seconds = timed(lambda: client.get("/recommendations", params={"service": SERVICES[i % len(SERVICES)]}))
+        response.raise_for_status()
+        latencies.append(seconds)
+    metrics["recommend_p50"] = percentile(latencies, 0.5)
+    metrics["recommend_p95"] = percentile(latencies, 0.95)
+    # Every service in one /recommendations/batch call vs one GET per service
+    _, metrics["recommend_loop"] = timed(
+        lambda: [client.get("/recommendations", params={"service": service}) for service in SERVICES])
+    response, metrics["recommend_batch"] = timed(
+        lambda: client.post("/recommendations/batch", json={"services": SERVICES}))
+    response.raise_for_status()
+    # Rule retrieval: the analysis page's first page, and every rule streamed as NDJSON
+    response, metrics["rules_page"] = timed(lambda: client.get("/rules", params={"sort": "lift", "limit": 100}))
+    response.raise_for_status()
+    response, metrics["rules_stream"] = timed(lambda: client.get("/rules", params={"format": "ndjson"}))
+    response.raise_for_status()
+    return metrics, counts
+
+
+def run_benchmark(args):
+    formats = ["csv"] if args.csv else ["xlsx"]
+    paths = {(rows, layout, fmt): workbook(rows, layout, fmt, args.seed)
+             for rows in args.rows for layout in args.layouts for fmt in formats}
+
+    # Throwaway model store / cache, set up before main reads its configuration.
+    # The cache is disabled so every repeat really mines.
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.environ.update(MODEL_DB=os.path.join(workdir, "model.db"), ANALYSIS_CACHE_DIR=os.path.join(workdir, "cache"),
+                      ANALYSIS_CACHE_MEMORY_MB="0", ANALYSIS_CACHE_DISK_MB="0")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    # The server's DEBUG prints go nowhere; per-case lines are reported on stderr
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            import main
+            from fastapi.testclient import TestClient
+
+            with TestClient(main.app) as client:
+                with open(synthetic_workbook.PACKAGES_SQL, "rb") as f:
+                    response, catalog_seconds = timed(
+                        lambda: client.post("/upload-catalog", files={"file": ("packages.sql", f)}))
+                response.raise_for_status()
+
+                # The first analysis also starts the worker process and its imports: run it untimed
+                warmup = run_case(client, main, next(iter(paths.values())), args)[0]["analyze_total"]
+
+                cases = []
+                for (rows, layout, fmt), path in paths.items():
+                    runs = [run_case(client, main, path, args) for _ in range(args.repeat)]
+                    metrics = {name: round(statistics.median(r[0][name] for r in runs), 6) for name in runs[0][0]}
+                    cases.append({"rows": rows, "layout": layout, "format": fmt,
+                                  "file_mb": round(os.path.getsize(path) / 1024 / 1024, 2),
+                                  "seconds": metrics, "counts": runs[-1][1]})
+                    print_case(cases[-1])
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    commit, dirty = git_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "params": {"min_support": args.min_support, "min_confidence": args.min_confidence,
+                   "algorithm": args.algorithm, "queries": args.queries, "repeat": args.repeat, "seed": args.seed},
+        "catalog_upload": round(catalog_seconds, 6),
+        "first_analysis": round(warmup, 6),
+        "cases": cases,
+    }
+
+
+def print_case(case):
+    s, c = case["seconds"], case["counts"]
+    stages = " ".join(f"{k.split('.', 1)[1]}={v:.2f}" for k, v in s.items() if k.startswith("analyze."))
+    print(f"{case['rows']:>8} {case['layout']:<5} {case['format']:<4} {case['file_mb']:>7.1f}MB"
+          f" upload {s['upload']:>7.2f}s  analyze {s['analyze_total']:>7.2f}s ({stages})"
+          f"  reco p50 {s['recommend_p50'] * 1000:.2f}ms p95 {s['recommend_p95'] * 1000:.2f}ms"
+          f"  {len(SERVICES)} services: loop {s['recommend_loop'] * 1000:.1f}ms batch {s['recommend_batch'] * 1000:.1f}ms"
+          f"  rules: page {s['rules_page'] * 1000:.1f}ms stream {s['rules_stream'] * 1000:.1f}ms"
+          f" ({c['rules']})", file=sys.stderr)
+
+
+def compare(old_path, new_path, threshold):
+    """Print per-metric ratios of two result files; returns the regressions."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    if old["params"] != new["params"]:
+        print(f"warning: different parameters {old['params']} vs {new['params']}")
+    old_cases = {(c["rows"], c["layout"], c["format"]): c for c in old["cases"]}
+    regressions = []
+    print(f"{old['commit']} -> {new['commit']}{' (dirty)' if new.get('dirty') else ''}")
+    for case in new["cases"]:
+        key = (case["rows"], case["layout"], case["format"])
+        if key not in old_cases:
+            continue
+        print(f"{key[0]:>8} {key[1]:<5} {key[2]}")
+        for name, seconds in case["seconds"].items():
+            before = old_cases[key]["seconds"].get(name)
+            if before is None:
+                continue
+            ratio = seconds / before if before else float("inf")
+            flag = ""
+            if ratio > 1 + threshold and seconds - before > NOISE_FLOOR_SECONDS:
+                flag = "  REGRESSION"
+                regressions.append((key, name, before, seconds))
+            print(f"    {name:<22} {before:>10.4f} {seconds:>10.4f} {ratio:>7.2f}x{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--layouts", nargs="+", default=["long", "wide"], choices=["long", "wide"])
+    parser.add_argument("--csv", action="store_true", help="upload CSV instead of xlsx")
+    parser.add_argument("--min-support", type=float, default=0.01)
+    parser.add_argument("--min-confidence", type=float, default=0.2)
+    parser.add_argument("--algorithm", default="apriori")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="results file (default: bench_results/pipeline-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        found = compare(*args.compare, args.threshold)
+        print(f"{len(found)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1 if found else 0)
+
+    results = run_benchmark(args)
+    out = args.out or os.path.join(RESULTS_DIR, f"pipeline-{results['commit']}{'-dirty' if results['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {out}")
@@ -0,0 +1,225 @@
+"""
+Benchmark: /recommendations throughput with 1..N uvicorn worker processes
+sharing one model (see model_file), how long the workers take to serve a newly
+published model, and how much of the mapped model file each worker shares
+(Linux /proc only).
+
+The server runs as `python main.py` with WEB_CONCURRENCY=N against a throwaway
+model store seeded with the repo's products.json and rules.json; load comes
+from separate client processes with keep-alive connections.
+
+Usage: python bench_serving.py [--workers 1 2 4] [--clients 8] [--seconds 5]
+                               [--rules rules.json] [--port 8765] [--out FILE]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+from bench_pipeline import RESULTS_DIR, git_commit, percentile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Table lookups, mostly; the last two are free text computed from the rules
+QUERIES = ["wedding", "engagement", "prewedding", "siraman", "akad", "platinum", "gold", "signature plus",
+           "akad wedding", "paket foto keluarga"]
+
+
+def client_loop(port, seconds, seed):
+    """One client process: GET /recommendations on a keep-alive connection for `seconds`. Returns latencies."""
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        query = urllib.parse.urlencode({"service": rng.choice(QUERIES)})
+        start = time.perf_counter()
+        conn.request("GET", f"/recommendations?{query}")
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        errors += response.status != 200
+    conn.close()
+    return latencies, errors
+
+
+def get_json(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        conn.close()
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if get_json(port, "GET", "/ready")[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def worker_pids(server_pid, workers):
+    """The processes serving requests: uvicorn's children with --workers > 1, the server itself otherwise."""
+    if workers == 1:
+        return [server_pid]
+    pids = []
+    try:
+        with open(f"/proc/{server_pid}/task/{server_pid}/children") as f:
+            children = [int(pid) for pid in f.read().split()]
+    except OSError:
+        return []
+    for pid in children:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            if b"resource_tracker" not in f.read():
+                pids.append(pid)
+    return pids
+
+
+def memory_kb(pid):
+    """(Rss, Pss) of the mapped model files, and the process' total Pss, in kB, from /proc/<pid>/smaps."""
+    model_rss = model_pss = total_pss = 0
+    in_model_file = False
+    try:
+        with open(f"/proc/{pid}/smaps") as f:
+            for line in f:
+                fields = line.split()
+                if "-" in fields[0] and not fields[0].endswith(":"):
+                    # Mapping header: address range, perms, offset, dev, inode, path
+                    in_model_file = len(fields) >= 6 and fields[-1].endswith(".rmf")
+                elif fields[0] == "Pss:":
+                    total_pss += int(fields[1])
+                    model_pss += int(fields[1]) if in_model_file else 0
+                elif fields[0] == "Rss:" and in_model_file:
+                    model_rss += int(fields[1])
+    except OSError:
+        return None
+    return {"model_file_rss_kb": model_rss, "model_file_pss_kb": model_pss, "total_pss_kb": total_pss}
+
+
+def run_case(workers, args, workdir, rules):
+    """Throughput, reload latency and memory with `workers` processes."""
+    from model_store import ModelStore
+
+    env = dict(os.environ, MODEL_DB=os.path.join(workdir, "model.db"), ANALYSIS_CACHE_DIR=os.path.join(workdir, "cache"),
+               MODEL_FILE_DIR=os.path.join(workdir, "model_files"), PORT=str(args.port), WEB_CONCURRENCY=str(workers))
+    # main.serve(), not the uvicorn CLI: it binds the workers' socket with TCP_NODELAY
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, "main.py")], cwd=workdir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(args.port)
+        # Every worker maps the file and warms its caches before the timed run
+        with multiprocessing.Pool(args.clients) as pool:
+            pool.starmap(client_loop, [(args.port, 1.0, seed) for seed in range(args.clients)])
+            start = time.perf_counter()
+            runs = pool.starmap(client_loop, [(args.port, args.seconds, seed) for seed in range(args.clients)])
+            elapsed = time.perf_counter() - start
+        latencies = [latency for run, _ in runs for latency in run]
+        memory = [m for m in (memory_kb(pid) for pid in worker_pids(server.pid, workers)) if m is not None]
+
+        # Publish from outside the server (as another worker would) and time until fresh
+        # connections, spread over the workers, all answer from the new generation
+        store = ModelStore(env["MODEL_DB"])
+        published = time.perf_counter()
+        generation = store.publish(rules[: len(rules) // 2], [], source="bench")
+        streak = 0
+        while streak < 4 * workers:
+            status, body = get_json(args.port, "POST", "/recommendations/batch", {"services": ["akad"]})
+            streak = streak + 1 if status == 200 and body["generation"] == generation else 0
+            if time.perf_counter() - published > 30:
+                raise RuntimeError("workers did not pick up the new model")
+        reload_seconds = time.perf_counter() - published
+        store.publish(rules, [], source="bench")  # next case starts from the full model again
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in runs),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "reload_seconds": round(reload_seconds, 3),
+        "memory": memory,
+    }
+
+
+def run_benchmark(args):
+    sys.path.insert(0, HERE)
+    from model_store import ModelStore
+
+    with open(args.rules) as f:
+        rules = json.load(f)
+    with open(os.path.join(HERE, "products.json")) as f:
+        products = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix="bench_serving_")
+    try:
+        store = ModelStore(os.path.join(workdir, "model.db"))
+        store.save_products(products)
+        store.publish(rules, [], source="bench")
+        store.close()
+        cases = []
+        for workers in args.workers:
+            cases.append(run_case(workers, args, workdir, rules))
+            print_case(cases[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    commit, dirty = git_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "params": {"clients": args.clients, "seconds": args.seconds, "rules": len(rules)},
+        "cases": cases,
+    }
+
+
+def print_case(case):
+    memory = case["memory"]
+    shared = ""
+    if memory:
+        shared = (f"  model file rss {max(m['model_file_rss_kb'] for m in memory)}kB"
+                  f" pss {sum(m['model_file_pss_kb'] for m in memory)}kB total over {len(memory)} worker(s)")
+    print(f"{case['workers']:>3} workers  {case['requests_per_second']:>8.1f} req/s"
+          f"  p50 {case['p50_ms']:.2f}ms p95 {case['p95_ms']:.2f}ms  errors {case['errors']}"
+          f"  reload {case['reload_seconds'] * 1000:.0f}ms{shared}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8, help="client processes generating load")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rules", default=os.path.join(HERE, "rules.json"))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", help="results file (default: bench_results/serving-<commit>.json)")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    out = args.out or os.path.join(RESULTS_DIR, f"serving-{results['commit']}{'-dirty' if results['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {out}")
@@ -0,0 +1,72 @@
+"""
+Benchmark: server startup. Each run is a fresh interpreter that imports main,
+starts the app (lifespan warm-up thread included) and times the first requests.
+
+Usage: python bench_startup.py [runs] [service]   (default: 5 runs, "wedding")
+"""
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r"""
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+    imported = time.perf_counter()
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        t0 = time.perf_counter()
+        client.get("/status")
+        t1 = time.perf_counter()
+        client.get("/recommendations", params={"service": sys.argv[1]})
+        t2 = time.perf_counter()
+        client.get("/recommendations", params={"service": sys.argv[1]})
+        t3 = time.perf_counter()
+        pandas_loaded = "pandas" in sys.modules
+    # What the deferred imports would have added at startup
+    d0 = time.perf_counter()
+    import analysis, ingest, incremental
+    deferred = time.perf_counter() - d0
+print(json.dumps({
+    "import_main": imported - start,
+    "first_status": t1 - t0,
+    "first_recommendations": t2 - t1,
+    "warm_recommendations": t3 - t2,
+    "pandas_loaded": pandas_loaded,
+    "deferred_imports": deferred,
+}))
+"""
+
+
+def run_once(env, service):
+    out = subprocess.run([sys.executable, "-c", CHILD, service], cwd=HERE, env=env,
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    service = sys.argv[2] if len(sys.argv) > 2 else "wedding"
+
+    # Copy of the model so the one-time JSON import happens before timing, not in it
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        env = dict(os.environ, MODEL_DB=os.path.join(workdir, "model.db"))
+        run_once(env, service)
+        results = [run_once(env, service) for _ in range(runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{runs} runs, median (ms), service={service!r}")
+    for name in ("import_main", "first_status", "first_recommendations", "warm_recommendations", "deferred_imports"):
+        print(f"{name:>24} {statistics.median(r[name] for r in results) * 1000:>9.1f}")
+    total = statistics.median(r["import_main"] + r["first_status"] + r["first_recommendations"] for r in results)
+    print(f"{'import -> first reco':>24} {total * 1000:>9.1f}")
+    print(f"{'pandas loaded':>24} {any(r['pandas_loaded'] for r in results)!s:>9}")
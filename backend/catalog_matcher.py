@@ -0,0 +1,264 @@
+import copy
+import re
+from bisect import bisect_left
+from collections import Counter, deque
+
+# Generic words that never count as a significant component of a product name
+IGNORE_WORDS = {'dan', 'lain-lain', 'lain', 'dll', 'dan lain-lain', '(', ')', ','}
+
+
+def product_components(product):
+    """
+    Split a long product name into its significant words.
+    e.g. "Engagement, Siraman, Midodareni, Pengajian, dan lain-lain (Platinum)"
+    -> ['engagement', 'siraman', 'midodareni', 'pengajian', 'platinum']
+    """
+    return [c.strip().lower() for c in product.replace(',', ' ').replace('(', ' ').replace(')', ' ').split()
+            if c.strip().lower() not in IGNORE_WORDS and len(c.strip()) > 3]
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring automaton. `patterns` maps each pattern to the
+    values reported when it occurs; search() returns the union of values of
+    every pattern found in the text, in one pass over the text.
+    """
+
+    def __init__(self, patterns):
+        patterns = {p: set(v) for p, v in patterns.items()}
+
+        # Empty pattern ("" in text is always True)
+        self.always = frozenset(patterns.pop('', set()))
+
+        # Trie: goto[state] = {char: next_state}, out[state] = values found when reaching state
+        self.goto = [{}]
+        self.out = [set()]
+        for pattern, values in patterns.items():
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.out.append(set())
+                state = nxt
+            self.out[state] |= values
+
+        # Failure links (BFS), merging outputs so a state reports every pattern ending there
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] |= self.out[self.fail[nxt]]
+
+        self.out = [frozenset(o) for o in self.out]
+
+    def search(self, text):
+        found = set(self.always)
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+class CatalogMatcher:
+    """
+    Aho-Corasick automaton over every catalog product name and every
+    significant name component. Built once per catalog load, then each
+    transaction text is scanned in a single pass.
+    """
+
+    def __init__(self, products):
+        self.products = list(products)
+
+        # pattern -> set of products it proves present in a text
+        pattern_products = {}
+        for product in self.products:
+            pattern_products.setdefault(product.lower(), set()).add(product)
+            for comp in product_components(product):
+                pattern_products.setdefault(comp, set()).add(product)
+
+        self.automaton = AhoCorasick(pattern_products)
+
+    def __len__(self):
+        return len(self.products)
+
+    def match(self, text_soup):
+        """Return the set of catalog products present in text_soup (exact name or significant component)."""
+        return self.automaton.search(text_soup.lower())
+
+
+class WordIndex:
+    """
+    Inverted index over labelled rows of texts (e.g. a product key and its
+    lowercased name and description): word -> positions of the rows holding
+    it. A word-bounded
+    keyword search (main.keyword_regex) can only match where every word of the
+    keyword occurs whole, so search() runs the regex on those rows alone.
+    """
+
+    WORD = re.compile(r"\w+")
+
+    def __init__(self, labels, rows):
+        self.labels = list(labels)
+        self.rows = [tuple(texts) for texts in rows]
+        postings = {}
+        for pos, texts in enumerate(self.rows):
+            for word in set(self.WORD.findall(" ".join(texts).casefold())):
+                postings.setdefault(word, []).append(pos)
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, regex, kw):
+        """Labels, in order, of the rows with a text `regex` (a word-bounded search for `kw`) matches."""
+        words = set(self.WORD.findall(kw.casefold()))
+        if words:
+            lists = sorted((self.postings.get(word, ()) for word in words), key=len)
+            candidates = sorted(set(lists[0]).intersection(*lists[1:])) if len(lists) > 1 else lists[0]
+        else:
+            # No word in the keyword: nothing to look up
+            candidates = range(len(self.rows))
+        return [self.labels[pos] for pos in candidates if any(regex.search(text) for text in self.rows[pos])]
+
+
+# Ends each key in the text of suffix_array(); sorts before any other character
+KEY_END = "\0"
+
+
+def suffix_array(keys, width=32):
+    """
+    (text, starts): the keys, each ended by KEY_END, in one string, and the
+    start positions of their suffixes sorted by the suffix's text up to its
+    key's end. A string without KEY_END is inside some key iff it prefixes one
+    of those suffixes. Suffixes are sorted on their first `width` characters,
+    and only runs still tied go on to the following ones (twice as many each
+    time): the sort keys take O(n * width) memory for n characters, never a
+    copy of each whole suffix, and the index keeps only the positions.
+    """
+    text = "".join(k + KEY_END for k in keys)
+    starts = [i for i, c in enumerate(text) if c != KEY_END]
+    return text, _sort_suffixes(text, starts, 0, width)
+
+
+def _sort_suffixes(text, starts, depth, width):
+    # `starts`: suffixes whose first `depth` characters are the same
+    if len(starts) <= 16:
+        # Few enough to compare whole, up to their key's end
+        return sorted(starts, key=lambda i: text[i + depth:text.index(KEY_END, i + depth)])
+    chunks = {i: text[i + depth:i + depth + width] for i in starts}
+    starts = sorted(starts, key=chunks.__getitem__)
+    # Runs tied on this chunk go on to the next one, unless it holds the key's end
+    ties = [(chunk, count) for chunk, count in Counter(chunks.values()).items() if count > 1 and KEY_END not in chunk]
+    if ties:
+        keys = list(map(chunks.__getitem__, starts))
+        for chunk, count in ties:
+            lo = bisect_left(keys, chunk)
+            starts[lo:lo + count] = _sort_suffixes(text, starts[lo:lo + count], depth + width, width * 2)
+    return starts
+
+
+class CatalogIndex:
+    """
+    Lookup structures for matching item names against PRODUCTS:
+    - exact: normalized key -> product (hash map)
+    - contained: automaton over normalized keys ("product inside item")
+    - suffixes: suffix array of the normalized keys ("item inside product")
+    """
+
+    def __init__(self, products):
+        self.keys = list(products.keys())
+        self.values = list(products.values())
+
+        # get_product_details normalizes with lower(), validation with lower().strip()
+        lowered = [k.lower() for k in self.keys]
+        stripped = [k.strip() for k in lowered]
+
+        self.exact = {}
+        for pos, k in enumerate(lowered):
+            self.exact.setdefault(k, pos)  # first key wins, like a scan in dict order
+        self.exact_stripped = set(stripped)
+
+        self.key_len = [len(k) for k in lowered]
+        self.contained = AhoCorasick(self._positions(lowered))
+        if stripped == lowered:
+            self.contained_stripped = self.contained
+        else:
+            self.contained_stripped = AhoCorasick(self._positions(stripped))
+
+        self.suffix_text, self.suffixes = suffix_array(stripped)
+
+    def with_values(self, products):
+        """
+        This index for `products`, which has the same keys in the same order
+        (only fields changed): the lookup structures are shared, not rebuilt.
+        """
+        index = copy.copy(self)
+        index.values = list(products.values())
+        return index
+
+    @staticmethod
+    def _positions(keys):
+        positions = {}
+        for pos, k in enumerate(keys):
+            positions.setdefault(k, []).append(pos)
+        return positions
+
+    def __len__(self):
+        return len(self.keys)
+
+    def is_catalog_item(self, item_name):
+        """
+        Strict validation: True only if the item matches a catalog key (exact,
+        key inside item, or item inside key). An empty catalog allows everything.
+        """
+        if not self.keys:
+            # If no catalog loaded, allow all items (backward compatibility)
+            return True
+        item_lower = str(item_name).lower().strip()
+        if not item_lower or len(item_lower) < 2:
+            return False
+        return self.is_valid(item_lower)
+
+    def is_valid(self, item_lower):
+        """True if item_lower equals, contains, or is contained in a catalog key (already lowered & stripped)."""
+        if item_lower in self.exact_stripped:
+            return True
+        if self.contained_stripped.search(item_lower):
+            return True
+        if KEY_END in item_lower:
+            return False
+        text, n = self.suffix_text, len(item_lower)
+        i = bisect_left(self.suffixes, item_lower, key=lambda start: text[start:start + n])
+        return i < len(self.suffixes) and text.startswith(item_lower, self.suffixes[i])
+
+    def details(self, item_name):
+        """
+        Best product for an item name: exact key match first, otherwise the
+        longest key contained in the item (first in catalog order on ties).
+        """
+        item_lower = item_name.lower()
+        pos = self.exact.get(item_lower)
+        if pos is not None:
+            return self.values[pos]
+
+        best = None
+        for pos in self.contained.search(item_lower):
+            if self.key_len[pos] == 0:
+                continue
+            if best is None or (self.key_len[pos], -pos) > (self.key_len[best], -best):
+                best = pos
+        return self.values[best] if best is not None else None
@@ -0,0 +1,230 @@
+import json
+import os
+import pickle
+import shutil
+import threading
+from itertools import accumulate
+
+# numpy / pandas are imported where used: the server starts without them.
+#
+# Parsed uploads stored column by column, keyed by a hash of the uploaded bytes, so
+# identical uploads skip parsing and a restarted server maps the dataset back in.
+#
+# One directory per dataset:
+#   meta.json            rows, index and per column: name, kind, dtype
+#   index.npy            integer row labels (unless the index is a RangeIndex)
+#   <i>.npy              "array" columns: numeric / bool / datetime64 values, memory-mapped
+#   <i>.text.npy         "text" columns (str dtype): UTF-8 of the strings, concatenated,
+#   <i>.offsets.npy        character offsets (int64, count + 1) and
+#   <i>.missing.npy        missing mask (bool, one per row)
+#   <i>.pkl              anything else (mixed objects, time values, ...), pickled
+#
+# A dataset grown by appended rows is stored as the rows alone, under a key naming the
+# entries to concatenate (see appended_key), so an append writes only the new rows.
+FORMAT_VERSION = 1
+APPEND_SEPARATOR = "+"
+
+
+def _column_kind(series):
+    import numpy as np
+    import pandas as pd
+
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+        return "array"
+    if isinstance(dtype, pd.StringDtype):
+        return "text"
+    return "pickle"
+
+
+def _write_column(directory, i, series):
+    import numpy as np
+
+    kind = _column_kind(series)
+    if kind == "array":
+        np.save(os.path.join(directory, f"{i}.npy"), series.to_numpy())
+    elif kind == "text":
+        missing = series.isna().to_numpy()
+        texts = series[~missing].tolist()
+        np.save(os.path.join(directory, f"{i}.text.npy"), np.frombuffer("".join(texts).encode("utf-8"), dtype=np.uint8))
+        np.save(os.path.join(directory, f"{i}.offsets.npy"),
+                np.fromiter(accumulate(map(len, texts), initial=0), dtype=np.int64, count=len(texts) + 1))
+        np.save(os.path.join(directory, f"{i}.missing.npy"), missing)
+    else:
+        with open(os.path.join(directory, f"{i}.pkl"), "wb") as f:
+            pickle.dump(series.array, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {"name": series.name, "kind": kind, "dtype": str(series.dtype)}
+
+
+def _read_column(directory, i, column, index):
+    import numpy as np
+    import pandas as pd
+
+    if column["kind"] == "array":
+        # Copy-on-write mapping: pages come from the file (shared between processes)
+        # until something writes to them
+        values = np.asarray(np.load(os.path.join(directory, f"{i}.npy"), mmap_mode="c"))
+    elif column["kind"] == "text":
+        text = np.load(os.path.join(directory, f"{i}.text.npy"), mmap_mode="r").tobytes().decode("utf-8")
+        offsets = np.load(os.path.join(directory, f"{i}.offsets.npy")).tolist()
+        missing = np.load(os.path.join(directory, f"{i}.missing.npy"))
+        strings = np.full(len(missing), np.nan, dtype=object)
+        strings[~missing] = [text[start:end] for start, end in zip(offsets, offsets[1:])]
+        values = pd.array(strings, dtype=pd.api.types.pandas_dtype(column["dtype"]))
+    else:
+        with open(os.path.join(directory, f"{i}.pkl"), "rb") as f:
+            values = pickle.load(f)
+    return pd.Series(values, index=index, name=column["name"], copy=False)
+
+
+class DatasetCache:
+    """
+    Parsed, header-normalized uploads on disk, keyed by upload_key(). Entries
+    are written once (temporary directory + rename) and evicted least recently
+    used first when the directory grows over `disk_budget_mb`.
+    """
+
+    def __init__(self, directory="dataset_cache", disk_budget_mb=512):
+        self.directory = directory
+        self.disk_budget = int(disk_budget_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def upload_key(digest, filename):
+        """Key of an upload from the sha256 `digest` of its bytes; the file type picks the parser."""
+        return f"{digest[:32]}-{os.path.splitext(filename)[1].lstrip('.').lower()}-v{FORMAT_VERSION}"
+
+    @staticmethod
+    def rows_key(dataset_hash):
+        """Key of rows that aren't an upload as such (rows appended to one), from a dataset_fingerprint()."""
+        return f"{dataset_hash}-rows-v{FORMAT_VERSION}"
+
+    @staticmethod
+    def appended_key(key, rows_key):
+        """Key of the dataset under `key` with the rows stored under `rows_key` appended (ignore_index)."""
+        return f"{key}{APPEND_SEPARATOR}{rows_key}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """
+        The dataset stored under `key`, or None. Numeric columns stay memory-mapped,
+        except in datasets grown by appended rows, which are concatenated.
+        """
+        import pandas as pd
+
+        frames = []
+        for part in key.split(APPEND_SEPARATOR):
+            df = self._read(part)
+            if df is None:
+                with self.lock:
+                    self.misses += 1
+                return None
+            frames.append(df)
+        with self.lock:
+            self.hits += 1
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def _read(self, key):
+        import numpy as np
+        import pandas as pd
+
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, "meta.json"), "rb") as f:
+                meta = json.load(f)
+            if meta["index"] == "range":
+                index = pd.RangeIndex(*meta["range"])
+            else:
+                index = pd.Index(np.load(os.path.join(path, "index.npy")))
+            df = pd.DataFrame({i: _read_column(path, i, column, index) for i, column in enumerate(meta["columns"])},
+                              copy=False)
+            df.columns = pd.Index([column["name"] for column in meta["columns"]], dtype=meta["columns_dtype"])
+            df.index.name = meta["index_name"]
+            os.utime(os.path.join(path, "meta.json"))  # mark as recently used
+        except (FileNotFoundError, ValueError, KeyError, pickle.UnpicklingError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Error reading dataset cache {key}: {e}")
+            return None
+        return df
+
+    def put(self, key, df, keep=None):
+        """
+        Store `df` under `key` (kept if already there). Returns False for frames it
+        can't store. `keep`: the key of a dataset `df` is appended to, whose entries
+        must not be evicted to make room.
+        """
+        import numpy as np
+        import pandas as pd
+
+        if not all(isinstance(name, str) for name in df.columns) or df.columns.has_duplicates:
+            print("DEBUG: Dataset not cached: column names must be unique strings")
+            return False
+        path = self._path(key)
+        if os.path.exists(path):
+            return True
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(tmp, exist_ok=True)
+            meta = {"rows": len(df), "columns_dtype": str(df.columns.dtype), "index_name": df.index.name,
+                    "columns": [_write_column(tmp, i, df.iloc[:, i]) for i in range(df.shape[1])]}
+            if isinstance(df.index, pd.RangeIndex):
+                meta.update(index="range", range=[df.index.start, df.index.stop, df.index.step])
+            elif df.index.dtype.kind in "iu":
+                meta["index"] = "array"
+                np.save(os.path.join(tmp, "index.npy"), df.index.to_numpy())
+            else:
+                print(f"DEBUG: Dataset not cached: unsupported index {df.index.dtype}")
+                return False
+            # meta.json last: an entry without it is never read
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                if not os.path.exists(path):
+                    raise
+            self._enforce_disk_budget(keep={key, *(keep.split(APPEND_SEPARATOR) if keep else ())})
+            return True
+        except Exception as e:
+            print(f"Error writing dataset cache: {e}")
+            return False
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _entries(self):
+        try:
+            names = [n for n in os.listdir(self.directory) if not n.endswith(".tmp")]
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            try:
+                mtime = os.stat(os.path.join(self.directory, name, "meta.json")).st_mtime
+                size = sum(entry.stat().st_size for entry in os.scandir(os.path.join(self.directory, name)))
+            except FileNotFoundError:
+                continue
+            entries.append((mtime, size, name))
+        return sorted(entries)
+
+    def _enforce_disk_budget(self, keep=()):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.disk_budget:
+                break
+            if name in keep:
+                continue
+            # Mapped elsewhere? The mapping stays valid after the files are removed (POSIX)
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        entries = self._entries()
+        with self.lock:
+            return {"entries": len(entries), "disk_bytes": sum(size for _, size, _ in entries),
+                    "hits": self.hits, "misses": self.misses}
+
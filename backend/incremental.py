@@ -0,0 +1,200 @@
+from collections import Counter
+from itertools import combinations
+
+import pandas as pd
+
+from mining import mine_eclat
+
+# Transactions larger than this are matched against the tracked itemsets
+# instead of enumerating all of their subsets
+MAX_SUBSET_ENUMERATION = 12
+
+
+def _subsets(items, max_len=None):
+    items = sorted(items)
+    for size in range(1, min(len(items), max_len or len(items)) + 1):
+        for combo in combinations(items, size):
+            yield frozenset(combo)
+
+
+class IncrementalMiner:
+    """
+    Frequent itemsets and association rules maintained under appended /
+    changed transactions with the pre-large itemset technique
+    (Hong, Wang & Tao, 2001).
+
+    Besides the large itemsets (support >= min_support) we keep counts of
+    pre-large ones (support >= lower_support). An itemset that was small at
+    the last scan (count < lower_support * n) can only become large after
+    k_in insertions and k_out deletions with
+        k_in * (1 - min_support) + k_out * min_support >= (min_support - lower_support) * n
+    so until that budget is spent an update only touches the changed
+    transactions: counts of tracked itemsets contained in them are adjusted
+    and only rules built on those itemsets are re-derived. Once it is spent
+    we rescan the maintained transactions (never the raw upload).
+    Itemsets longer than max_len (if given) are never tracked, like /analyze's max_len.
+    """
+
+    def __init__(self, transactions_by_key, min_support, min_confidence, lower_ratio=0.5, is_valid_item=None,
+                 max_len=None):
+        self.min_support = min_support
+        self.min_confidence = min_confidence
+        self.max_len = max_len
+        self.lower_support = min_support * lower_ratio
+        self.is_valid_item = is_valid_item or (lambda item: True)
+        self.transactions = {k: frozenset(v) for k, v in transactions_by_key.items()}
+        self.rescans = 0
+        self._rescan()
+
+    # --- counting -------------------------------------------------------
+
+    def _mined(self):
+        # Apriori needs at least 2 items per transaction, like run_analysis
+        return [t for t in self.transactions.values() if len(t) > 1]
+
+    def _rescan(self):
+        from mlxtend.preprocessing import TransactionEncoder
+
+        mined = self._mined()
+        self.n = len(mined)
+        self.counts = {}
+        if mined:
+            te = TransactionEncoder()
+            one_hot_df = pd.DataFrame(te.fit(mined).transform(mined), columns=te.columns_)
+            frequent = mine_eclat(one_hot_df, self.lower_support, self.max_len)
+            self.counts = {itemset: int(round(support * self.n))
+                           for itemset, support in zip(frequent['itemsets'], frequent['support'])}
+        # Item -> tracked itemsets of 2+ items holding it (counts gain no keys between rescans)
+        self.containing = {}
+        for itemset in self.counts:
+            if len(itemset) > 1:
+                for item in itemset:
+                    self.containing.setdefault(item, set()).add(itemset)
+        self.item_presence = Counter(item for t in self.transactions.values() for item in t)
+        self.spent = 0.0
+        self.budget = (self.min_support - self.lower_support) * self.n
+        self.rule_splits = {}
+        self.derived = set()
+        self._derive_rules(self._rule_itemsets())
+        self.rescans += 1
+
+    def _adjust(self, transaction, delta, touched):
+        if len(transaction) <= MAX_SUBSET_ENUMERATION:
+            candidates = (s for s in _subsets(transaction, self.max_len) if s in self.counts)
+        else:
+            candidates = [s for s in self.counts if s <= transaction]
+        for itemset in candidates:
+            self.counts[itemset] += delta
+            touched.add(itemset)
+
+    def update(self, changed):
+        """
+        Apply changed transactions: {key: items} for new or modified
+        transactions, {key: None} for removed ones. Returns a summary dict.
+        """
+        touched = set()
+        n_changed = 0
+        n_before = self.n
+        for key, items in changed.items():
+            old = self.transactions.get(key)
+            new = frozenset(items) if items is not None else None
+            if old == new:
+                continue
+            n_changed += 1
+            # A modified transaction is a deletion plus an insertion
+            if old is not None:
+                self.item_presence.subtract(old)
+                if len(old) > 1:
+                    self._adjust(old, -1, touched)
+                    self.n -= 1
+                    self.spent += self.min_support
+                del self.transactions[key]
+            if new is not None:
+                self.item_presence.update(new)
+                if len(new) > 1:
+                    self._adjust(new, +1, touched)
+                    self.n += 1
+                    self.spent += 1 - self.min_support
+                self.transactions[key] = new
+
+        if self.spent >= self.budget and n_changed:
+            # A small itemset could have become large: recount from the maintained transactions
+            self._rescan()
+            return {"transactions_changed": n_changed, "rescanned": True, "itemsets_touched": len(self.counts)}
+
+        self._derive_rules(self._affected_rule_itemsets(touched, shrank=self.n < n_before))
+        return {"transactions_changed": n_changed, "rescanned": False, "itemsets_touched": len(touched)}
+
+    # --- results --------------------------------------------------------
+
+    def is_large(self, itemset):
+        count = self.counts.get(itemset, 0)
+        return self.n > 0 and count / self.n >= self.min_support
+
+    def _rule_itemsets(self):
+        return [i for i in self.counts if len(i) > 1 and self.is_large(i)]
+
+    def _affected_rule_itemsets(self, touched, shrank=False):
+        # A rule's confidence depends on its itemset and antecedent counts, so
+        # re-derive every itemset that is, or contains, a touched itemset (looked
+        # up through the item index), plus, when the transaction count shrank,
+        # untouched ones that became large because of it
+        affected = set()
+        for itemset in touched:
+            supersets = sorted((self.containing.get(item, set()) for item in itemset), key=len)
+            affected.update(supersets[0].intersection(*supersets[1:]))
+        if shrank:
+            affected.update(i for i in self.counts if len(i) > 1 and self.is_large(i) and i not in self.derived)
+        return affected
+
+    def _derive_rules(self, itemsets):
+        """Recompute the confident antecedent/consequent splits of the given itemsets."""
+        for itemset in itemsets:
+            self.rule_splits.pop(itemset, None)
+            self.derived.discard(itemset)
+            if not self.is_large(itemset):
+                continue
+            self.derived.add(itemset)
+            if not all(self.is_valid_item(str(i)) for i in itemset):
+                continue
+            splits = []
+            support = self.counts[itemset] / self.n
+            for antecedent in _subsets(itemset):
+                if antecedent == itemset:
+                    continue
+                antecedent_count = self.counts.get(antecedent, 0)
+                if antecedent_count <= 0:
+                    continue
+                if support / (antecedent_count / self.n) >= self.min_confidence:
+                    splits.append(antecedent)
+            if splits:
+                self.rule_splits[itemset] = splits
+
+    def frequent_itemsets(self):
+        return [{"itemset": sorted(i), "support": c / self.n} for i, c in self.counts.items() if self.is_large(i)]
+
+    def items(self):
+        return sorted(item for item, count in self.item_presence.items() if count > 0 and self.is_valid_item(item))
+
+    def rules(self):
+        """Rules in the /analyze format; supports and lifts use the current transaction count."""
+        rules = []
+        for itemset, splits in self.rule_splits.items():
+            # Itemsets that fell below min_support (n grew) drop out here
+            if not self.is_large(itemset):
+                continue
+            support = self.counts[itemset] / self.n
+            for antecedent in splits:
+                consequent = itemset - antecedent
+                confidence = support / (self.counts[antecedent] / self.n)
+                if confidence < self.min_confidence:
+                    continue
+                rules.append({
+                    "antecedents": sorted(antecedent),
+                    "consequents": sorted(consequent),
+                    "support": support,
+                    "confidence": confidence,
+                    "lift": confidence / (self.counts[consequent] / self.n),
+                })
+        rules.sort(key=lambda r: (len(r["antecedents"]) + len(r["consequents"]), r["antecedents"], r["consequents"]))
+        return rules
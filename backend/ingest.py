@@ -0,0 +1,191 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from metrics import stage
+from xlsx_reader import XlsxStreamReader
+
+# Rows scanned for the real header of messy sheets (title rows, notes above the table)
+HEADER_SCAN_ROWS = 30
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+# Sheets whose name contains one of these are preferred over the first sheet
+SHEET_KEYWORDS = ['database', 'client', 'trans', 'order', 'data']
+
+# Re-defined keywords (more specific to avoid partial matches like 'id' in 'Radit')
+HEADER_ID_KEYWORDS = {'id', 'trans', 'client', 'pelanggan', 'user', 'kode', 'customer'}
+# Added more context for package columns
+HEADER_ITEM_KEYWORDS = {'item', 'nama', 'product', 'paket', 'event', 'layanan', 'service', 'barang', 'produk', 'keterangan'}
+
+
+def pick_sheet(sheet_names):
+    """Prioritize sheets with "database", "client", "transaksi", "order" or "data"."""
+    for s in sheet_names:
+        if any(k in s.lower() for k in SHEET_KEYWORDS):
+            return s
+    return sheet_names[0]
+
+
+def header_score(values):
+    """Keyword score of one candidate header row (missing cells already removed)."""
+    score = 0
+    has_id_keyword = False
+    has_item_keyword = False
+    for val in values:
+        # Check for exact word matches or common prefixes
+        words = str(val).lower().strip().replace('/', ' ').replace('_', ' ').replace('(', ' ').replace(')', ' ').split()
+        if any(k in words for k in HEADER_ID_KEYWORDS):
+            score += 5
+            has_id_keyword = True
+        if any(k in words for k in HEADER_ITEM_KEYWORDS):
+            score += 5
+            has_item_keyword = True
+
+    # Bonus if both ID and Item keywords found in same row
+    if has_id_keyword and has_item_keyword:
+        score += 10
+    return score
+
+
+def detect_header_row(rows):
+    """Index of the best scoring row among `rows` (0 when nothing looks like a header)."""
+    best_row = 0
+    max_score = -1
+    for i, row in enumerate(rows):
+        values = [v for v in row if not _is_missing(v)]
+        if not values:
+            continue
+        score = header_score(values)
+        if score > max_score and score > 0:
+            max_score = score
+            best_row = i
+    return best_row, max_score
+
+
+def _is_missing(value):
+    return value is None or value == "" or (isinstance(value, float) and np.isnan(value))
+
+
+def read_excel_streaming(path):
+    """
+    Parse a workbook in one pass: open it once, pick the sheet, score the first
+    HEADER_SCAN_ROWS rows of the row stream for the header, and keep reading the
+    same stream. Result equals pd.read_excel(sheet_name=..., skiprows=header_row).
+    """
+    from pandas.io.parsers import TextParser
+
+    with XlsxStreamReader(path) as workbook:
+        print(f"DEBUG: Sheets found: {workbook.sheet_names}")
+        target_sheet = pick_sheet(workbook.sheet_names)
+        print(f"DEBUG: Using sheet: {target_sheet}")
+
+        rows = workbook.rows(target_sheet)
+        data = []
+        with stage("header_detection"):
+            for row in rows:
+                data.append(row)
+                if len(data) >= HEADER_SCAN_ROWS:
+                    break
+            best_row, max_score = detect_header_row(data)
+        print(f"DEBUG: Best header row detected at: {best_row} with score: {max_score}")
+
+        # Rows above the header are never parsed into the frame
+        del data[:best_row]
+        data.extend(rows)
+
+    # Trim trailing empty rows, pad to the widest row
+    while data and not data[-1]:
+        data.pop()
+    if not data:
+        return pd.DataFrame()
+    width = max(len(r) for r in data)
+    data = [r + [""] * (width - len(r)) if len(r) < width else r for r in data]
+
+    df = TextParser(data, header=0, skip_blank_lines=False).read()
+    df = df.dropna(how='all').reset_index(drop=True)
+    print(f"DEBUG: Resulting columns: {list(df.columns)}")
+    return df
+
+
+def spool_upload(fileobj, suffix="", digest=None):
+    """
+    Copy an upload stream to a temporary file on disk and return its path.
+    `digest` (a hashlib object) is fed the bytes on the way.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="upload-")
+    with os.fdopen(fd, 'wb') as out:
+        if digest is None:
+            shutil.copyfileobj(fileobj, out, SPOOL_CHUNK_BYTES)
+        else:
+            for chunk in iter(lambda: fileobj.read(SPOOL_CHUNK_BYTES), b""):
+                digest.update(chunk)
+                out.write(chunk)
+    return path
+
+
+def upload_reader(filename):
+    """Parser for an upload's file type. Raises ValueError for other file types."""
+    if filename.endswith('.csv'):
+        return pd.read_csv
+    if filename.endswith('.xlsx'):
+        return read_excel_streaming
+    if filename.endswith('.xls'):
+        # Legacy binary workbooks (not a zip archive): pandas' reader
+        return read_xls
+    raise ValueError("Invalid file format")
+
+
+def parse_spooled(path, reader):
+    """Parse a file on disk with upload_reader()'s `reader`, dropping fully empty rows and columns."""
+    # Includes header_detection for workbooks
+    with stage("parse"):
+        df = reader(path)
+    # Clean up: remove fully empty rows/cols
+    return df.dropna(how='all').dropna(axis=1, how='all')
+
+
+def read_upload_cached(fileobj, filename, cache):
+    """
+    Parse an uploaded CSV / Excel stream into a DataFrame through a DatasetCache:
+    the uploaded bytes are hashed while spooling and a file parsed before is
+    restored from the cache instead of parsed again. Returns (dataset, cache key).
+    Blocking: call it from a worker thread (sync endpoints run in FastAPI's
+    threadpool). Raises ValueError for other file types.
+    """
+    reader = upload_reader(filename)
+    digest = hashlib.sha256()
+    with stage("spool"):
+        path = spool_upload(fileobj, suffix=os.path.splitext(filename)[1], digest=digest)
+    try:
+        key = cache.upload_key(digest.hexdigest(), filename)
+        df = cache.get(key)
+        if df is not None:
+            print(f"DEBUG: Upload restored from the dataset cache ({key})")
+            return df, key
+        df = parse_spooled(path, reader)
+    finally:
+        os.remove(path)
+    with stage("dataset_cache"):
+        cache.put(key, df)
+    return df, key
+
+
+def read_xls(path):
+    """
+    Header detection for .xls files via pandas: the sheet is parsed once and
+    the header row promoted from it, like read_excel_streaming does.
+    """
+    from pandas.io.parsers import TextParser
+
+    with pd.ExcelFile(path) as xl:
+        target_sheet = pick_sheet(xl.sheet_names)
+        raw = xl.parse(target_sheet, header=None)
+    best_row, _ = detect_header_row(raw.head(HEADER_SCAN_ROWS).itertuples(index=False))
+    # Cells back to what the reader gave pandas (empty: ""), re-inferred from the header row down
+    rows = raw.iloc[best_row:].astype(object)
+    df = TextParser(rows.where(rows.notna(), "").values.tolist(), header=0, skip_blank_lines=False).read()
+    return df.dropna(how='all').reset_index(drop=True)
@@ -0,0 +1,257 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+TERMINAL_STATES = {"completed", "failed", "cancelled"}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class StageProgress:
+    """
+    Progress reporting from inside a job. `shared` is a dict (a Manager dict
+    proxy when running in the process pool); the worker only assigns whole
+    values so the proxy sees every update. Pass None to report nothing.
+    """
+
+    def __init__(self, shared=None, stages=()):
+        self.shared = shared
+        self.stages = {name: {"state": "pending", "seconds": None} for name in stages}
+        self.current = None
+        self.started_at = None
+        if self.shared is not None:
+            self.shared["stages"] = dict(self.stages)
+
+    def check_cancelled(self):
+        if self.shared is not None and self.shared.get("cancel"):
+            raise JobCancelled("Job cancelled")
+
+    def stage(self, name):
+        """Finish the current stage and start `name`."""
+        self.check_cancelled()
+        self._finish_current()
+        self.current = name
+        self.started_at = time.perf_counter()
+        self.stages[name] = {"state": "running", "seconds": None}
+        if self.shared is not None:
+            self.shared["stage"] = name
+            self.shared["fraction"] = 0.0
+            self.shared["stages"] = dict(self.stages)
+
+    def update(self, fraction):
+        """Progress within the current stage, 0..1. Also a cancellation point."""
+        self.check_cancelled()
+        if self.shared is not None:
+            self.shared["fraction"] = round(fraction, 3)
+
+    def done(self):
+        """Finish the last stage. Returns {stage: seconds} of the stages that ran."""
+        self._finish_current()
+        self.current = None
+        if self.shared is not None:
+            self.shared["stage"] = None
+            self.shared["stages"] = dict(self.stages)
+        return {name: info["seconds"] for name, info in self.stages.items() if info["state"] == "done"}
+
+    def _finish_current(self):
+        if self.current is not None:
+            self.stages[self.current] = {"state": "done", "seconds": round(time.perf_counter() - self.started_at, 4)}
+
+
+def _run_job(fn, args, shared):
+    # Runs in the worker process
+    shared["status"] = "running"
+    shared["started_at"] = time.time()
+    return fn(*args, progress=shared)
+
+
+class JobRunner:
+    """
+    Runs jobs in a process pool so long analyses don't hold a server thread.
+    Each job gets an id, shared progress state, cooperative cancellation, and
+    an on_complete callback that runs in this process with the job's result.
+    """
+
+    def __init__(self, max_workers=None, keep_jobs=20):
+        self.max_workers = max_workers or int(os.environ.get("ANALYSIS_WORKERS", "1"))
+        self.keep_jobs = keep_jobs
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self._pool = None
+        self._manager = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def _get_manager(self):
+        if self._manager is None:
+            self._manager = multiprocessing.Manager()
+        return self._manager
+
+    def submit(self, fn, *args, on_complete=None, meta=None):
+        job_id = uuid.uuid4().hex
+        shared = self._get_manager().dict()
+        shared["status"] = "queued"
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "meta": meta or {},
+            "submitted_at": time.time(),
+            "finished_at": None,
+            "shared": shared,
+            "progress": None,
+            "result": None,
+            "error": None,
+            "error_type": None,
+            "future": None,
+            "done": threading.Event(),
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+            self._evict_old_jobs()
+        try:
+            future = self._get_pool().submit(_run_job, fn, args, shared)
+        except BrokenProcessPool:
+            # A crashed worker breaks the pool for good; start a fresh one
+            self._pool = None
+            future = self._get_pool().submit(_run_job, fn, args, shared)
+        job["future"] = future
+        future.add_done_callback(lambda f: self._finish(job, f, on_complete))
+        return job_id
+
+    def add_completed(self, result, meta=None):
+        """Register a job that is already done (e.g. served from a cache) so clients poll it the same way."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.jobs[job_id] = {
+                "id": job_id,
+                "status": "completed",
+                "meta": meta or {},
+                "submitted_at": now,
+                "finished_at": now,
+                "shared": None,
+                "progress": {"started_at": now, "stage": None, "stages": {}},
+                "result": result,
+                "error": None,
+                "error_type": None,
+                "future": None,
+                "done": threading.Event(),
+            }
+            self.jobs[job_id]["done"].set()
+            self._evict_old_jobs()
+        return job_id
+
+    def _finish(self, job, future, on_complete):
+        status, result, error, error_type = "completed", None, None, None
+        if future.cancelled():
+            status = "cancelled"
+        else:
+            exc = future.exception()
+            if isinstance(exc, JobCancelled):
+                status = "cancelled"
+            elif exc is not None:
+                status, error, error_type = "failed", str(exc) or exc.__class__.__name__, exc.__class__.__name__
+            else:
+                result = future.result()
+                if on_complete is not None:
+                    try:
+                        result = on_complete(result)
+                    except Exception as e:
+                        status, result, error = "failed", None, str(e)
+
+        progress = self._read_shared(job)
+        with self.lock:
+            job["progress"] = progress
+            job["shared"] = None
+            job["result"] = result
+            job["error"] = error
+            job["error_type"] = error_type
+            job["finished_at"] = time.time()
+            job["status"] = status
+        job["done"].set()
+
+    @staticmethod
+    def _read_shared(job):
+        try:
+            return dict(job["shared"]) if job["shared"] is not None else {}
+        except Exception:
+            # Manager already gone (e.g. interpreter shutting down)
+            return {}
+
+    def _evict_old_jobs(self):
+        finished = [j for j in self.jobs.values() if j["status"] in TERMINAL_STATES]
+        finished.sort(key=lambda j: j["finished_at"])
+        while len(self.jobs) > self.keep_jobs and finished:
+            self.jobs.pop(finished.pop(0)["id"], None)
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job is finished (on_complete included). Returns the job, or None on timeout."""
+        job = self.jobs.get(job_id)
+        if job is None or not job["done"].wait(timeout):
+            return None
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def status(self, job_id):
+        """JSON-friendly job state: status, current stage, per-stage progress and timings."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        with self.lock:
+            status = job["status"]
+            progress = job["progress"]
+        if progress is None:
+            progress = self._read_shared(job)
+            if status not in TERMINAL_STATES:
+                status = progress.get("status", status)
+
+        stages = progress.get("stages", {})
+        done = sum(1 for s in stages.values() if s["state"] == "done")
+        fraction = progress.get("fraction", 0.0) if progress.get("stage") else 0.0
+        percent = 100.0 if status == "completed" else round(100.0 * (done + fraction) / len(stages), 1) if stages else 0.0
+        return {
+            "job_id": job_id,
+            "status": status,
+            "stage": progress.get("stage"),
+            "percent": percent,
+            "stages": stages,
+            "error": job["error"],
+            "submitted_at": job["submitted_at"],
+            "started_at": progress.get("started_at"),
+            "finished_at": job["finished_at"],
+            **job["meta"],
+        }
+
+    def cancel(self, job_id):
+        """Cancel a queued job immediately, or ask a running one to stop at its next checkpoint."""
+        job = self.jobs.get(job_id)
+        if job is None or job["status"] in TERMINAL_STATES:
+            return False
+        if job["future"] is not None and job["future"].cancel():
+            return True
+        shared = job["shared"]
+        if shared is not None:
+            try:
+                shared["cancel"] = True
+            except Exception:
+                return False
+        return True
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
@@ -1,25 +1,92 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import pandas as pd
-from mlxtend.frequent_patterns import apriori, association_rules
+from typing import Optional
+import base64
 import io
 import json
 import re
-import requests
 import os
+import threading
+import time
+from functools import lru_cache
+from catalog_matcher import CatalogMatcher, CatalogIndex, WordIndex
+from jobs import JobRunner
+from result_cache import AnalysisCache, DatasetDigest, catalog_fingerprint, catalog_keys_fingerprint
+from dataset_cache import DatasetCache
+from sql_dump import SqlDumpError, iter_insert_rows
+from model_store import ModelStore, RULE_SORT_COLUMNS
+from model_file import ModelFile, write_model_file, SUFFIX as MODEL_FILE_SUFFIX
+from model_snapshot import Catalog, ModelSnapshot
+from rule_pack import PackedRules, pack_rules
+import metrics
+from metrics import stage
+try:
+    import orjson  # optional: /rules pages and streams are encoded with it when installed
+except ImportError:
+    orjson = None
+# pandas / mlxtend (analysis, mining, incremental, ingest) are imported inside the
+# endpoints that use them, so the server starts answering without loading them
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Warm the model in the background: /, /status and /ready answer meanwhile
+    threading.Thread(target=warm_model, name="model-warmup", daemon=True).start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+# Read endpoints whose responses only change with the model: a publish (analysis, append),
+# a rollback or a catalog upload. They are tagged with the model version and answer
+# If-None-Match with 304; everything else (jobs, status, metrics) is never cached.
+VERSIONED_ROUTES = {"/", "/items", "/recommendations", "/rules", "/model/generations"}
+
+def model_etag():
+    # The store id tells apart databases whose version counters both started at 0
+    return f'"{MODEL_STORE.store_id}-{MODEL_STORE.model_version()}"'
+
+def etag_matches(if_none_match, etag):
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
 
-# ADD CACHE CONTROL MIDDLEWARE
 @app.middleware("http")
-async def add_cache_control_header(request, call_next):
-    response = await call_next(request)
+async def conditional_get(request, call_next):
+    if request.method == "GET" and request.url.path in VERSIONED_ROUTES:
+        # Read before the handler runs: a publish meanwhile can only make the tag older than the body.
+        # From the store, not a copy in this process: other workers publish too. The SQLite read
+        # runs in the thread pool, like the handlers, to keep it off the event loop
+        etag = await run_in_threadpool(model_etag)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+        response = await call_next(request)
+        if response.status_code == 200:
+            response.headers.update(headers)
+            return response
+    else:
+        response = await call_next(request)
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
     return response
 
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    # Stages timed while handling the request (metrics.stage) end up in its Server-Timing header
+    timings = metrics.begin_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    total = time.perf_counter() - start
+    # Route template, not the path: one series for /analyze/{job_id}
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.REQUEST_SECONDS.observe(total, method=request.method, route=route, status=response.status_code)
+    response.headers["Server-Timing"] = metrics.server_timing_header(timings, total)
+    response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
 # Enable CORS for Next.js
 app.add_middleware(
     CORSMiddleware,
@@ -27,167 +94,257 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag"],
 )
 
 # In-memory storage for the latest uploaded dataset
 # For a real application, this should be a database or file storage.
 # In-memory storage
 DATASET = None
-RULES = []
-ITEMS = []
-PRODUCTS = {}
+DATASET_HASH = None  # (dataset, DatasetDigest) of the last hashed DATASET
+# DATASET_CACHE key of DATASET; MODEL_STORE records the current one, so a restarted
+# server (or another worker) restores the dataset from the cache on first use
+DATASET_KEY = None
+CATALOG_HASH = catalog_fingerprint({})
+# Hash of the catalog keys alone, which is all analyses depend on (ANALYSIS_CACHE keys)
+CATALOG_KEYS_HASH = catalog_keys_fingerprint([])
+PRODUCTS = None  # None until the catalog is loaded from MODEL_STORE (see ensure_catalog)
+CATALOG_MATCHER = CatalogMatcher([])
+CATALOG_INDEX = CatalogIndex({})
+
+# Rules and items live in the model store (SQLite), one generation per published analysis.
+# The JSON files are only read once, to import a model saved by older versions.
+MODEL_STORE = ModelStore(
+    os.environ.get("MODEL_DB", "model.db"),
+    keep_generations=int(os.environ.get("MODEL_GENERATIONS_KEPT", "5")),
+)
 RULES_FILE = "rules.json"
 ITEMS_FILE = "items.json"
 PRODUCTS_FILE = "products.json"
 
-def load_rules():
-    global RULES
-    try:
-        with open(RULES_FILE, 'r') as f:
-            RULES = json.load(f)
-            print(f"Loaded {len(RULES)} rules from {RULES_FILE}")
-    except FileNotFoundError:
-        RULES = []
-        print("No existing rules found.")
-    except Exception as e:
-        print(f"Error loading rules: {e}")
-        RULES = []
+# Analyses run in a process pool; finished results are published to MODEL_STORE
+ANALYSIS_JOBS = JobRunner()
 
-def save_rules(rules):
-    try:
-        with open(RULES_FILE, 'w') as f:
-            json.dump(rules, f)
-            print(f"Saved {len(rules)} rules to {RULES_FILE}")
-    except Exception as e:
-        print(f"Error saving rules: {e}")
+# Set once warm_model() has loaded the catalog and the active rules (reported by /ready)
+MODEL_READY = threading.Event()
+WARMUP_LOCK = threading.RLock()
+WARMUP_SECONDS = None
 
-def load_items():
-    global ITEMS
-    try:
-        with open(ITEMS_FILE, 'r') as f:
-            ITEMS = json.load(f)
-            print(f"Loaded {len(ITEMS)} items from {ITEMS_FILE}")
-    except FileNotFoundError:
-        ITEMS = []
-    except Exception as e:
-        print(f"Error loading items: {e}")
-        ITEMS = []
+# Top-N recommendations per query, precomputed when rules are published and stored
+# with them (see build_recommendation_table); longer lists are computed on demand
+MATERIALIZED_TOP_N = 10
+RECOMMENDATION_LOCK = threading.Lock()
 
-def save_items(items):
-    try:
-        with open(ITEMS_FILE, 'w') as f:
-            json.dump(items, f)
-            print(f"Saved {len(items)} items to {ITEMS_FILE}")
-    except Exception as e:
-        print(f"Error saving items: {e}")
+# What the read endpoints serve (packed rules, recommendation table, items, catalog) is
+# exported to one read-only file per model version and memory-mapped (see model_file),
+# so uvicorn workers share a single copy. Each worker wraps it in an immutable
+# ModelSnapshot, swapped in on its first request after any worker publishes, rolls
+# back or uploads a catalog. Readers take SNAPSHOT without locking.
+SNAPSHOT = None
+SNAPSHOT_LOCK = threading.Lock()
+# Recently served snapshots by (store, generation, catalog version): rolling back to
+# one of them is a reference swap
+RECENT_SNAPSHOTS = {}
+# Older model files kept per store (workers may still have them mapped for a moment)
+MODEL_FILES_KEPT = 2
+
+# Parameters of the last published analysis, and the itemset counts maintained for
+# /upload?mode=append as (layout, IncrementalMiner, {client id: row labels});
+# layout = columns, format, catalog, params
+ANALYSIS_PARAMS = None
+INCREMENTAL_STATE = None
+APPEND_LOCK = threading.Lock()
+
+# Parsed uploads, columnar, keyed by a hash of the uploaded bytes (budget in MB)
+DATASET_CACHE = DatasetCache(
+    directory=os.environ.get("DATASET_CACHE_DIR", "dataset_cache"),
+    disk_budget_mb=float(os.environ.get("DATASET_CACHE_DISK_MB", "512")),
+)
+
+# Finished analyses keyed by dataset, catalog and parameters (budgets in MB)
+ANALYSIS_CACHE = AnalysisCache(
+    directory=os.environ.get("ANALYSIS_CACHE_DIR", "analysis_cache"),
+    memory_budget_mb=float(os.environ.get("ANALYSIS_CACHE_MEMORY_MB", "64")),
+    disk_budget_mb=float(os.environ.get("ANALYSIS_CACHE_DISK_MB", "256")),
+)
 
 def load_products():
     global PRODUCTS
     try:
-        with open(PRODUCTS_FILE, 'r') as f:
-            PRODUCTS = json.load(f)
-            print(f"Loaded {len(PRODUCTS)} products from {PRODUCTS_FILE}")
-    except FileNotFoundError:
-        PRODUCTS = {}
+        PRODUCTS = MODEL_STORE.load_products()
+        print(f"Loaded {len(PRODUCTS)} products from {MODEL_STORE.path}")
     except Exception as e:
         print(f"Error loading products: {e}")
         PRODUCTS = {}
+    build_catalog_indexes()
+
+def build_catalog_indexes():
+    """Compile the lookup structures derived from PRODUCTS. Call after every catalog change."""
+    global CATALOG_MATCHER, CATALOG_INDEX, CATALOG_HASH, CATALOG_KEYS_HASH
+    CATALOG_MATCHER = CatalogMatcher(PRODUCTS.keys())
+    CATALOG_INDEX = CatalogIndex(PRODUCTS)
+    CATALOG_HASH = catalog_fingerprint(PRODUCTS)
+    CATALOG_KEYS_HASH = catalog_keys_fingerprint(PRODUCTS)
+
+def current_dataset_digest():
+    """DatasetDigest of DATASET, computed once per uploaded dataset (appends grow it)."""
+    global DATASET_HASH
+    if DATASET_HASH is None or DATASET_HASH[0] is not DATASET:
+        DATASET_HASH = (DATASET, DatasetDigest(DATASET))
+    return DATASET_HASH[1]
+
+def current_dataset_hash():
+    """Content hash of DATASET (dataset_fingerprint)."""
+    return current_dataset_digest().hexdigest()
+
+def current_dataset():
+    """
+    DATASET, first restored from DATASET_CACHE when the dataset recorded in
+    MODEL_STORE is another one (after a restart, or uploaded to another worker).
+    None until a dataset is uploaded.
+    """
+    global DATASET, DATASET_KEY, INCREMENTAL_STATE
+    key = MODEL_STORE.dataset_key()
+    if key is None or key == DATASET_KEY:
+        return DATASET
+    with APPEND_LOCK:
+        if key != DATASET_KEY:
+            with stage("dataset_restore"):
+                df = DATASET_CACHE.get(key)
+            if df is None:
+                print(f"DEBUG: Dataset {key} is no longer in the dataset cache")
+                return DATASET
+            DATASET, DATASET_KEY, INCREMENTAL_STATE = df, key, None
+            metrics.DATASET_ROWS.set(len(df))
+            print(f"DEBUG: Dataset restored from the dataset cache: {len(df)} rows ({key})")
+    return DATASET
+
+def set_dataset(df, key):
+    """Make `df` (stored in DATASET_CACHE under `key`) the dataset of every worker."""
+    global DATASET, DATASET_KEY
+    DATASET, DATASET_KEY = df, key
+    MODEL_STORE.set_dataset_key(key)
 
 def save_products(products):
     try:
-        with open(PRODUCTS_FILE, 'w') as f:
-            json.dump(products, f)
-            print(f"Saved {len(products)} products to {PRODUCTS_FILE}")
+        MODEL_STORE.save_products(products)
     except Exception as e:
         print(f"Error saving products: {e}")
 
-# Load rules, items, and products on startup
-load_rules()
-load_items()
-load_products()
+def ensure_catalog():
+    """Load the catalog on first use; waits for a running warm-up instead of loading twice."""
+    if PRODUCTS is None:
+        with WARMUP_LOCK:
+            if PRODUCTS is None:
+                # A model saved as JSON by older versions is imported once
+                MODEL_STORE.import_json(RULES_FILE, ITEMS_FILE, PRODUCTS_FILE)
+                load_products()
+
+def warm_model():
+    """
+    Everything the first request would otherwise pay for: load the catalog and
+    map the model file of the current version (exporting it if no worker has
+    yet). Started in a thread when the server starts.
+    """
+    global WARMUP_SECONDS
+    with WARMUP_LOCK:
+        if MODEL_READY.is_set():
+            return
+        start = time.perf_counter()
+        try:
+            ensure_catalog()
+            print(f"Active model generation: {current_snapshot().generation}")
+        except Exception as e:
+            print(f"Error warming model: {e}")
+        WARMUP_SECONDS = time.perf_counter() - start
+        MODEL_READY.set()
+    print(f"DEBUG: Model warm in {WARMUP_SECONDS:.3f}s")
 
 class AnalysisRequest(BaseModel):
     min_support: float
     min_confidence: float
+    # Sparse one-hot encoding: memory grows with the number of (transaction, item) pairs
+    # instead of transactions x distinct items. Use for long histories / large catalogs.
+    sparse: bool = False
+    # Frequent itemset miner: "apriori", "fpgrowth" or "eclat" (see mining.MINING_ENGINES)
+    algorithm: str = "apriori"
+    # Limits: longest itemset, and keep only the top_k rules by rank_by ("lift" or "confidence")
+    max_len: Optional[int] = None
+    top_k: Optional[int] = None
+    rank_by: str = "lift"
+    # Budget, capped by the server's MAX_ITEMSETS / MAX_MEMORY_MB. A run predicted to exceed it
+    # is auto-adjusted (on_budget="adjust": shorter itemsets, then higher support) or refused
+    max_itemsets: Optional[int] = None
+    max_memory_mb: Optional[float] = None
+    on_budget: str = "adjust"
+    # Report the peak Python memory of encoding + mining (result["peak_memory_mb"]);
+    # off by default, tracing slows the run down
+    trace_memory: bool = False
+
+class SweepRequest(BaseModel):
+    # Grid of thresholds; every support x confidence pair becomes one heatmap cell
+    supports: list[float]
+    confidences: list[float]
+    sparse: bool = False
+    algorithm: str = "apriori"
+    max_len: Optional[int] = None
+    # Same budget as /analyze; a sweep over it is refused, never adjusted
+    max_itemsets: Optional[int] = None
+    max_memory_mb: Optional[float] = None
+
+# Hard mining budget per run (requests may only lower it)
+MAX_ITEMSETS = int(os.environ.get("ANALYSIS_MAX_ITEMSETS", "200000"))
+MAX_MEMORY_MB = float(os.environ.get("ANALYSIS_MAX_MEMORY_MB", "1024"))
+
+def mining_limits(params):
+    """Validate the limit fields of an analysis / sweep request and resolve the budget against the server caps."""
+    if params.get("max_len") is not None and params["max_len"] < 1:
+        raise HTTPException(status_code=400, detail="max_len must be at least 1")
+    if params.get("top_k") is not None and params["top_k"] < 1:
+        raise HTTPException(status_code=400, detail="top_k must be at least 1")
+    if params.get("rank_by", "lift") not in ("lift", "confidence"):
+        raise HTTPException(status_code=400, detail="rank_by must be 'lift' or 'confidence'")
+    if params.get("on_budget", "adjust") not in ("adjust", "refuse"):
+        raise HTTPException(status_code=400, detail="on_budget must be 'adjust' or 'refuse'")
+    params["max_itemsets"] = min(params["max_itemsets"] or MAX_ITEMSETS, MAX_ITEMSETS)
+    params["max_memory_mb"] = min(params["max_memory_mb"] or MAX_MEMORY_MB, MAX_MEMORY_MB)
+    return params
+
+# Largest grid /analyze/sweep accepts (cells = supports x confidences)
+MAX_SWEEP_CELLS = 400
 
 @app.get("/")
 def read_root():
     return {"message": "Apriori Recommendation API is running"}
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    global DATASET
+def upload_file(file: UploadFile = File(...), mode: str = "replace"):
+    """
+    Upload a bookings sheet. mode=replace (default) swaps the dataset;
+    mode=append adds only the new rows and updates the rules incrementally.
+    A plain def: FastAPI runs it in its threadpool, so parsing never blocks the event loop.
+    """
+    global INCREMENTAL_STATE
+    if mode not in ("replace", "append"):
+        raise HTTPException(status_code=400, detail="mode must be 'replace' or 'append'")
+    from ingest import read_upload_cached
     try:
-        contents = await file.read()
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        elif file.filename.endswith(('.xls', '.xlsx')):
-            # Get all sheet names
-            xl = pd.ExcelFile(io.BytesIO(contents))
-            sheet_names = xl.sheet_names
-            print(f"DEBUG: Sheets found: {sheet_names}")
-            
-            # Prioritize sheets with "database", "client", "transaksi", or "order"
-            target_sheet = sheet_names[0]
-            for s in sheet_names:
-                if any(k in s.lower() for k in ['database', 'client', 'trans', 'order', 'data']):
-                    target_sheet = s
-                    break
-            
-            print(f"DEBUG: Using sheet: {target_sheet}")
-            
-            # Read first 30 rows to detect the real header (increased for messy files)
-            preview = pd.read_excel(io.BytesIO(contents), sheet_name=target_sheet, header=None, nrows=30)
-            
-            # Re-defined keywords (more specific to avoid partial matches like 'id' in 'Radit')
-            id_keywords = {'id', 'trans', 'client', 'pelanggan', 'user', 'kode', 'customer', 'pelanggan'}
-            # Added more context for package columns
-            item_keywords = {'item', 'nama', 'product', 'paket', 'event', 'layanan', 'service', 'barang', 'produk', 'keterangan'}
-            
-            best_row = 0
-            max_score = -1
-
-            for i, row in preview.iterrows():
-                # Score this row based on keyword matches
-                row_values = [str(val).lower().strip() for val in row.values if pd.notnull(val)]
-                if not row_values:
-                    continue
-                    
-                score = 0
-                has_id_keyword = False
-                has_item_keyword = False
-                
-                for val in row_values:
-                    # Check for exact word matches or common prefixes
-                    words = val.replace('/', ' ').replace('_', ' ').replace('(', ' ').replace(')', ' ').split()
-                    if any(k in words for k in id_keywords):
-                        score += 5
-                        has_id_keyword = True
-                    if any(k in words for k in item_keywords):
-                        score += 5
-                        has_item_keyword = True
-                
-                # Bonus if both ID and Item keywords found in same row
-                if has_id_keyword and has_item_keyword:
-                    score += 10
-                
-                if score > max_score and score > 0:
-                    max_score = score
-                    best_row = i
-            
-            print(f"DEBUG: Best header row detected at: {best_row} with score: {max_score}")
-            
-            # Re-read with detected header row and sheet
-            df = pd.read_excel(io.BytesIO(contents), sheet_name=target_sheet, skiprows=best_row)
-            df = df.dropna(how='all').reset_index(drop=True)
-            
-            print(f"DEBUG: Resulting columns: {list(df.columns)}")
-        else:
-            raise HTTPException(status_code=400, detail="Invalid file format")
-        
-        # Clean up: remove fully empty rows/cols
-        df = df.dropna(how='all').dropna(axis=1, how='all')
-        DATASET = df
+        try:
+            # Streamed from the spooled upload: the file is never held in memory as bytes.
+            # Bytes parsed before come back from the dataset cache
+            df, key = read_upload_cached(file.file, file.filename, DATASET_CACHE)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        metrics.UPLOADS.inc(mode=mode)
+        if mode == "append":
+            return dict(append_rows(df), filename=file.filename)
+        with APPEND_LOCK:
+            # Counts maintained for appends belong to the previous dataset
+            set_dataset(df, key)
+            INCREMENTAL_STATE = None
+        metrics.DATASET_ROWS.set(len(df))
+        # Cached analyses of any other dataset are stale now
+        ANALYSIS_CACHE.invalidate(dataset_hash=current_dataset_hash())
         
         # Basic inspection of the uploaded file
         return {
@@ -196,447 +353,674 @@ async def upload_file(file: UploadFile = File(...)):
             "rows": len(df),
             "message": "File uploaded successfully."
         }
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def append_rows(new_rows):
+    """
+    Append new booking rows to DATASET and update the published rules from the
+    maintained itemset counts (see incremental.IncrementalMiner). Only the
+    appended rows are prepared, hashed and written to the dataset cache, and
+    only the transactions they touch are re-extracted: new rows in wide format,
+    every row of the affected clients in long format (found through the row
+    labels per client kept with the counts).
+    """
+    import pandas as pd
+    from analysis import detect_columns, prepare_dataset, extract_keyed_transactions, top_k_rules
+    from incremental import IncrementalMiner
+
+    global INCREMENTAL_STATE, DATASET_HASH
+    if current_dataset() is None:
+        raise HTTPException(status_code=400, detail="No dataset uploaded")
+    if ANALYSIS_PARAMS is None:
+        raise HTTPException(status_code=400, detail="Run /analyze once before appending rows")
+    ensure_catalog()
+
+    with APPEND_LOCK:
+        history_rows = len(DATASET)
+        combined = pd.concat([DATASET, new_rows], ignore_index=True)
+        min_support, min_confidence = ANALYSIS_PARAMS["min_support"], ANALYSIS_PARAMS["min_confidence"]
+        max_len = ANALYSIS_PARAMS.get("max_len")
+        # Taken out while it is updated: if the append fails, the next one counts from scratch
+        state, INCREMENTAL_STATE = INCREMENTAL_STATE, None
+        layout = None
+
+        if state is not None:
+            # Same steps as prepare_dataset, on the appended rows alone
+            df = combined.set_axis([str(c).strip() for c in combined.columns], axis=1)
+            id_col, item_cols = detect_columns(df)
+            new_part = df.iloc[history_rows:].dropna(subset=[id_col])
+            new_ids = new_part[id_col].tolist()
+            client_rows = state[2]
+            is_long_format = state[0][2] or len(set(new_ids)) < len(new_ids) or not client_rows.keys().isdisjoint(new_ids)
+            layout = (id_col, tuple(item_cols), is_long_format, CATALOG_KEYS_HASH, min_support, min_confidence, max_len)
+
+        if state is None or state[0] != layout:
+            # First append after an analysis (or columns/format/catalog changed): count from scratch
+            df, id_col, item_cols, is_long_format = prepare_dataset(combined)
+            layout = (id_col, tuple(item_cols), is_long_format, CATALOG_KEYS_HASH, min_support, min_confidence, max_len)
+            client_rows = {}
+            for label, client in zip(df.index.tolist(), df[id_col].tolist()):
+                client_rows.setdefault(client, []).append(label)
+            with stage("extract"):
+                keyed = extract_keyed_transactions(df, id_col, item_cols, is_long_format, CATALOG_MATCHER)
+            with stage("incremental"):
+                miner = IncrementalMiner(keyed, min_support, min_confidence, is_valid_item=is_valid_catalog_item,
+                                         max_len=max_len)
+            summary = {"transactions_changed": len(keyed), "rescanned": True}
+        else:
+            miner = state[1]
+            for label, client in zip(new_part.index.tolist(), new_ids):
+                client_rows.setdefault(client, []).append(label)
+            if is_long_format:
+                keys = list(dict.fromkeys(new_ids))
+                affected = df.loc[sorted(label for key in keys for label in client_rows[key])]
+            else:
+                keys = new_part.index.tolist()
+                affected = new_part
+            with stage("extract"):
+                keyed = extract_keyed_transactions(affected, id_col, item_cols, is_long_format, CATALOG_MATCHER)
+            with stage("incremental"):
+                summary = miner.update({key: keyed.get(key) for key in keys})
+
+        rules = top_k_rules(miner.rules(), ANALYSIS_PARAMS.get("top_k"), ANALYSIS_PARAMS.get("rank_by", "lift"))
+        result = {
+            "rules": rules,
+            "items": miner.items(),
+            "message": f"Appended {len(new_rows)} rows. Found {len(rules)} rules."
+        }
+        apply_analysis_result(result, source="append")
+        # Stored like an upload, so the appended rows survive a restart too: the rows
+        # alone, keyed as an append to the stored history
+        digest = current_dataset_digest().grown(combined)
+        rows_key = DATASET_CACHE.rows_key(digest.hexdigest())
+        with stage("dataset_cache"):
+            if DATASET_KEY is not None:
+                DATASET_CACHE.put(rows_key, combined.iloc[history_rows:], keep=DATASET_KEY)
+                key = DATASET_CACHE.appended_key(DATASET_KEY, rows_key)
+            else:
+                DATASET_CACHE.put(rows_key, combined)
+                key = rows_key
+        set_dataset(combined, key)
+        DATASET_HASH = (combined, digest)
+        metrics.DATASET_ROWS.set(len(combined))
+        INCREMENTAL_STATE = (layout, miner, client_rows)
+
+    print(f"DEBUG: Append of {len(new_rows)} rows: {summary}")
+    ANALYSIS_CACHE.invalidate(dataset_hash=current_dataset_hash())
+    return {
+        "columns": list(combined.columns),
+        "rows": len(combined),
+        "rows_appended": len(new_rows),
+        "transactions_changed": summary["transactions_changed"],
+        "rescanned": summary["rescanned"],
+        "rules_count": len(rules),
+        "message": result["message"]
+    }
+
 @app.post("/upload-catalog")
-async def upload_catalog(file: UploadFile = File(...)):
-    global PRODUCTS
+def upload_catalog(file: UploadFile = File(...), mode: str = "replace"):
+    """
+    Load the catalog from an .xlsx sheet or a .sql dump. mode=replace (default)
+    makes the file the whole catalog; mode=upsert adds and updates its products
+    and keeps the others. Either way only the products that differ from the
+    current catalog are applied (see update_catalog). A plain def: FastAPI runs
+    it in its threadpool, and SQL dumps are parsed as they are read.
+    """
+    if mode not in ("replace", "upsert"):
+        raise HTTPException(status_code=400, detail="mode must be 'replace' or 'upsert'")
+    # Let a running warm-up finish first so it cannot overwrite the new catalog
+    ensure_catalog()
     try:
-        contents = await file.read()
         filename = file.filename.lower()
         new_products = {}
         count = 0
 
         if filename.endswith(('.xls', '.xlsx')):
             import pandas as pd
-            df = pd.read_excel(io.BytesIO(contents))
-            # Normalize column names
-            df.columns = df.columns.astype(str).str.strip().str.lower()
-            
-            for _, row in df.iterrows():
-                try:
-                    category = str(row.get('category', '')).strip()
-                    name = str(row.get('name', '')).strip()
-                    if not name: name = str(row.get('nama', '')).strip()
-                    
-                    # Key: "Category Name" or just "Name" if category missing
-                    key_parts = []
-                    if category: key_parts.append(category)
-                    if name: key_parts.append(name)
-                    key = " ".join(key_parts).strip()
-                    
-                    if not key: continue
-
-                    new_products[key] = {
-                        "id": str(row.get('id', '')),
-                        "name": name,
-                        "category": category,
-                        "price": str(row.get('price', '')),
-                        "description": str(row.get('description', '')),
-                        "image": str(row.get('image', ''))
-                    }
+            with stage("parse"):
+                df = pd.read_excel(file.file)
+                # Normalize column names
+                df.columns = df.columns.astype(str).str.strip().str.lower()
+                for key, product in sheet_catalog_products(df):
+                    new_products[key] = product
                     count += 1
-                except:
-                    continue
 
         elif filename.endswith('.sql'):
-            # Manual SQL Parsing for INSERT INTO statements
-            # Pattern: INSERT INTO `packages` (...) VALUES (...);
-            # We assume the user's specific format: (id, 'Name', 'Desc', Price, 'Image')
-            
-            content_str = contents.decode('utf-8')
-            import re
-            
-            # Regex to find the VALUES part. 
-            # This captures groups like: (14, 'Signature Plus', 'Desc...', 15000000.00, 'img/...')
-            # We handle the fact that VALUES can be followed by multiple (...) separated by commas.
-            
-            # Simple approach: Finding all matches of (...) that look like our data
-            # Look for pattern: (Number, 'String', 'String', Number, 'String')
-            # Adjust regex to be flexible but specific enough
-            
-            # Pattern breakdown:
-            # \(          Start group
-            # \s*(\d+)    Capture ID (digits)
-            # \s*,\s*     Comma
-            # '([^']*)'   Capture Name (Single quoted string, no escaped quotes handling needed for simple dump)
-            # \s*,\s*     Comma
-            # '([^']*)'   Capture Description
-            # \s*,\s*     Comma
-            # ([\d\.]+)   Capture Price (digits and dot)
-            # \s*,\s*     Comma
-            # '([^']*)'   Capture Image
-            # \s*\)       End group
-            
-            pattern = re.compile(r"\(\s*(\d+)\s*,\s*'([^']*)'\s*,\s*'([^']*)'\s*,\s*([\d\.]+)\s*,\s*'([^']*)'\s*\)")
-            
-            matches = pattern.findall(content_str)
-            
-            for match in matches:
-                pid, name, desc, price, image = match
-                name = name.strip()
-                
-                # For SQL data, we don't have explicit category.
-                # Key will be the Product Name itself.
-                # Recommendation lookup will need fuzzy matching.
-                key = name 
-                
-                new_products[key] = {
-                    "id": pid,
-                    "name": name,
-                    "category": "", # No category in SQL
-                    "price": price,
-                    "description": desc.replace('\\r\\n', '\n'), # Clean formatting
-                    "image": image
-                }
-                count += 1
+            # INSERT rows streamed from the upload (spooled to disk by Starlette past 1 MB)
+            with stage("parse"):
+                for key, product in sql_catalog_products(file.file):
+                    new_products[key] = product
+                    count += 1
                 
         else:
             raise HTTPException(status_code=400, detail="Catalog must be .xlsx or .sql file")
 
-        PRODUCTS = new_products
-        save_products(PRODUCTS)
+        products, changed, removed = diff_catalog(PRODUCTS, new_products, replace=mode == "replace")
+        if products is None:
+            replace_catalog(new_products)
+        else:
+            update_catalog(products, changed, removed)
+        current_snapshot()
         
         return {
             "message": f"Catalog uploaded successfully. Processed {count} items.",
+            "mode": mode,
+            "changed": len(changed),
+            "removed": len(removed),
             "sample_keys": list(PRODUCTS.keys())[:5]
         }
         
+    except HTTPException:
+        raise
+    except SqlDumpError as e:
+        raise HTTPException(status_code=400, detail=f"Upload failed: {str(e)}")
     except Exception as e:
         # import traceback
         # traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+def diff_catalog(old, new, replace):
+    """
+    (products, changed, removed): the catalog once upload `new` is applied to
+    `old`, the products it adds or modifies, and the keys it removes (replace
+    only: the keys missing from `new`). Kept keys keep their place and added
+    ones go last; products is None when a replace lists the keys in another
+    order, which only a full replacement (replace_catalog) keeps.
+    """
+    changed = {key: product for key, product in new.items() if old.get(key) != product}
+    if not replace:
+        return {**old, **new}, changed, []
+    removed = [key for key in old if key not in new]
+    products = {key: new[key] for key in old if key in new}
+    products.update(new)
+    if list(products) != list(new):
+        return None, changed, removed
+    return products, changed, removed
+
+def replace_catalog(products):
+    """Make `products` the catalog: every index rebuilt, the whole catalog rewritten."""
+    global PRODUCTS
+    PRODUCTS = products
+    build_catalog_indexes()
+    # Cached analyses built against other catalog keys are stale now
+    ANALYSIS_CACHE.invalidate(catalog_hash=CATALOG_KEYS_HASH)
+    save_products(PRODUCTS)
+
+def update_catalog(products, changed, removed):
+    """
+    Make `products` the catalog, `changed` (added or modified products) and
+    `removed` (keys) being all that differs from PRODUCTS. Only what the
+    changed keys reach is invalidated:
+    - the matcher and index are rebuilt only when keys are added or removed;
+    - cached analyses depend on the keys alone: they survive field edits, and
+      removals of keys they never matched;
+    - the active generation's recommendation table is patched, not rebuilt
+      (see patch_recommendation_table).
+    Only the changed rows are written to MODEL_STORE.
+    """
+    global PRODUCTS, CATALOG_INDEX, CATALOG_HASH
+    if not changed and not removed:
+        return
+    old_products, old_keys_hash = PRODUCTS, CATALOG_KEYS_HASH
+    added = [key for key in changed if key not in old_products]
+    _, generation, _ = MODEL_STORE.model_state()
+    table = MODEL_STORE.recommendations(generation, CATALOG_HASH) if generation is not None else None
+
+    PRODUCTS = products
+    if added or removed:
+        build_catalog_indexes()
+    else:
+        # Same keys: the matcher and the index lookups still hold
+        CATALOG_INDEX = CATALOG_INDEX.with_values(products)
+        CATALOG_HASH = catalog_fingerprint(products)
+
+    if added:
+        # A new key may match transactions no cached analysis has seen
+        ANALYSIS_CACHE.invalidate(catalog_hash=CATALOG_KEYS_HASH)
+    elif removed:
+        # An analysis that never matched a removed key would find the same items without it
+        gone = set(removed)
+        kept = ANALYSIS_CACHE.retarget_catalog(
+            old_keys_hash, CATALOG_KEYS_HASH,
+            keep=lambda result: isinstance(result.get("items"), list) and gone.isdisjoint(result["items"]))
+        print(f"DEBUG: {kept} cached analyses kept after removing {len(removed)} catalog keys")
+
+    if table is not None:
+        with stage("materialize"):
+            table = patch_recommendation_table(table, MODEL_STORE.packed_rules(generation),
+                                               MODEL_STORE.load_items(generation), old_products,
+                                               Catalog(PRODUCTS, CATALOG_INDEX), set(changed) | set(removed))
+        # Saved before the catalog version moves, so the export finds it
+        MODEL_STORE.save_recommendations(generation, CATALOG_HASH, table)
+    MODEL_STORE.upsert_products(changed, removed)
+    print(f"DEBUG: Catalog updated: {len(added)} added, {len(changed) - len(added)} modified, {len(removed)} removed")
+
+def sheet_catalog_products(df):
+    """
+    (key, product) for the rows of a catalog sheet with lowercased column
+    names, built a column at a time: cells read as str() of their value,
+    name falling back to nama, key "Category Name"; rows without a key are
+    skipped.
+    """
+    import pandas as pd
+
+    def column(name):
+        if name not in df.columns:
+            return pd.Series("", index=df.index, dtype=object)
+        return df[name].astype(object).map(str)
+
+    category = column('category').str.strip()
+    name = column('name').str.strip()
+    name = name.where(name != "", column('nama').str.strip())
+    # Key: "Category Name" or just "Name" if category missing
+    key = (category + " " + name).str.strip()
+    rows = (key != "").to_numpy()
+    fields = [key, name, category] + [column(c) for c in ('id', 'price', 'description', 'image')]
+    for key, name, category, pid, price, description, image in zip(*(f[rows].tolist() for f in fields)):
+        yield key, {
+            "id": pid,
+            "name": name,
+            "category": category,
+            "price": price,
+            "description": description,
+            "image": image
+        }
+
+def sql_catalog_products(fileobj):
+    """
+    (key, product) for the rows of a SQL dump's INSERT statements into a table
+    with a name (or nama) column. Columns are mapped by name, from the INSERT
+    column list or the CREATE TABLE; rows of dumps without either are read as
+    (id, name, description, price, image), the layout of packages.sql.
+    """
+    legacy_columns = ("id", "name", "description", "price", "image")
+    for table, columns, values in iter_insert_rows(fileobj):
+        if columns is None and len(values) == len(legacy_columns):
+            columns = legacy_columns
+        fields = {str(c).lower(): v for c, v in zip(columns or (), values)}
+        if "name" not in fields and "nama" not in fields:
+            continue
+        name = (fields.get("name") or fields.get("nama") or "").strip()
+        category = (fields.get("category") or "").strip()
+        # Key: "Category Name", like the sheet upload; packages.sql has no category
+        key = " ".join(part for part in (category, name) if part)
+        if not key:
+            continue
+        yield key, {
+            "id": fields.get("id") or "",
+            "name": name,
+            "category": category,
+            "price": fields.get("price") or "",
+            "description": (fields.get("description") or "").replace("\r\n", "\n"),  # Clean formatting
+            "image": fields.get("image") or ""
+        }
+
 def is_valid_catalog_item(item_name):
     """
     Strict validation: Check if item exists in the product catalog.
     Returns True only if there's a match (fuzzy or exact).
     """
-    global PRODUCTS
-    if not PRODUCTS:
-        # If no catalog loaded, allow all items (backward compatibility)
-        return True
-    
-    item_lower = str(item_name).lower().strip()
-    if not item_lower or len(item_lower) < 2:
-        return False
-    
-    for product_key in PRODUCTS.keys():
-        prod_lower = product_key.lower().strip()
-        # Match if: exact match, product in item, or item in product
-        if item_lower == prod_lower or prod_lower in item_lower or item_lower in prod_lower:
-            return True
-    
-    return False
+    global CATALOG_INDEX
+    # Match if: exact match, product in item, or item in product
+    return CATALOG_INDEX.is_catalog_item(item_name)
 
 @app.post("/analyze")
 def analyze_data(request: AnalysisRequest):
-    global DATASET, RULES, PRODUCTS
-    if DATASET is None:
+    """
+    Start an analysis job in the background and return its id right away.
+    Poll /analyze/{job_id} for progress, fetch the summary from /analyze/{job_id}/result
+    and the rules themselves, page by page, from /rules.
+    """
+    from mining import MINING_ENGINES
+    from analysis import run_analysis
+    
+    global PRODUCTS
+    dataset = current_dataset()
+    if dataset is None:
         raise HTTPException(status_code=400, detail="No dataset uploaded")
+    if request.algorithm not in MINING_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Unknown algorithm '{request.algorithm}'. Choose one of: {', '.join(MINING_ENGINES)}")
+    ensure_catalog()
     
+    params = mining_limits(request.model_dump())
     try:
-        df = DATASET.copy()
-        # Ensure column names are clean
-        df.columns = [str(c).strip() for c in df.columns]
-        
-        # Attempt to find Transaction and Item columns (refined for Indonesian/English)
-        id_keywords = ['id', 'trans', 'client', 'pelanggan', 'user', 'no', 'kode', 'nama']
-        item_keywords = ['item', 'nama', 'product', 'paket', 'event', 'layanan', 'service']
-        
-        # Try to find best fit for ID (Transaction)
-        id_col = next((c for c in df.columns if any(k in str(c).lower() for k in id_keywords)), df.columns[0])
-        
-        # Identify all potential item columns (Event, Paket, Service, etc.)
-        item_keywords = ['item', 'nama', 'product', 'paket', 'event', 'layanan', 'service', 'barang', 'produk']
-        item_cols = [c for c in df.columns if any(k in str(c).lower() for k in item_keywords) and c != id_col]
-        
-        if not item_cols:
-            item_cols = [next((c for c in df.columns if c != id_col), df.columns[0])]
-
-        print(f"DEBUG: Using ID column: {id_col}")
-        print(f"DEBUG: Using Item columns: {item_cols}")
-
-        # Preprocessing: 
-        # 1. Drop rows where ID is missing
-        df = df.dropna(subset=[id_col])
-        
-        # Check if Long or Wide format
-        # Long format: ID appears multiple times (multiple rows per client) -> Merge columns in row to form item
-        # Wide format: ID is unique (one row per client) -> Columns are separate items
-        is_long_format = df[id_col].duplicated().any()
-        
-        print(f"DEBUG: Dataset format detected as {'LONG (Multi-row transactions)' if is_long_format else 'WIDE (Single-row transactions)'}")
-
-        # Create a list of normalized product names for fast lookup, sorted by length DESC
-        # This ensures we match "Signature Plus" before "Signature"
-        known_products_sorted = sorted(
-            [k for k in PRODUCTS.keys()], 
-            key=lambda x: len(x), 
-            reverse=True
-        )
-
-        transactions = []
-        
-        # Helper to extract catalog items from a text string
-        def extract_catalog_items(text_soup):
-            found = set() # Use set to avoid duplicates in same row
-            soup_lower = text_soup.lower()
-            
-            # Phase 1: Strict Match (Longest First)
-            for product in known_products_sorted:
-                p_lower = product.lower()
-                if p_lower in soup_lower:
-                    found.add(product)
-                    # We don't remove from soup yet to allow partial matches to also see it
-            
-            # Phase 2: Smart Keyword Match for long names (only if not found already)
-            # This handles "Engagement" matching "Engagement, Siraman, Midodareni..."
-            for product in known_products_sorted:
-                if product in found:
-                    continue
-                    
-                # Split long names into components (ignore generic words)
-                ignore_words = {'dan', 'lain-lain', 'lain', 'dll', 'dan lain-lain', '(', ')', ','}
-                components = [c.strip().lower() for c in product.replace(',', ' ').replace('(', ' ').replace(')', ' ').split() 
-                             if c.strip().lower() not in ignore_words and len(c.strip()) > 3]
-                
-                if not components:
-                    continue
-                
-                # If any significant component (like "Engagement" or "Siraman") is found
-                if any(comp in soup_lower for comp in components):
-                    found.add(product)
-            
-            return list(found)
-
-        # STOPLIST: Generic words to ignore if they appear alone or as leftovers
-        STOPLIST = {'photo', 'video', 'paket', 'package', 'item', 'harga', 'price', 
-                    'jasa', 'layanan', 'service', 'product', 'produk', 'kali', 'pcs', 'album'}
-
-        if is_long_format:
-            # Group by ID first
-            grouped = df.groupby(id_col)
-            for _, group in grouped:
-                # Gather ALL text from this client's rows into one big soup
-                full_text_parts = []
-                for _, row in group.iterrows():
-                    for col in item_cols:
-                        val = str(row[col]).strip()
-                        if pd.notnull(row[col]) and val.lower() != 'nan' and val:
-                            full_text_parts.append(val)
-                
-                full_text_soup = " ".join(full_text_parts)
-                
-                # ONLY use catalog items - no fallback to raw text
-                identified_items = extract_catalog_items(full_text_soup)
-                
-                # Skip transactions with no catalog matches (will be filtered out later)
-                if identified_items:
-                    transactions.append(list(set(identified_items)))
-        else:
-            # Wide format: One row per transaction
-            for _, row in df.iterrows():
-                # Gather text from all columns
-                row_text_parts = []
-                for col in item_cols:
-                    val = str(row[col]).strip()
-                    if pd.notnull(row[col]) and val.lower() != 'nan' and val:
-                        row_text_parts.append(val)
-                
-                full_row_soup = " ".join(row_text_parts)
-                
-                # ONLY use catalog items - no fallback to raw text
-                identified_items = extract_catalog_items(full_row_soup)
-                
-                # Skip transactions with no catalog matches
-                if identified_items:
-                    transactions.append(list(set(identified_items)))
-        
-        # Collect all unique items and validate against catalog
-        unique_items = sorted(list(set([item for sublist in transactions for item in sublist])))
-        
-        # STRICT VALIDATION: Only include items that exist in catalog
-        validated_items = [item for item in unique_items if is_valid_catalog_item(item)]
-        
-        global ITEMS
-        ITEMS = validated_items
-        save_items(ITEMS)
+        cache_key = ANALYSIS_CACHE.key(current_dataset_hash(), CATALOG_KEYS_HASH, params)
         
-        print(f"DEBUG: Total unique items: {len(unique_items)}, Validated (catalog): {len(validated_items)}")
-        
-        # Save audit log of extracted transactions
-        try:
-            with open('debug_transactions.json', 'w') as f:
-                json.dump(transactions, f)
-            print(f"DEBUG: Audit log saved to debug_transactions.json ({len(transactions)} transactions)")
-        except Exception as e:
-            print(f"DEBUG: Failed to save audit log: {e}")
-
-        # Filter out transactions with only 1 item (Apriori needs at least 2)
-        transactions = [t for t in transactions if len(t) > 1]
-        
-        if not transactions:
-            RULES = []
+        # Same dataset, catalog and parameters as an earlier run: publish the cached result
+        cached = ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            result = apply_analysis_result(dict(cached, cached=True), params=params)
+            job_id = ANALYSIS_JOBS.add_completed(result, meta={"params": params, "cached": True})
+            print(f"DEBUG: Analysis job {job_id} served from cache ({cache_key})")
             return {
-                "message": "Pola tidak ditemukan. Pastikan satu Client memiliki minimal 2 item/transaksi yang berbeda agar bisa dianalisis.",
-                "rules": []
-            }
-        
-        # One-Hot Encoding
-        from mlxtend.preprocessing import TransactionEncoder
-        te = TransactionEncoder()
-        te_ary = te.fit(transactions).transform(transactions)
-        one_hot_df = pd.DataFrame(te_ary, columns=te.columns_)
-
-        # Apriori
-        frequent_itemsets = apriori(one_hot_df, min_support=request.min_support, use_colnames=True)
-        
-        if frequent_itemsets.empty:
-            RULES = []
-            return {"message": "No frequent itemsets found with this support level", "rules": []}
-
-        # Association Rules
-        res_rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=request.min_confidence)
-        
-        # Convert to JSON friendly format and VALIDATE against catalog
-        processed_rules = []
-        for _, row in res_rules.iterrows():
-            rule_data = {
-                "antecedents": list(row['antecedents']),
-                "consequents": list(row['consequents']),
-                "support": float(row['support']),
-                "confidence": float(row['confidence']),
-                "lift": float(row['lift'])
+                "job_id": job_id,
+                "status": "completed",
+                "cached": True,
+                "message": "Analysis served from cache. Fetch /analyze/{job_id}/result."
             }
-            
-            # VALIDATE: Check if all items in this rule exist in catalog
-            all_items_in_rule = list(row['antecedents']) + list(row['consequents'])
-            all_valid = all(is_valid_catalog_item(str(item)) for item in all_items_in_rule)
-            
-            if all_valid:
-                processed_rules.append(rule_data)
-            else:
-                print(f"DEBUG: Skipping rule with non-catalog items: {all_items_in_rule}")
-        
-        RULES = processed_rules
-        save_rules(RULES)
         
-        print(f"DEBUG: Total rules generated: {len(res_rules)}, Validated (catalog): {len(RULES)}")
-        return {
-            "message": f"Analysis complete. Found {len(RULES)} rules and {len(ITEMS)} unique items.",
-            "rules": RULES,
-            "items": ITEMS
-        }
-
+        job_id = ANALYSIS_JOBS.submit(
+            run_analysis, dataset, PRODUCTS, params,
+            on_complete=lambda result: apply_analysis_result(result, cache_key, params),
+            meta={"params": params, "cached": False}
+        )
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+    
+    print(f"DEBUG: Analysis job {job_id} submitted with {params}")
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "cached": False,
+        "message": "Analysis started. Poll /analyze/{job_id} for progress."
+    }
 
-@app.get("/recommendations")
-def get_recommendations(service: str):
-    global RULES, PRODUCTS
-    if not RULES:
-        return {
-            "service": service,
-            "recommendations": [],
-            "message": "No rules available. Run analysis first."
-        }
+def apply_analysis_result(result, cache_key=None, params=None, source="analyze"):
+    """
+    Publish a finished analysis: rules and items are written to MODEL_STORE as a
+    new generation and activated in one transaction.
+    Runs in the server process when the job completes. Returns the client-facing
+    summary: counts, limits and the generation, without the rules (page them from /rules).
+    A full analysis (params given) also resets the counts maintained for appends.
+    """
+    global ANALYSIS_PARAMS, INCREMENTAL_STATE
+    if params is not None:
+        # Appends continue with the parameters the run actually used (after budget adjustments)
+        limits = result.get("limits") or {}
+        effective = {key: limits[key] for key in ("min_support", "max_len") if key in limits}
+        ANALYSIS_PARAMS, INCREMENTAL_STATE = dict(params, **effective), None
+    transactions = result.pop("transactions", None)
+    frequent_itemsets = result.pop("frequent_itemsets", [])
+    # Timed in the worker; a cached result was already counted when it ran
+    stage_seconds = result.pop("stage_seconds", None)
+    if stage_seconds and not result.get("cached"):
+        metrics.record_stages(stage_seconds)
+    if cache_key is not None:
+        ANALYSIS_CACHE.put(cache_key, dict(result, frequent_itemsets=frequent_itemsets))
+    # Answers for every known query, stored with the rules: /recommendations becomes a lookup
+    ensure_catalog()
+    catalog = Catalog(PRODUCTS, CATALOG_INDEX)
+    with stage("materialize"):
+        table = build_recommendation_table(PackedRules(pack_rules(result["rules"])), result["items"], catalog)
+    with stage("persist"):
+        result["generation"] = MODEL_STORE.publish(result["rules"], result["items"], params=params or ANALYSIS_PARAMS,
+                                                   source=source, recommendations=(catalog.hash, table))
+        
+        # Save audit log of extracted transactions (cached results reuse the existing log)
+        if transactions is not None:
+            try:
+                with open('debug_transactions.json', 'w') as f:
+                    json.dump(transactions, f)
+                print(f"DEBUG: Audit log saved to debug_transactions.json ({len(transactions)} transactions)")
+            except Exception as e:
+                print(f"DEBUG: Failed to save audit log: {e}")
     
-    # Filter rules where the query is in the antecedents
-    recommendations = []
+    metrics.ANALYSES.inc(algorithm=(params or ANALYSIS_PARAMS or {}).get("algorithm", "apriori"),
+                         source="cache" if result.get("cached") else source)
+    # Exported here once, instead of by every worker that notices the new version
+    current_snapshot()
+    if transactions is not None:
+        metrics.MODEL_TRANSACTIONS.set(len(transactions))
+    if params is not None:
+        metrics.MODEL_ITEMSETS.set(len(frequent_itemsets))
+    summary = {key: value for key, value in result.items() if key != "rules"}
+    summary["rules_count"] = len(result["rules"])
+    summary["rules_url"] = f"/rules?generation={result['generation']}"
+    return summary
+
+@app.post("/analyze/sweep")
+def sweep_analysis(request: SweepRequest):
+    """
+    Rule counts and summaries for a whole grid of min_support x min_confidence in
+    one round trip, for the tuning heatmap. Itemsets are mined once, at the lowest
+    support, in the analysis pool. Nothing is published: run /analyze with the
+    chosen cell for that.
+    """
+    from mining import MINING_ENGINES
+    from analysis import run_sweep
+    
+    dataset = current_dataset()
+    if dataset is None:
+        raise HTTPException(status_code=400, detail="No dataset uploaded")
+    if request.algorithm not in MINING_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Unknown algorithm '{request.algorithm}'. Choose one of: {', '.join(MINING_ENGINES)}")
+    params = mining_limits(request.model_dump())
+    params["supports"] = sorted(set(request.supports))
+    params["confidences"] = sorted(set(request.confidences))
+    if not params["supports"] or not params["confidences"]:
+        raise HTTPException(status_code=400, detail="supports and confidences must not be empty")
+    if not all(0 < v <= 1 for v in params["supports"] + params["confidences"]):
+        raise HTTPException(status_code=400, detail="Thresholds must be in (0, 1]")
+    if len(params["supports"]) * len(params["confidences"]) > MAX_SWEEP_CELLS:
+        raise HTTPException(status_code=400, detail=f"Grid too large (max {MAX_SWEEP_CELLS} cells)")
+    ensure_catalog()
+    
+    # Cached next to full analyses; "sweep" keeps the keys apart
+    cache_key = ANALYSIS_CACHE.key(current_dataset_hash(), CATALOG_KEYS_HASH, dict(params, sweep=True))
+    cached = ANALYSIS_CACHE.get(cache_key)
+    if cached is not None:
+        return dict(cached, cached=True)
+    
+    job_id = ANALYSIS_JOBS.submit(run_sweep, dataset, PRODUCTS, params, meta={"params": params, "sweep": True})
+    job = ANALYSIS_JOBS.wait(job_id)
+    if job["status"] == "cancelled":
+        raise HTTPException(status_code=409, detail="Sweep cancelled")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=analysis_error_status(job), detail=job["error"])
+    ANALYSIS_CACHE.put(cache_key, job["result"])
+    print(f"DEBUG: Sweep job {job_id}: {len(job['result']['cells'])} cells")
+    return dict(job["result"], job_id=job_id, cached=False)
+
+def analysis_error_status(job):
+    # A run refused by the mining budget is the request's fault, not the server's
+    return 422 if job.get("error_type") == "BudgetExceeded" else 500
+
+@app.get("/analyze/{job_id}")
+def get_analysis_job(job_id: str):
+    status = ANALYSIS_JOBS.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown analysis job")
+    return status
+
+@app.post("/analyze/{job_id}/cancel")
+def cancel_analysis_job(job_id: str):
+    if ANALYSIS_JOBS.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown analysis job")
+    if not ANALYSIS_JOBS.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job already finished")
+    return {"job_id": job_id, "message": "Cancellation requested."}
+
+@app.get("/analyze/{job_id}/result")
+def get_analysis_result(job_id: str):
+    job = ANALYSIS_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown analysis job")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=analysis_error_status(job), detail=job["error"])
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {ANALYSIS_JOBS.status(job_id)['status']}")
+    # Where the job's time went, next to this request's own timing
+    for name, info in (ANALYSIS_JOBS.status(job_id).get("stages") or {}).items():
+        if info.get("seconds") is not None:
+            metrics.server_timing(f"job-{name}", info["seconds"])
+    return job["result"]
+
+RULES_PAGE_DEFAULT = 100
+RULES_PAGE_MAX = 1000
+# Rules per store query while streaming NDJSON
+RULES_STREAM_CHUNK = 1000
+
+def encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(state, dict) or not {"generation", "query", "after"} <= set(state):
+            raise ValueError(cursor)
+        return state
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def encode_json(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+@app.get("/rules")
+def list_rules(generation: Optional[int] = None, min_support: Optional[float] = None,
+               min_confidence: Optional[float] = None, min_lift: Optional[float] = None,
+               item: Optional[str] = None, min_antecedents: Optional[int] = None,
+               max_antecedents: Optional[int] = None, sort: str = "lift", order: Optional[str] = None,
+               limit: Optional[int] = None, cursor: Optional[str] = None, format: str = "json"):
+    """
+    Rules of a model generation (default: the active one), filtered and sorted in
+    SQLite and returned a page at a time. Pass next_cursor back as `cursor` for the
+    next page: the cursor pins the generation and the query, so paging is
+    consistent even while new analyses are published. format=ndjson streams every
+    matching rule (up to `limit`) as one JSON object per line instead.
+    """
+    if sort not in RULE_SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(RULE_SORT_COLUMNS)}")
+    order = order or ("asc" if sort == "position" else "desc")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'")
+    if limit is not None and (limit < 1 or (format == "json" and limit > RULES_PAGE_MAX)):
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {RULES_PAGE_MAX}")
+    filters = {"min_support": min_support, "min_confidence": min_confidence, "min_lift": min_lift,
+               "item": item, "min_antecedents": min_antecedents, "max_antecedents": max_antecedents}
+    query = [sort, order, filters]
+
+    after = None
+    if cursor is not None:
+        state = decode_cursor(cursor)
+        if state["query"] != query or generation not in (None, state["generation"]):
+            raise HTTPException(status_code=400, detail="Cursor belongs to a different query")
+        generation, after = state["generation"], state["after"]
+    elif generation is None:
+        generation = MODEL_STORE.active_generation()
+        if generation is None:
+            raise HTTPException(status_code=404, detail=NO_RULES_MESSAGE)
+    if not MODEL_STORE.has_generation(generation):
+        # Cursors outlive generations once MODEL_GENERATIONS_KEPT newer ones are published
+        raise HTTPException(status_code=410 if cursor is not None else 404, detail="Unknown model generation")
+
+    def page(after, size):
+        rows = MODEL_STORE.query_rules(generation, **filters, sort=sort, descending=order == "desc",
+                                       after=after, limit=size)
+        return [dict(rule, position=position) for position, _, rule in rows], \
+            ([rows[-1][1], rows[-1][0]] if rows else after)
+
+    if format == "ndjson":
+        def stream(after, remaining):
+            while remaining:
+                rules, after = page(after, min(RULES_STREAM_CHUNK, remaining))
+                yield b"".join(encode_json(rule) + b"\n" for rule in rules)
+                if len(rules) < min(RULES_STREAM_CHUNK, remaining):
+                    return
+                remaining -= len(rules)
+        return StreamingResponse(stream(after, limit or float("inf")), media_type="application/x-ndjson",
+                                 headers={"X-Model-Generation": str(generation)})
+
+    size = limit or RULES_PAGE_DEFAULT
+    with stage("rules_page"):
+        rules, last = page(after, size)
+    next_cursor = encode_cursor({"generation": generation, "query": query, "after": last}) \
+        if len(rules) == size else None
+    body = {"generation": generation, "rules": rules, "next_cursor": next_cursor}
+    return Response(encode_json(body), media_type="application/json")
+
+@lru_cache(maxsize=256)
+def keyword_regex(kw):
+    # Differentiation: 'wedding' should not match 'prewedding'
+    # We use a negative lookbehind (?<!pre) to achieve this
+    if kw == "wedding":
+        return re.compile(rf"(?<!pre)\b{re.escape(kw)}\b", re.IGNORECASE)
+    return re.compile(rf"\b{re.escape(kw)}\b", re.IGNORECASE)
+
+def keyword_matches(kw, packed, catalog, memo):
+    """
+    Catalog items whose name or description match keyword `kw`, and the rule
+    antecedent keys that match it. Both come from word indexes (see WordIndex):
+    only the products and antecedents holding the keyword's words are searched,
+    so a table build stays linear in the catalog. Memoized in `memo` per
+    distinct keyword for a batch.
+    """
+    keywords = memo.setdefault("keywords", {})
+    if kw not in keywords:
+        kw_regex = keyword_regex(kw)
+        catalog_items = catalog.words.search(kw_regex, kw)
+        if "antecedent_words" not in memo:
+            memo["antecedent_words"] = WordIndex(packed.keys, ((ant,) for ant in packed.keys))
+        antecedents = set(memo["antecedent_words"].search(kw_regex, kw))
+        keywords[kw] = (catalog_items, antecedents)
+    return keywords[kw]
+
+# Extra keywords searched for a query ("wedding" also finds "pernikahan" in descriptions)
+KEYWORD_ALIASES = {"wedding": ["pernikahan"]}
+
+def recommend_service(service, packed, catalog, memo, top_n=5, log=True):
+    """
+    Recommendations for one service from the packed rules and a Catalog of the
+    same snapshot. `memo` holds work shared between the services of one
+    request (keyword matches, rule candidates per set of antecedent keys,
+    product details).
+    """
     query_lower = service.lower().strip()
     
     # Helper to look up product details
     # We try to find the best matching product key for a given item string.
     # e.g. Item: "Wedding Platinum", Product Key: "Platinum" -> Match!
+    # 1. Exact Key Match
+    # 2. Longest Product Name contained in Item Name (match "Signature Plus" over "Signature")
+    details_memo = memo.setdefault("details", {})
     def get_product_details(item_name):
-        item_lower = item_name.lower()
-        
-        # 1. Exact Key Match
-        for k, v in PRODUCTS.items():
-            if k.lower() == item_lower:
-                return v
-        
-        # 2. Check if Product Name is contained in Item Name
-        # e.g. Product "Platinum" is inside Item "Wedding Platinum"
-        # We pick the longest matching product name to be safe (e.g. match "Signature Plus" over "Signature")
-        best_match = None
-        longest_len = 0
-        
-        for k, v in PRODUCTS.items():
-            k_lower = k.lower()
-            if k_lower in item_lower:
-                if len(k_lower) > longest_len:
-                    longest_len = len(k_lower)
-                    best_match = v
-        
-        if best_match:
-            return best_match
-            
-        return None
+        if item_name not in details_memo:
+            details_memo[item_name] = catalog.index.details(item_name)
+        return details_memo[item_name]
 
     # Get details for the *queried* service itself
     query_details = get_product_details(service)
 
     # NEW KEYWORD-BASED SEARCH LOGIC (Smarter differentiation)
     # Step 1: Find all catalog items that match the search keyword in NAME or DESCRIPTION
-    matching_catalog_items = []
-    
-    # Differentiation: 'wedding' should not match 'prewedding'
-    # We use a negative lookbehind (?<!pre) to achieve this
-    search_keywords = [query_lower]
-    if query_lower == "wedding":
-        search_keywords.append("pernikahan")
+    # Step 2: Find association rules where matching items appear in antecedents
+    # Rules are indexed by antecedent item, so only relevant rules are visited
+    search_keywords = [query_lower] + KEYWORD_ALIASES.get(query_lower, [])
     
+    matching_catalog_items = {}  # dict as an ordered set: a common word matches most of the catalog
+    relevant_keys = set()
     for kw in search_keywords:
-        # If it's 'wedding', use specific boundary that excludes 'pre'
-        if kw == "wedding":
-            pattern = rf"(?<!pre)\b{re.escape(kw)}\b"
-        else:
-            pattern = rf"\b{re.escape(kw)}\b"
-            
-        kw_regex = re.compile(pattern, re.IGNORECASE)
-        
-        for product_key, product_data in PRODUCTS.items():
-            product_name = product_key.lower()
-            product_desc = str(product_data.get('description', '')).lower()
-            
-            if kw_regex.search(product_name) or kw_regex.search(product_desc):
-                if product_key not in matching_catalog_items:
-                    matching_catalog_items.append(product_key)
+        catalog_items, antecedents = keyword_matches(kw, packed, catalog, memo)
+        matching_catalog_items.update(dict.fromkeys(catalog_items))
+        relevant_keys.update(antecedents)
+    relevant_keys.update(match.lower() for match in matching_catalog_items)
     
-    print(f"DEBUG: Search '{service}' matched catalog items: {matching_catalog_items}")
+    if log:
+        print(f"DEBUG: Search '{service}' matched catalog items: {list(matching_catalog_items)}")
     
-    # Step 2: Find association rules where matching items appear in antecedents
-    for rule in RULES:
-        antecedent_matches_query = False
-        
-        # Check matching items first
-        if any(match.lower() in [str(ant).lower() for ant in rule['antecedents']] for match in matching_catalog_items):
-            antecedent_matches_query = True
-        else:
-            # Check keywords directly against antecedents
-            for kw in search_keywords:
-                if kw == "wedding":
-                    kw_regex = re.compile(rf"(?<!pre)\b{re.escape(kw)}\b", re.IGNORECASE)
-                else:
-                    kw_regex = re.compile(rf"\b{re.escape(kw)}\b", re.IGNORECASE)
-                
-                if any(kw_regex.search(str(ant).lower()) for ant in rule['antecedents']):
-                    antecedent_matches_query = True
-                    break
-        
-        if antecedent_matches_query:
+    # Services that reach the same antecedents share their candidates ("Platinum" / "platinum")
+    candidates = memo.setdefault("candidates", {})
+    key = frozenset(relevant_keys)
+    if key not in candidates:
+        # Rules come back in their original order so the first rule recommending an item wins
+        recommendations = []
+        seen_items = set()
+        for consequents, confidence in packed.consequents_for(relevant_keys):
             # This rule is relevant - add consequents as recommendations
-            for cons in rule['consequents']:
+            for cons in consequents:
                 # Avoid duplicates and check if already in list
                 # Also filter out items that are purely numeric (usually IDs or prices)
-                if not any(r['item'] == str(cons) for r in recommendations):
+                if str(cons) not in seen_items:
                     item_str = str(cons).strip()
                     if not item_str.isdigit() and len(item_str) > 2:
                         # Fetch Product Details
@@ -644,34 +1028,318 @@ def get_recommendations(service: str):
                         
                         rec_obj = {
                             "item": item_str,
-                            "confidence": f"{int(rule['confidence'] * 100)}%",
+                            "confidence": f"{int(confidence * 100)}%",
                             "details": details # Can be None
                         }
                         recommendations.append(rec_obj)
-    
-    # Sort by confidence
-    recommendations = sorted(recommendations, key=lambda x: int(x['confidence'].replace('%', '')), reverse=True)
+                        seen_items.add(item_str)
+        
+        # Sort by confidence
+        candidates[key] = sorted(recommendations, key=lambda x: int(x['confidence'].replace('%', '')), reverse=True)
 
     return {
         "service": service,
         "service_details": query_details,
-        "recommendations": recommendations[:5] # Return top 5
+        "recommendations": candidates[key][:top_n]
     }
 
+def materialized_queries(items, catalog):
+    """
+    Queries answered from the recommendation table: the mined items, the catalog
+    names, and every word of the names and descriptions, lowercased.
+    """
+    queries = {str(item).lower().strip() for item in items}
+    for product_key, product_data in catalog.products.items():
+        queries.add(product_key.lower().strip())
+        for text in (product_key, str(product_data.get('description', ''))):
+            queries.update(re.findall(r"[^\W\d_]{3,}", text.lower()))
+    queries.update(KEYWORD_ALIASES)
+    queries.discard("")
+    return sorted(queries)
+
+def build_recommendation_table(packed, items, catalog):
+    """{query: {"service_details", "recommendations" (top MATERIALIZED_TOP_N)}} for materialized_queries()."""
+    memo = {}
+    table = {}
+    for query in materialized_queries(items, catalog):
+        result = recommend_service(query, packed, catalog, memo, top_n=MATERIALIZED_TOP_N, log=False)
+        del result["service"]
+        table[query] = result
+    print(f"DEBUG: Materialized recommendations for {len(table)} queries")
+    return table
+
+def patch_recommendation_table(table, packed, items, old_products, catalog, changed_keys):
+    """
+    build_recommendation_table() for `catalog` from `table`, built for
+    `old_products`, when only the products of `changed_keys` differ. Just the
+    queries a changed product can answer differently are recomputed: those
+    whose keyword (or an alias) occurs in its old or new name or description,
+    and those whose own or recommended items take their details from it (its
+    key is contained in the item name).
+    """
+    texts = []
+    for key in changed_keys:
+        versions = [products[key] for products in (old_products, catalog.products) if key in products]
+        descriptions = {str(product.get('description', '')).lower() for product in versions}
+        # Added, removed or described anew: keyword matches may change (not for a new price)
+        if len(versions) == 1 or len(descriptions) == 2:
+            texts += [key.lower()] + sorted(descriptions)
+    lowered_keys = {key.lower() for key in changed_keys}
+
+    def affected(query, entry):
+        for kw in [query] + KEYWORD_ALIASES.get(query, []):
+            # The regex can only match texts holding the keyword
+            if any(kw in text and keyword_regex(kw).search(text) for text in texts):
+                return True
+        names = [query] + [rec["item"].lower() for rec in entry["recommendations"]]
+        return any(key in name for name in names for key in lowered_keys)
+
+    memo = {}
+    patched = {}
+    recomputed = 0
+    for query in materialized_queries(items, catalog):
+        entry = table.get(query)
+        if entry is None or affected(query, entry):
+            entry = recommend_service(query, packed, catalog, memo, top_n=MATERIALIZED_TOP_N, log=False)
+            del entry["service"]
+            recomputed += 1
+        patched[query] = entry
+    print(f"DEBUG: Materialized recommendations patched: {recomputed} of {len(patched)} queries recomputed")
+    return patched
+
+def materialized_recommendations(generation, catalog=None):
+    """
+    Recommendation table of `generation` for `catalog` (default: the catalog
+    loaded in this process). Built (and stored) on first use for generations
+    published without one, or after the catalog changed.
+    """
+    if catalog is None:
+        catalog = Catalog(PRODUCTS, CATALOG_INDEX)
+    # Cached by the store per generation: normally a dictionary lookup
+    table = MODEL_STORE.recommendations(generation, catalog.hash)
+    if table is not None:
+        return table
+    with RECOMMENDATION_LOCK:
+        table = MODEL_STORE.recommendations(generation, catalog.hash)
+        if table is None:
+            with stage("materialize"):
+                table = build_recommendation_table(MODEL_STORE.packed_rules(generation),
+                                                   MODEL_STORE.load_items(generation), catalog)
+            MODEL_STORE.save_recommendations(generation, catalog.hash, table)
+    return table
+
+def model_file_dir():
+    return os.environ.get("MODEL_FILE_DIR") or os.path.join(os.path.dirname(os.path.abspath(MODEL_STORE.path)), "model_files")
+
+def export_model_file(path, version, generation):
+    """
+    Write the store's model as `version`'s model file and return its Catalog.
+    Whichever worker gets there first writes it; the content is the same. Read
+    after the version, so a file never holds an older model than its name says.
+    """
+    catalog_version, products = MODEL_STORE.load_catalog()
+    catalog = Catalog(products)
+    packed_data = MODEL_STORE.packed_rules_data(generation) if generation is not None else None
+    table = materialized_recommendations(generation, catalog) if packed_data else {}
+    items = MODEL_STORE.load_items(generation) if packed_data else []
+    meta = {"store_id": MODEL_STORE.store_id, "model_version": version, "generation": generation,
+            "catalog_version": catalog_version, "catalog_hash": catalog.hash}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        write_model_file(path, meta, packed_data or pack_rules([]), items, products, table)
+    except OSError:
+        # Another worker wrote (and mapped) it meanwhile: Windows refuses the rename
+        if not os.path.exists(path):
+            raise
+    prefix = f"{MODEL_STORE.store_id}-v"
+    versions = sorted((int(name[len(prefix):-len(MODEL_FILE_SUFFIX)]), name) for name in os.listdir(os.path.dirname(path))
+                      if name.startswith(prefix) and name.endswith(MODEL_FILE_SUFFIX))
+    for old_version, name in versions:
+        if old_version < version - MODEL_FILES_KEPT:
+            try:
+                os.remove(os.path.join(os.path.dirname(path), name))
+            except OSError:
+                pass  # still mapped somewhere (Windows); removed by a later export
+    return catalog
+
+def build_snapshot(version, generation):
+    """ModelSnapshot of `version`: its model file mapped, exported first if no worker has yet."""
+    path = os.path.join(model_file_dir(), f"{MODEL_STORE.store_id}-v{version}{MODEL_FILE_SUFFIX}")
+    catalog = None
+    if not os.path.exists(path):
+        with stage("export"):
+            catalog = export_model_file(path, version, generation)
+    try:
+        model_file = ModelFile(path)
+    except ValueError:
+        # Left by an older model file format
+        catalog = export_model_file(path, version, generation)
+        model_file = ModelFile(path)
+    return ModelSnapshot(version, model_file, catalog)
+
+def current_snapshot():
+    """
+    The ModelSnapshot to serve: the current one while the store's model version
+    is unchanged (one SQLite read to tell), otherwise a new one, built off to the
+    side and swapped in. Also brings this process' catalog (used by uploads and
+    analyses) in line with it.
+    """
+    global SNAPSHOT, PRODUCTS
+    version, generation, catalog_version = MODEL_STORE.model_state()
+    snapshot = SNAPSHOT
+    if snapshot is not None and (snapshot.model_file.meta["store_id"], snapshot.version) == (MODEL_STORE.store_id, version):
+        return snapshot
+    with SNAPSHOT_LOCK:
+        snapshot = SNAPSHOT
+        if snapshot is None or (snapshot.model_file.meta["store_id"], snapshot.version) != (MODEL_STORE.store_id, version):
+            kept = RECENT_SNAPSHOTS.get((MODEL_STORE.store_id, generation, catalog_version))
+            # Back to a model served recently (rollback): nothing to export or map
+            snapshot = kept.at_version(version) if kept is not None else build_snapshot(version, generation)
+            key = (MODEL_STORE.store_id,) + snapshot.key
+            RECENT_SNAPSHOTS.pop(key, None)
+            RECENT_SNAPSHOTS[key] = snapshot
+            while len(RECENT_SNAPSHOTS) > MODEL_STORE.keep_generations:
+                del RECENT_SNAPSHOTS[next(iter(RECENT_SNAPSHOTS))]
+            SNAPSHOT = snapshot
+            if snapshot.catalog.hash != CATALOG_HASH:
+                PRODUCTS = snapshot.catalog.products
+                build_catalog_indexes()
+            metrics.MODEL_RULES.set(len(snapshot.packed))
+            print(f"DEBUG: Serving model version {version} (generation {snapshot.generation}, "
+                  f"catalog {snapshot.catalog_version}){' from memory' if kept is not None else ''}")
+    return snapshot
+
+def lookup_recommendations(service, snapshot, memo, top_n=5):
+    # Known queries are a table lookup; free text is computed on demand
+    hit = snapshot.recommendation(service.lower()) if top_n <= MATERIALIZED_TOP_N else None
+    if hit is not None:
+        return {
+            "service": service,
+            "service_details": hit["service_details"],
+            "recommendations": hit["recommendations"][:top_n]
+        }
+    return recommend_service(service, snapshot.packed, snapshot.catalog, memo, top_n=top_n)
+
+NO_RULES_MESSAGE = "No rules available. Run analysis first."
+
+@app.get("/recommendations")
+def get_recommendations(service: str):
+    ensure_catalog()
+    # One snapshot per request: rules, table and catalog of the same model
+    snapshot = current_snapshot()
+    if not snapshot.packed:
+        return {
+            "service": service,
+            "recommendations": [],
+            "message": NO_RULES_MESSAGE
+        }
+    return lookup_recommendations(service, snapshot, {}, top_n=5) # Return top 5
+
+class BatchRecommendationRequest(BaseModel):
+    services: list[str]
+    top_n: int = 5
+
+MAX_BATCH_SERVICES = 200
+
+@app.post("/recommendations/batch")
+def get_recommendations_batch(request: BatchRecommendationRequest):
+    """
+    Recommendations for many services in one call, e.g. every package of a page.
+    Keyword matches, rule candidates and product details are computed once and
+    shared by the services that need them; results come back in request order.
+    """
+    if not request.services:
+        raise HTTPException(status_code=400, detail="services must not be empty")
+    if len(request.services) > MAX_BATCH_SERVICES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SERVICES} services per batch")
+    if not 1 <= request.top_n <= 50:
+        raise HTTPException(status_code=400, detail="top_n must be between 1 and 50")
+    ensure_catalog()
+    snapshot = current_snapshot()
+    generation = snapshot.generation
+    if not snapshot.packed:
+        return {
+            "generation": generation,
+            "results": [{"service": service, "recommendations": []} for service in request.services],
+            "message": NO_RULES_MESSAGE
+        }
+    memo = {}
+    with stage("recommend_batch"):
+        results = [lookup_recommendations(service, snapshot, memo, top_n=request.top_n)
+                   for service in request.services]
+    return {"generation": generation, "results": results}
+
 @app.get("/items")
 def get_items():
-    global ITEMS
-    return {"items": ITEMS}
+    ensure_catalog()
+    return {"items": list(current_snapshot().items)}
 
 @app.get("/status")
 def get_status():
-    global DATASET, RULES
+    dataset = current_dataset()
     return {
-        "dataset_loaded": DATASET is not None,
-        "rows": len(DATASET) if DATASET is not None else 0,
-        "rules_count": len(RULES)
+        "dataset_loaded": dataset is not None,
+        "rows": len(dataset) if dataset is not None else 0,
+        "rules_count": MODEL_STORE.rule_count(),
+        "generation": MODEL_STORE.active_generation()
     }
 
-if __name__ == "__main__":
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint: stage timings, request latency and model sizes."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ready")
+def get_ready():
+    """Readiness probe: 200 once the catalog and the active rules are loaded, 503 while warming up."""
+    generation = MODEL_STORE.active_generation()
+    body = {
+        "ready": MODEL_READY.is_set(),
+        "catalog_loaded": PRODUCTS is not None,
+        "products": len(PRODUCTS) if PRODUCTS is not None else 0,
+        "generation": generation,
+        "warmup_seconds": WARMUP_SECONDS
+    }
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/model/generations")
+def list_model_generations():
+    """Published model generations, newest first (the last MODEL_GENERATIONS_KEPT are kept)."""
+    return {"generations": MODEL_STORE.generations()}
+
+@app.post("/model/generations/{generation}/activate")
+def activate_model_generation(generation: int):
+    """Roll back (or forward) to a kept generation."""
+    global INCREMENTAL_STATE
+    if not MODEL_STORE.activate(generation):
+        raise HTTPException(status_code=404, detail="Unknown model generation")
+    # Counts maintained for appends belong to the generation they produced
+    INCREMENTAL_STATE = None
+    current_snapshot()
+    return {"generation": generation, "message": "Model generation activated."}
+
+def serve(host="0.0.0.0", port=8000, workers=1):
+    """
+    Run the server. With workers > 1, uvicorn worker processes share the model
+    through its mapped file (uploads, datasets and analysis jobs still live in
+    the worker that received them).
+    """
+    import socket
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from uvicorn.supervisors import Multiprocess
+
+    if workers <= 1:
+        uvicorn.run(app, host=host, port=port)
+        return
+
+    config = uvicorn.Config("main:app", host=host, port=port, workers=workers)
+    # uvicorn binds the shared socket with proto 0, so asyncio never sets TCP_NODELAY
+    # on its connections and each response waits out the client's delayed ACK (~40 ms)
+    sock = config.bind_socket()
+    sock = socket.socket(sock.family, sock.type, socket.IPPROTO_TCP, fileno=sock.detach())
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.set_inheritable(True)
+    Multiprocess(config, sockets=[sock]).run()
+
+if __name__ == "__main__":
+    serve(port=int(os.environ.get("PORT", "8000")), workers=int(os.environ.get("WEB_CONCURRENCY", "1")))
@@ -0,0 +1,186 @@
+"""
+Pipeline instrumentation: Prometheus metrics (text exposition format, served
+by /metrics) and per-request Server-Timing entries.
+
+No client library: counters, gauges and histograms are a few dicts behind a
+lock, which is all a single server process needs. Analysis stages run in the
+worker process; their timings come back on the result (run_analysis'
+"stage_seconds") and are recorded by the server when the result is published.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds: from a recommendation lookup (~ms) to a large mining run (minutes)
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labels, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=TIME_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def value(self, **labels):
+        """(observation count, sum) for the label set, or None."""
+        found = super().value(**labels)
+        return (sum(found[0]), found[1]) if found is not None else None
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                out.append((f"{self.name}_bucket", key, (("le", _format_value(float(bound))),), cumulative))
+            out.append((f"{self.name}_sum", key, (), total))
+            out.append((f"{self.name}_count", key, (), cumulative))
+        return out
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "apriori_stage_seconds",
+    "Time spent in each pipeline stage (spool, parse, header_detection, extract, encode, mine, rules, validate, persist).",
+    ["stage"])
+REQUEST_SECONDS = Histogram(
+    "apriori_http_request_seconds",
+    "Request latency by route; route=\"/recommendations\" is the recommendation latency.",
+    ["method", "route", "status"])
+ANALYSES = Counter("apriori_analyses_total", "Published analyses by algorithm and source (analyze, cache, append).",
+                   ["algorithm", "source"])
+UPLOADS = Counter("apriori_uploads_total", "Parsed uploads by mode.", ["mode"])
+DATASET_ROWS = Gauge("apriori_dataset_rows", "Rows of the current dataset.")
+MODEL_TRANSACTIONS = Gauge("apriori_model_transactions", "Transactions extracted by the last published analysis.")
+MODEL_ITEMSETS = Gauge("apriori_model_frequent_itemsets", "Frequent itemsets found by the last published analysis.")
+MODEL_RULES = Gauge("apriori_model_rules", "Rules in the active model generation.")
+
+# --- Server-Timing --------------------------------------------------------
+
+# [(name, seconds)] of the request being handled; None outside a request
+_TIMINGS = contextvars.ContextVar("server_timings", default=None)
+
+
+def begin_request():
+    """Start collecting Server-Timing entries for the current request. Returns the list."""
+    timings = []
+    _TIMINGS.set(timings)
+    return timings
+
+
+def server_timing(name, seconds):
+    """Report a duration in the current request's Server-Timing header (no-op outside a request)."""
+    timings = _TIMINGS.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+def server_timing_header(timings, total=None):
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+@contextmanager
+def stage(name):
+    """Time a block as pipeline stage `name`: histogram observation plus Server-Timing entry."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name)
+        server_timing(name, seconds)
+
+
+def record_stages(stage_seconds):
+    """Record stage timings measured elsewhere (an analysis worker) as if timed here."""
+    for name, seconds in stage_seconds.items():
+        if seconds is not None:
+            STAGE_SECONDS.observe(seconds, stage=name)
+            server_timing(name, seconds)
@@ -0,0 +1,203 @@
+from math import ceil, comb
+
+import numpy as np
+import pandas as pd
+from mlxtend.frequent_patterns import apriori, fpgrowth
+from scipy import sparse as sp
+
+# Mining engines: fn(one_hot_df, min_support, max_len=None) -> DataFrame[support, itemsets]
+# one_hot_df is the (dense or sparse) boolean TransactionEncoder frame; itemsets
+# are frozensets of column names, exactly like mlxtend's use_colnames=True output.
+# max_len caps the itemset length (None: no cap).
+
+
+def mine_apriori(one_hot_df, min_support, max_len=None):
+    return apriori(one_hot_df, min_support=min_support, use_colnames=True, max_len=max_len)
+
+
+def mine_fpgrowth(one_hot_df, min_support, max_len=None):
+    return fpgrowth(one_hot_df, min_support=min_support, use_colnames=True, max_len=max_len)
+
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint16)
+
+
+def _popcount(words):
+    if hasattr(np, 'bitwise_count'):  # NumPy >= 2.0
+        return int(np.bitwise_count(words).sum())
+    return int(_POPCOUNT_TABLE[words.view(np.uint8)].sum())
+
+
+def item_bitsets(one_hot_df):
+    """
+    Vertical layout: one packed bitset (uint64 words) per item, bit t set when
+    transaction t contains the item.
+    """
+    n_rows = len(one_hot_df)
+    n_words = (n_rows + 63) // 64
+    if one_hot_df.shape[1] and all(isinstance(dt, pd.SparseDtype) for dt in one_hot_df.dtypes):
+        # Bits set straight from each column's row indices: never a dense column
+        csc = one_hot_df.sparse.to_coo().tocsc()
+        bitsets = []
+        for j in range(csc.shape[1]):
+            rows = csc.indices[csc.indptr[j]:csc.indptr[j + 1]].astype(np.uint64)
+            words = np.zeros(n_words, dtype=np.uint64)
+            np.bitwise_or.at(words, rows >> np.uint64(6), np.uint64(1) << (rows & np.uint64(63)))
+            bitsets.append(words)
+        return bitsets
+
+    matrix = one_hot_df.to_numpy(dtype=bool)
+    bitsets = []
+    for j in range(matrix.shape[1]):
+        packed = np.packbits(matrix[:, j], bitorder='little')
+        packed = np.pad(packed, (0, n_words * 8 - len(packed)))
+        bitsets.append(packed.view(np.uint64))
+    return bitsets
+
+
+def mine_eclat(one_hot_df, min_support, max_len=None):
+    """
+    Eclat over vertical bitsets: support of an itemset is the popcount of the
+    AND of its items' bitsets, extended depth-first in column order.
+    """
+    n_rows = len(one_hot_df)
+    columns = list(one_hot_df.columns)
+    if n_rows == 0:
+        return pd.DataFrame({'support': [], 'itemsets': []})
+
+    supports = []
+    itemsets = []
+
+    # Frequent single items, kept in column order
+    frequent = []
+    for j, bits in enumerate(item_bitsets(one_hot_df)):
+        support = _popcount(bits) / n_rows
+        if support >= min_support:
+            frequent.append((j, bits))
+            supports.append(support)
+            itemsets.append((j,))
+
+    # Depth-first extension of each prefix with the items after it
+    stack = [((j,), bits, frequent[k + 1:]) for k, (j, bits) in enumerate(frequent)] if max_len != 1 else []
+    while stack:
+        prefix, prefix_bits, candidates = stack.pop()
+        extensions = []
+        for j, bits in candidates:
+            joined = prefix_bits & bits
+            support = _popcount(joined) / n_rows
+            if support >= min_support:
+                extensions.append((j, joined))
+                supports.append(support)
+                itemsets.append(prefix + (j,))
+        if max_len is not None and len(prefix) + 1 >= max_len:
+            continue
+        for k, (j, joined) in enumerate(extensions):
+            stack.append((prefix + (j,), joined, extensions[k + 1:]))
+
+    # Same layout as mlxtend: ordered by itemset length, then by column positions
+    order = sorted(range(len(itemsets)), key=lambda i: (len(itemsets[i]), itemsets[i]))
+    return pd.DataFrame({
+        'support': [supports[i] for i in order],
+        'itemsets': [frozenset(columns[j] for j in itemsets[i]) for i in order],
+    })
+
+
+MINING_ENGINES = {
+    "apriori": mine_apriori,
+    "fpgrowth": mine_fpgrowth,
+    "eclat": mine_eclat,
+}
+
+
+# Rough CPython sizes for MiningPreflight's memory estimate
+ITEMSET_BYTES = 400  # result row: frozenset, support float, DataFrame overhead
+FP_NODE_BYTES = 200  # FP-tree node, at most one per (transaction, item)
+
+
+class MiningPreflight:
+    """
+    Cheap upper bounds for a mining run, computed from the one-hot frame without
+    mining. Frequent items and pairs are counted exactly (item counts and the
+    pair co-occurrence matrix). For k >= 3, every item of a frequent k-itemset
+    forms a frequent pair with the k - 1 others, so with m_t the items of
+    transaction t that have k - 1 frequent-pair partners inside t:
+
+        frequent k-itemsets <= sum_t C(m_t, k) / ceil(min_support * n)
+
+    and never more than C(F, k) for F frequent items. The itemset count is a
+    guarantee; the memory figure is an estimate of the engine's working set.
+    """
+
+    def __init__(self, one_hot_df):
+        self.n = len(one_hot_df)
+        if one_hot_df.shape[1] and all(isinstance(dt, pd.SparseDtype) for dt in one_hot_df.dtypes):
+            self.matrix = one_hot_df.sparse.to_coo().tocsr().astype(np.int32)
+        else:
+            # CSR of the bool array: only the nonzeros are widened to int32, never a dense int copy
+            self.matrix = sp.csr_matrix(one_hot_df.to_numpy(dtype=bool)).astype(np.int32)
+        self.item_counts = np.asarray(self.matrix.sum(axis=0)).ravel()
+        self.frame_bytes = int(one_hot_df.memory_usage(index=False).sum())
+
+    def min_count(self, min_support):
+        # Same threshold as the engines' `support >= min_support`
+        return max(1, ceil(min_support * self.n - 1e-9))
+
+    def itemset_bounds(self, min_support, max_len=None):
+        """Upper bound on the number of frequent itemsets of each length 1, 2, ... (stops at the first 0)."""
+        if self.n == 0 or max_len == 0:
+            return []
+        min_count = self.min_count(min_support)
+        frequent = self.item_counts >= min_count
+        n_frequent = int(frequent.sum())
+        if n_frequent == 0:
+            return []
+        by_length = [n_frequent]
+        if max_len == 1:
+            return by_length
+
+        basket = self.matrix[:, frequent]
+        cooccurrence = (basket.T @ basket).tocsr()
+        cooccurrence.setdiag(0)
+        pairs = (cooccurrence >= min_count).astype(np.int32)
+        pairs.eliminate_zeros()
+        if pairs.nnz == 0:
+            return by_length
+        by_length.append(pairs.nnz // 2)
+
+        # Frequent-pair partners of each item within its own transaction
+        partners = (basket @ pairs).multiply(basket).tocsr()
+        k = 3
+        while max_len is None or k <= max_len:
+            per_transaction = np.bincount(np.asarray((partners >= k - 1).sum(axis=1)).ravel())
+            subsets = sum(int(count) * comb(m, k) for m, count in enumerate(per_transaction) if m >= k and count)
+            bound = min(comb(n_frequent, k), subsets // min_count)
+            if bound == 0:
+                break
+            by_length.append(bound)
+            k += 1
+        return by_length
+
+    def estimate(self, min_support, max_len=None, algorithm="apriori"):
+        """{"itemsets", "by_length", "memory_mb"} for mining at min_support with max_len."""
+        by_length = self.itemset_bounds(min_support, max_len)
+        itemsets = sum(by_length)
+        n_frequent = by_length[0] if by_length else 0
+
+        if algorithm == "apriori":
+            # mlxtend tests each level's candidates as an n x candidates x k bool array. Candidates
+            # are pruned to sets whose k-subsets are all frequent, and each contains k + 1 of them,
+            # so (k + 1) * candidates(k + 1) <= frequent(k) * (F - k)
+            candidates = [n_frequent, comb(n_frequent, 2)]
+            candidates += [min(comb(n_frequent, k + 1), b * (n_frequent - k) // (k + 1))
+                           for k, b in enumerate(by_length[1:], start=2)]
+            if max_len is not None:
+                candidates = candidates[:max_len]
+            # (+ 1: the n x candidates result of np.all)
+            working = self.n * max([c * (k + 1) for k, c in enumerate(candidates, start=1)] or [0])
+        elif algorithm == "fpgrowth":
+            working = int(self.matrix[:, self.item_counts >= self.min_count(min_support)].nnz) * FP_NODE_BYTES
+        else:
+            # Eclat: one bitset per frequent item, plus one per stacked extension along the deepest path
+            working = (n_frequent * (len(by_length) + 1)) * (self.n + 7) // 8
+        memory = self.frame_bytes + working + itemsets * ITEMSET_BYTES
+        return {"itemsets": itemsets, "by_length": by_length, "memory_mb": round(memory / (1024 * 1024), 3)}
@@ -0,0 +1,103 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+from itertools import accumulate
+
+from rule_pack import PackedRules, _view_array, _to_bytes
+
+# Read-only export of what the read endpoints serve, one file per model version,
+# memory-mapped by every worker process (the OS keeps one copy of its pages).
+#
+# Layout (little-endian):
+#   header    magic, then (offset, length) uint64 pairs for each section
+#   meta      JSON: store id, model version, generation, catalog version and hash
+#   rules     the generation's packed rules (rule_pack format), read in place
+#   items     JSON: the generation's items
+#   products  JSON: the catalog
+#   table     recommendation table: uint32 entry count, uint32 key offsets (count + 1),
+#             uint32 value offsets (count + 1), keys (UTF-8, sorted), values (JSON per key)
+MAGIC = b"RMF2"
+SECTIONS = ("meta", "rules", "items", "products", "table")
+HEADER = struct.Struct("<4s" + "QQ" * len(SECTIONS))
+SUFFIX = ".rmf"
+
+
+def _pack_table(table):
+    keys = sorted(table)
+    encoded_keys = [key.encode("utf-8") for key in keys]
+    encoded_values = [json.dumps(table[key], separators=(",", ":")).encode("utf-8") for key in keys]
+    key_offsets = array("I", accumulate((len(k) for k in encoded_keys), initial=0))
+    value_offsets = array("I", accumulate((len(v) for v in encoded_values), initial=0))
+    return b"".join([struct.pack("<I", len(keys)), _to_bytes(key_offsets), _to_bytes(value_offsets),
+                     *encoded_keys, *encoded_values])
+
+
+def write_model_file(path, meta, packed_rules, items, products, table):
+    """
+    Write a model file atomically (temporary file + rename): a worker either
+    finds the complete file or none. `packed_rules` is pack_rules() output.
+    """
+    sections = [json.dumps(meta).encode("utf-8"), bytes(packed_rules), json.dumps(items).encode("utf-8"),
+                json.dumps(products).encode("utf-8"), _pack_table(table)]
+    offset = HEADER.size
+    header = [MAGIC]
+    for data in sections:
+        header += [offset, len(data)]
+        # 8-byte aligned sections, so typed views of them are aligned too
+        offset += len(data) + (-len(data) % 8)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(*header))
+        for data in sections:
+            f.write(data)
+            f.write(b"\0" * (-len(data) % 8))
+    os.replace(tmp, path)
+    return path
+
+
+class ModelFile:
+    """
+    A model file mapped read-only. `packed` reads the rules in place and
+    recommendation() decodes one table entry per lookup, so the per-process
+    cost is the catalog and the table's key index. The mapping is released
+    when the last reference (including in-flight requests) goes away.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = HEADER.unpack_from(self._map, 0) if len(self._map) >= HEADER.size else (None,)
+        if fields[0] != MAGIC:
+            raise ValueError(f"{path} is not a model file")
+        view = memoryview(self._map)
+        sections = {name: view[fields[1 + 2 * i]:fields[1 + 2 * i] + fields[2 + 2 * i]]
+                    for i, name in enumerate(SECTIONS)}
+        self.meta = json.loads(bytes(sections["meta"]))
+        self.packed = PackedRules(sections["rules"])
+        self.items = json.loads(bytes(sections["items"]))
+        self.products = json.loads(bytes(sections["products"]))
+
+        table = sections["table"]
+        count = struct.unpack_from("<I", table, 0)[0]
+        self._key_offsets, offset = _view_array("I", table, 4, count + 1)
+        self._value_offsets, offset = _view_array("I", table, offset, count + 1)
+        keys_start, self._values_start = offset, offset + self._key_offsets[-1]
+        self._table = table
+        self._index = {str(table[keys_start + self._key_offsets[i]:keys_start + self._key_offsets[i + 1]], "utf-8"): i
+                       for i in range(count)}
+        self.nbytes = len(self._map)
+
+    def recommendation(self, query):
+        """Table entry for `query` (lowercased), or None."""
+        i = self._index.get(query)
+        if i is None:
+            return None
+        start = self._values_start
+        return json.loads(bytes(self._table[start + self._value_offsets[i]:start + self._value_offsets[i + 1]]))
+
+    def table_size(self):
+        return len(self._index)
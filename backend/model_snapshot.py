@@ -0,0 +1,56 @@
+from catalog_matcher import CatalogIndex, WordIndex
+from result_cache import catalog_fingerprint
+
+
+class Catalog:
+    """The product catalog and the lookups derived from it, built together and never modified."""
+
+    __slots__ = ("products", "index", "hash", "_words")
+
+    def __init__(self, products, index=None):
+        self.products = products
+        self.index = index if index is not None else CatalogIndex(products)
+        self.hash = catalog_fingerprint(products)
+        self._words = None
+
+    @property
+    def words(self):
+        """WordIndex of the keys by lowercased name and description (built on first use)."""
+        if self._words is None:
+            self._words = WordIndex(self.products, ((key.lower(), str(data.get('description', '')).lower())
+                                                    for key, data in self.products.items()))
+        return self._words
+
+
+class ModelSnapshot:
+    """
+    Everything the read endpoints serve, from one model: the packed rules and
+    recommendation table (a mapped ModelFile), the items and the catalog.
+    Built off to the side and published by replacing a single reference, so a
+    request that took a snapshot reads one consistent model however many
+    publishes happen meanwhile. Never modified after it is built.
+    """
+
+    __slots__ = ("version", "generation", "catalog_version", "model_file", "packed", "items", "catalog")
+
+    def __init__(self, version, model_file, catalog=None):
+        self.version = version
+        self.generation = model_file.meta["generation"]
+        self.catalog_version = model_file.meta["catalog_version"]
+        self.model_file = model_file
+        self.packed = model_file.packed
+        self.items = tuple(model_file.items)
+        self.catalog = catalog if catalog is not None else Catalog(model_file.products)
+
+    @property
+    def key(self):
+        """What the snapshot holds: the same key means the same content, whatever the version."""
+        return self.generation, self.catalog_version
+
+    def recommendation(self, query):
+        """Materialized recommendations for `query` (lowercased), or None."""
+        return self.model_file.recommendation(query)
+
+    def at_version(self, version):
+        """The same content published again as `version` (a rollback): shares every part."""
+        return ModelSnapshot(version, self.model_file, self.catalog)
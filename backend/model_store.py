@@ -0,0 +1,433 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from rule_pack import PackedRules, pack_rules
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    source TEXT,
+    params TEXT,
+    rule_count INTEGER NOT NULL,
+    item_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rules (
+    generation INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    antecedents TEXT NOT NULL,
+    consequents TEXT NOT NULL,
+    support REAL,
+    confidence REAL,
+    lift REAL,
+    PRIMARY KEY (generation, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rules_by_lift ON rules (generation, lift);
+CREATE INDEX IF NOT EXISTS rules_by_confidence ON rules (generation, confidence);
+CREATE INDEX IF NOT EXISTS rules_by_support ON rules (generation, support);
+CREATE TABLE IF NOT EXISTS rule_antecedents (
+    generation INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (generation, item, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS packed_rules (
+    generation INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recommendation_tables (
+    generation INTEGER PRIMARY KEY,
+    catalog_hash TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    generation INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (generation, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS products (
+    key TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS products_position ON products (position);
+"""
+
+# Columns query_rules() can sort by; ties (and "position") go by publish order
+RULE_SORT_COLUMNS = ("position", "support", "confidence", "lift")
+
+
+def _rule_from_row(row):
+    return {
+        "antecedents": json.loads(row[0]),
+        "consequents": json.loads(row[1]),
+        "support": row[2],
+        "confidence": row[3],
+        "lift": row[4],
+    }
+
+
+class ModelStore:
+    """
+    SQLite store for the published model (rules + items, in numbered
+    generations) and the product catalog.
+
+    Publishing writes a whole generation and makes it active in one
+    transaction, so readers see either the old model or the new one, never a
+    half-written file. Each generation is also stored packed (see rule_pack):
+    the read endpoints serve rules from the packed form, indexed by lowercased
+    antecedent item and exported to the model file, never from the rule rows,
+    which back the /rules queries. The last `keep_generations`
+    generations are kept for rollback with activate(). A generation can carry
+    a materialized recommendation table, valid for the catalog it was built with.
+    model_version() counts the writes that change what the read endpoints
+    return (publish, activate, catalog save); it is bumped in the same transaction.
+    A catalog save also bumps the catalog version, so (active generation,
+    catalog version) names the content of a model.
+    """
+
+    def __init__(self, path="model.db", keep_generations=5):
+        self.path = path
+        self.keep_generations = keep_generations
+        self.write_lock = threading.Lock()
+        self._local = threading.local()
+        # Decoded packed rules per generation, loaded on first use
+        self._packed = {}
+        # (catalog hash, table) per generation, loaded on first use
+        self._recommendations = {}
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            # Identifies this database: versions restart at 0 in a new one
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)", (uuid.uuid4().hex[:12],))
+        self.store_id = self._connect().execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            # WAL: readers keep reading the previous generation while a new one is written
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Unicode-aware lower() for item filters (SQLite's only folds ASCII)
+            conn.create_function("py_lower", 1, lambda value: str(value).lower(), deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- generations ----------------------------------------------------
+
+    def model_version(self):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'model_version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _bump_version(self, conn, key="model_version"):
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, '1') "
+                     "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1", (key,))
+
+    def model_state(self):
+        """(model_version, active generation, catalog version), read together."""
+        rows = dict(self._connect().execute(
+            "SELECT key, value FROM meta WHERE key IN ('model_version', 'active_generation', 'catalog_version')"
+        ).fetchall())
+        generation = rows.get("active_generation")
+        return (int(rows.get("model_version") or 0), int(generation) if generation is not None else None,
+                int(rows.get("catalog_version") or 0))
+
+    def active_generation(self):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'active_generation'").fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+
+    def publish(self, rules, items, params=None, source="analyze", recommendations=None):
+        """
+        Write rules and items as a new generation and activate it. Returns the
+        generation id. `recommendations` is an optional (catalog hash, table)
+        precomputed from these rules, written in the same transaction.
+        """
+        with self.write_lock:
+            conn = self._connect()
+            with conn:
+                cur = conn.execute(
+                    "INSERT INTO generations (created_at, source, params, rule_count, item_count) VALUES (?, ?, ?, ?, ?)",
+                    (time.time(), source, json.dumps(params) if params is not None else None, len(rules), len(items)))
+                generation = cur.lastrowid
+                conn.executemany(
+                    "INSERT INTO rules VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((generation, i, json.dumps(r['antecedents']), json.dumps(r['consequents']),
+                      r.get('support'), r.get('confidence'), r.get('lift')) for i, r in enumerate(rules)))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO rule_antecedents VALUES (?, ?, ?)",
+                    ((generation, str(ant).lower(), i) for i, r in enumerate(rules) for ant in r['antecedents']))
+                conn.execute("INSERT INTO packed_rules VALUES (?, ?)", (generation, pack_rules(rules)))
+                conn.executemany(
+                    "INSERT INTO items VALUES (?, ?, ?)",
+                    ((generation, i, name) for i, name in enumerate(items)))
+                if recommendations is not None:
+                    conn.execute("INSERT INTO recommendation_tables VALUES (?, ?, ?)",
+                                 (generation, recommendations[0], json.dumps(recommendations[1])))
+                    self._recommendations[generation] = recommendations
+                self._set_active(conn, generation)
+                self._bump_version(conn)
+                self._prune(conn)
+        print(f"Saved generation {generation}: {len(rules)} rules, {len(items)} items to {self.path}")
+        return generation
+
+    def _set_active(self, conn, generation):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('active_generation', ?)", (str(generation),))
+
+    def _prune(self, conn):
+        active = self.active_generation()
+        stale = [row[0] for row in conn.execute(
+            "SELECT id FROM generations WHERE id != ? ORDER BY id DESC LIMIT -1 OFFSET ?",
+            (active, max(self.keep_generations - 1, 0)))]
+        for generation in stale:
+            for table in ("rules", "rule_antecedents", "packed_rules", "recommendation_tables", "items"):
+                conn.execute(f"DELETE FROM {table} WHERE generation = ?", (generation,))
+            conn.execute("DELETE FROM generations WHERE id = ?", (generation,))
+            self._packed.pop(generation, None)
+            self._recommendations.pop(generation, None)
+
+    def activate(self, generation):
+        """Make an earlier (kept) generation the active one again. False if it no longer exists."""
+        with self.write_lock:
+            conn = self._connect()
+            with conn:
+                if conn.execute("SELECT 1 FROM generations WHERE id = ?", (generation,)).fetchone() is None:
+                    return False
+                self._set_active(conn, generation)
+                self._bump_version(conn)
+        return True
+
+    def generations(self):
+        active = self.active_generation()
+        rows = self._connect().execute(
+            "SELECT id, created_at, source, params, rule_count, item_count FROM generations ORDER BY id DESC")
+        return [{
+            "generation": gid,
+            "created_at": created_at,
+            "source": source,
+            "params": json.loads(params) if params else None,
+            "rules_count": rule_count,
+            "items_count": item_count,
+            "active": gid == active,
+        } for gid, created_at, source, params, rule_count, item_count in rows]
+
+    # --- reads ----------------------------------------------------------
+
+    def rule_count(self, generation=None):
+        generation = self.active_generation() if generation is None else generation
+        row = self._connect().execute("SELECT rule_count FROM generations WHERE id = ?", (generation,)).fetchone()
+        return row[0] if row else 0
+
+    def load_rules(self, generation=None):
+        """Every rule of a generation, in publish order."""
+        generation = self.active_generation() if generation is None else generation
+        rows = self._connect().execute(
+            "SELECT antecedents, consequents, support, confidence, lift FROM rules WHERE generation = ? ORDER BY position",
+            (generation,))
+        return [_rule_from_row(row) for row in rows]
+
+    def load_items(self, generation=None):
+        generation = self.active_generation() if generation is None else generation
+        rows = self._connect().execute("SELECT name FROM items WHERE generation = ? ORDER BY position", (generation,))
+        return [row[0] for row in rows]
+
+    def query_rules(self, generation, min_support=None, min_confidence=None, min_lift=None, item=None,
+                    min_antecedents=None, max_antecedents=None, sort="position", descending=False,
+                    after=None, limit=100):
+        """
+        One page of a generation's rules: those passing the filters, ordered by
+        `sort` (a RULE_SORT_COLUMNS name) then position. `item` matches either side,
+        case-insensitively. `after` is the (sort value, position) of the previous
+        page's last rule (keyset pagination: every page is one index range scan).
+        Returns [(position, sort value, rule)].
+        """
+        if sort not in RULE_SORT_COLUMNS:
+            raise ValueError(f"sort must be one of {RULE_SORT_COLUMNS}")
+        where, args = ["generation = ?"], [generation]
+        for column, minimum in (("support", min_support), ("confidence", min_confidence), ("lift", min_lift)):
+            if minimum is not None:
+                where.append(f"{column} >= ?")
+                args.append(minimum)
+        if item is not None:
+            key = str(item).lower()
+            where.append("(position IN (SELECT position FROM rule_antecedents WHERE generation = ? AND item = ?)"
+                         " OR EXISTS (SELECT 1 FROM json_each(rules.consequents) WHERE py_lower(json_each.value) = ?))")
+            args += [generation, key, key]
+        if min_antecedents is not None:
+            where.append("json_array_length(antecedents) >= ?")
+            args.append(min_antecedents)
+        if max_antecedents is not None:
+            where.append("json_array_length(antecedents) <= ?")
+            args.append(max_antecedents)
+
+        direction, beyond = ("DESC", "<") if descending else ("ASC", ">")
+        if sort == "position":
+            order_by = f"position {direction}"
+            if after is not None:
+                where.append(f"position {beyond} ?")
+                args.append(after[1])
+        else:
+            order_by = f"{sort} {direction}, position ASC"
+            if after is not None:
+                where.append(f"({sort} {beyond} ? OR ({sort} = ? AND position > ?))")
+                args += [after[0], after[0], after[1]]
+        rows = self._connect().execute(
+            f"SELECT position, antecedents, consequents, support, confidence, lift FROM rules "
+            f"WHERE {' AND '.join(where)} ORDER BY {order_by} LIMIT ?", args + [limit])
+        page = []
+        for row in rows:
+            rule = _rule_from_row(row[1:])
+            page.append((row[0], row[0] if sort == "position" else rule[sort], rule))
+        return page
+
+    def has_generation(self, generation):
+        return self._connect().execute("SELECT 1 FROM generations WHERE id = ?", (generation,)).fetchone() is not None
+
+    def packed_rules_data(self, generation):
+        """
+        pack_rules() bytes of a generation (None if it does not exist).
+        Generations published before the packed format existed are packed from
+        their rule rows once.
+        """
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM generations WHERE id = ?", (generation,)).fetchone() is None:
+            return None
+        row = conn.execute("SELECT data FROM packed_rules WHERE generation = ?", (generation,)).fetchone()
+        if row is not None:
+            return row[0]
+        data = pack_rules(self.load_rules(generation))
+        with self.write_lock:
+            with conn:
+                # Not if the generation was pruned meanwhile
+                conn.execute("INSERT OR REPLACE INTO packed_rules SELECT ?, ? WHERE EXISTS "
+                             "(SELECT 1 FROM generations WHERE id = ?)", (generation, data, generation))
+        return data
+
+    def packed_rules(self, generation):
+        """PackedRules of a generation (None if it does not exist), cached."""
+        packed = self._packed.get(generation)
+        if packed is None:
+            data = self.packed_rules_data(generation)
+            if data is None:
+                return None
+            packed = self._packed[generation] = PackedRules(data)
+        return packed
+
+    def recommendations(self, generation, catalog_hash):
+        """
+        Materialized recommendation table of a generation ({query: result}), or
+        None if it has none or it was built for another catalog.
+        """
+        cached = self._recommendations.get(generation)
+        if cached is None:
+            row = self._connect().execute(
+                "SELECT catalog_hash, data FROM recommendation_tables WHERE generation = ?", (generation,)).fetchone()
+            if row is None:
+                return None
+            cached = self._recommendations[generation] = (row[0], json.loads(row[1]))
+        return cached[1] if cached[0] == catalog_hash else None
+
+    def save_recommendations(self, generation, catalog_hash, table):
+        """Store (or replace) the recommendation table of an existing generation."""
+        with self.write_lock:
+            conn = self._connect()
+            with conn:
+                # Not if the generation was pruned meanwhile
+                cur = conn.execute("INSERT OR REPLACE INTO recommendation_tables SELECT ?, ?, ? WHERE EXISTS "
+                                   "(SELECT 1 FROM generations WHERE id = ?)",
+                                   (generation, catalog_hash, json.dumps(table), generation))
+            if cur.rowcount:
+                self._recommendations[generation] = (catalog_hash, table)
+
+    # --- catalog --------------------------------------------------------
+
+    def save_products(self, products):
+        """Replace the catalog (dict order is kept)."""
+        with self.write_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM products")
+                conn.executemany(
+                    "INSERT INTO products (key, position, data) VALUES (?, ?, ?)",
+                    ((key, i, json.dumps(data)) for i, (key, data) in enumerate(products.items())))
+                self._bump_version(conn)
+                self._bump_version(conn, "catalog_version")
+        print(f"Saved {len(products)} products to {self.path}")
+
+    def upsert_products(self, changed, removed=()):
+        """
+        Insert or update the `changed` products and delete the `removed` keys;
+        other rows are left alone. Added keys go after the existing ones.
+        """
+        with self.write_lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("DELETE FROM products WHERE key = ?", ((key,) for key in removed))
+                start = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM products").fetchone()[0]
+                conn.executemany(
+                    "INSERT INTO products (key, position, data) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET data = excluded.data",
+                    ((key, start + i, json.dumps(data)) for i, (key, data) in enumerate(changed.items())))
+                self._bump_version(conn)
+                self._bump_version(conn, "catalog_version")
+        print(f"Upserted {len(changed)} products, removed {len(removed)} in {self.path}")
+
+    def load_products(self):
+        rows = self._connect().execute("SELECT key, data FROM products ORDER BY position")
+        return {key: json.loads(data) for key, data in rows}
+
+    def load_catalog(self):
+        """(catalog version, products), read in one transaction."""
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'catalog_version'").fetchone()
+            return int(row[0]) if row else 0, self.load_products()
+        finally:
+            conn.execute("COMMIT")
+
+    def has_products(self):
+        return self._connect().execute("SELECT 1 FROM products LIMIT 1").fetchone() is not None
+
+    # --- dataset --------------------------------------------------------
+
+    def dataset_key(self):
+        """DatasetCache key of the uploaded dataset (shared by every worker), or None."""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'dataset_key'").fetchone()
+        return row[0] if row else None
+
+    def set_dataset_key(self, key):
+        with self.write_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dataset_key', ?)", (key,))
+
+    # --- migration ------------------------------------------------------
+
+    def import_json(self, rules_file="rules.json", items_file="items.json", products_file="products.json"):
+        """One-time import of the JSON files the server used before the store existed."""
+        def read(path, default):
+            try:
+                with open(path, 'r') as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                return default
+
+        if self.active_generation() is None and (os.path.exists(rules_file) or os.path.exists(items_file)):
+            self.publish(read(rules_file, []), read(items_file, []), source="json-import")
+        if not self.has_products() and os.path.exists(products_file):
+            self.save_products(read(products_file, {}))
@@ -7,19 +7,68 @@ print("=" * 60)
 print("清理 DAN RE-UPLOAD DATA")
 print("=" * 60)
 
-# Step 1: Delete old JSON files
-print("\n1. Deleting old cache files...")
+# The files below are held open by a running server (SQLite connection, mapped model
+# files), so it must be stopped while they are deleted and started again before the
+# catalog is re-uploaded
 import os
-files_to_delete = ['rules.json', 'items.json']
+import shutil
+import sys
+import time
+
+
+def server_up():
+    try:
+        requests.get(f"{BASE_URL}/status", timeout=2)
+        return True
+    except requests.exceptions.ConnectionError:
+        return False
+
+
+# Step 1: Stop the server
+print("\n1. Checking that the server is stopped...")
+if server_up():
+    print(f"   ✗ Server still running at {BASE_URL}: stop it, then run this script again")
+    sys.exit(1)
+print("   ✓ Server stopped")
+
+# Step 2: Delete the model store, the JSON files it would re-import on startup, and caches
+print("\n2. Deleting old cache files...")
+model_db = os.environ.get('MODEL_DB', 'model.db')
+files_to_delete = [model_db, model_db + '-wal', model_db + '-shm', 'rules.json', 'items.json']
 for f in files_to_delete:
     if os.path.exists(f):
         os.remove(f)
         print(f"   ✓ Deleted {f}")
     else:
         print(f"   - {f} not found")
+# Exported model files (mapped by the server) and cached uploads / analyses
+dirs_to_delete = [os.environ.get('MODEL_FILE_DIR', 'model_files'),
+                  os.environ.get('DATASET_CACHE_DIR', 'dataset_cache'),
+                  os.environ.get('ANALYSIS_CACHE_DIR', 'analysis_cache')]
+for d in dirs_to_delete:
+    if os.path.isdir(d):
+        shutil.rmtree(d, ignore_errors=True)
+        print(f"   ✓ Deleted {d}/")
+    else:
+        print(f"   - {d}/ not found")
+
+# Step 3: Start the server again (it starts on an empty model store)
+print("\n3. Start the server now (python main.py); waiting for it...")
+deadline = time.time() + 300
+while True:
+    try:
+        if requests.get(f"{BASE_URL}/ready", timeout=2).status_code == 200:
+            break
+    except requests.exceptions.ConnectionError:
+        pass
+    if time.time() > deadline:
+        print("   ✗ Server did not come up within 5 minutes")
+        sys.exit(1)
+    time.sleep(1)
+print("   ✓ Server ready")
 
-# Step 2: Re-upload catalog
-print("\n2. Re-uploading catalog...")
+# Step 4: Re-upload catalog
+print("\n4. Re-uploading catalog...")
 try:
     with open("../packages.sql", "rb") as f:
         response = requests.post(f"{BASE_URL}/upload-catalog", files={"file": f})
@@ -28,8 +77,8 @@ try:
 except Exception as e:
     print(f"   Error: {e}")
 
-# Step 3: Check current status (should be empty)
-print("\n3. Checking current status...")
+# Step 5: Check current status (should be empty)
+print("\n5. Checking current status...")
 try:
     response = requests.get(f"{BASE_URL}/status")
     print(f"   {response.json()}")
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def dataset_fingerprint(df):
+    """Content hash of an uploaded dataset: column names, dtypes and every cell."""
+    return DatasetDigest(df).hexdigest()
+
+
+class DatasetDigest:
+    """
+    dataset_fingerprint() of a dataset, kept as a running hash of its rows so
+    that the fingerprint of the dataset grown by appended rows (grown()) only
+    hashes the new rows.
+    """
+
+    def __init__(self, df):
+        import pandas as pd  # only needed once a dataset exists; keeps server startup light
+
+        self.columns = [str(c) for c in df.columns]
+        self.dtypes = [str(t) for t in df.dtypes]
+        self.rows = len(df)
+        # Row hashes include the index: appended rows keep theirs only under a 0-based RangeIndex
+        self.range_index = isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1
+        self._hash = hashlib.sha256()
+        self._update(df)
+
+    def _update(self, df):
+        import pandas as pd
+
+        self._hash.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+
+    def grown(self, df):
+        """
+        Digest of `df`: this digest's dataset with rows appended (pd.concat(...,
+        ignore_index=True)). Hashes the whole of `df` again only when the append
+        changed the columns or their dtypes, which changes the earlier rows' hashes.
+        """
+        import pandas as pd
+
+        digest = DatasetDigest.__new__(DatasetDigest)
+        digest.columns = [str(c) for c in df.columns]
+        digest.dtypes = [str(t) for t in df.dtypes]
+        digest.rows = len(df)
+        digest.range_index = isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1
+        if not (self.range_index and digest.range_index) or digest.columns != self.columns \
+                or digest.dtypes != self.dtypes or len(df) < self.rows:
+            return DatasetDigest(df)
+        digest._hash = self._hash.copy()
+        digest._update(df.iloc[self.rows:])
+        return digest
+
+    def hexdigest(self):
+        h = self._hash.copy()
+        h.update(json.dumps(self.columns).encode('utf-8'))
+        h.update(json.dumps(self.dtypes).encode('utf-8'))
+        return h.hexdigest()[:16]
+
+
+def catalog_fingerprint(products):
+    """Content hash of the product catalog (keys and every field)."""
+    return hashlib.sha256(json.dumps(products, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def catalog_keys_fingerprint(keys):
+    """Hash of the catalog's keys alone: all an analysis depends on (matching and validation)."""
+    return hashlib.sha256(json.dumps(sorted(keys)).encode('utf-8')).hexdigest()[:16]
+
+
+def params_fingerprint(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class AnalysisCache:
+    """
+    Analysis results keyed by (dataset hash, catalog hash, parameter hash); the
+    server keys them by catalog_keys_fingerprint(), so price or description
+    edits leave them valid.
+
+    Two LRU tiers, each with a byte budget: decoded results in memory, and JSON
+    files in `directory` (disk budget 0 disables the disk tier). Sizes are the
+    length of the JSON encoding.
+    """
+
+    def __init__(self, directory="analysis_cache", memory_budget_mb=64, disk_budget_mb=256):
+        self.directory = directory
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.disk_budget = int(disk_budget_mb * 1024 * 1024)
+        self.memory = OrderedDict()  # key -> (value, size)
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(dataset_hash, catalog_hash, params):
+        return f"{dataset_hash}-{catalog_hash}-{params_fingerprint(params)}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        value = None
+        if self.disk_budget > 0:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+                value = json.loads(data)
+                os.utime(self._path(key))  # mark as recently used
+            except (FileNotFoundError, ValueError):
+                value = None
+
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value, len(data))
+        return value
+
+    def put(self, key, value):
+        data = json.dumps(value).encode('utf-8')
+        with self.lock:
+            self._remember(key, value, len(data))
+        if self.disk_budget > 0 and len(data) <= self.disk_budget:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = self._path(key) + ".tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key))
+                self._enforce_disk_budget()
+            except Exception as e:
+                print(f"Error writing analysis cache: {e}")
+
+    def _remember(self, key, value, size):
+        if key in self.memory:
+            self.memory_bytes -= self.memory.pop(key)[1]
+        if size > self.memory_budget:
+            return
+        self.memory[key] = (value, size)
+        self.memory_bytes += size
+        while self.memory_bytes > self.memory_budget:
+            _, (_, evicted_size) = self.memory.popitem(last=False)
+            self.memory_bytes -= evicted_size
+
+    def _disk_entries(self):
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return sorted(entries)
+
+    def _enforce_disk_budget(self):
+        entries = self._disk_entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.disk_budget:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def invalidate(self, dataset_hash=None, catalog_hash=None):
+        """
+        Drop entries built from another dataset (if dataset_hash is given) or
+        another catalog (if catalog_hash is given).
+        """
+        def stale(key):
+            entry_dataset, entry_catalog, _ = key.split("-")
+            return (dataset_hash is not None and entry_dataset != dataset_hash) or \
+                (catalog_hash is not None and entry_catalog != catalog_hash)
+
+        with self.lock:
+            for key in [k for k in self.memory if stale(k)]:
+                self.memory_bytes -= self.memory.pop(key)[1]
+        for _, _, name in self._disk_entries():
+            if stale(name[:-len(".json")]):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def _peek(self, key):
+        """Value of `key` without touching recency or hit counts (None if absent)."""
+        with self.lock:
+            entry = self.memory.get(key)
+        if entry is not None:
+            return entry[0]
+        try:
+            with open(self._path(key), 'rb') as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def retarget_catalog(self, old_catalog_hash, new_catalog_hash, keep):
+        """
+        File the entries of catalog `old_catalog_hash` for which keep(value) is
+        True under `new_catalog_hash` (they are still valid for it) and drop
+        every other catalog's entries. Returns the number of entries kept.
+        """
+        keys = set(self.memory) | {name[:-len(".json")] for _, _, name in self._disk_entries()}
+        kept = 0
+        for key in keys:
+            dataset_hash, catalog_hash, params_hash = key.split("-")
+            if catalog_hash != old_catalog_hash:
+                continue
+            value = self._peek(key)
+            if value is not None and keep(value):
+                self.put(f"{dataset_hash}-{new_catalog_hash}-{params_hash}", value)
+                kept += 1
+        self.invalidate(catalog_hash=new_catalog_hash)
+        return kept
+
+    def clear(self):
+        self.invalidate(dataset_hash="", catalog_hash="")
+
+    def stats(self):
+        entries = self._disk_entries()
+        return {
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_bytes,
+            "disk_entries": len(entries),
+            "disk_bytes": sum(size for _, size, _ in entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,131 @@
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+# Layout (little-endian), every section a flat array:
+#   header       magic, string count, rule count, antecedent key count
+#   confidence   float64 per rule
+#   cons_offsets uint32 per rule + 1   consequents of rule i = cons_ids[cons_offsets[i]:cons_offsets[i + 1]]
+#   cons_ids     uint32 string ids
+#   key_ids      uint32 string id per lowercased antecedent key
+#   key_offsets  uint32 per key + 1    rule positions of key k = key_positions[key_offsets[k]:key_offsets[k + 1]]
+#   key_positions uint32 rule positions, ascending per key
+#   str_lengths  uint32 byte length per string
+#   str_bytes    UTF-8 strings, concatenated
+MAGIC = b"RPK1"
+HEADER = struct.Struct("<4sIII")
+
+
+def _to_bytes(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_array(typecode, data, offset, count):
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(data[offset:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
+
+
+def _view_array(typecode, data, offset, count):
+    # Zero-copy on little-endian hosts (the format's byte order): a typed view of the buffer
+    if sys.byteorder == "big":
+        return _read_array(typecode, data, offset, count)
+    end = offset + count * array(typecode).itemsize
+    return memoryview(data)[offset:end].cast(typecode), end
+
+
+def pack_rules(rules):
+    """Serialize rules (mlxtend-style dicts, in rule order) to the compact /recommendations format."""
+    string_ids = {}
+
+    def string_id(value):
+        return string_ids.setdefault(str(value), len(string_ids))
+
+    confidence = array('d')
+    cons_offsets, cons_ids = array('I', [0]), array('I')
+    positions_by_key = {}
+    for position, rule in enumerate(rules):
+        confidence.append(float(rule.get('confidence') or 0.0))
+        cons_ids.extend(string_id(cons) for cons in rule['consequents'])
+        cons_offsets.append(len(cons_ids))
+        for ant in rule['antecedents']:
+            positions = positions_by_key.setdefault(str(ant).lower(), [])
+            if not positions or positions[-1] != position:
+                positions.append(position)
+
+    key_ids, key_offsets, key_positions = array('I'), array('I', [0]), array('I')
+    for key, positions in positions_by_key.items():
+        key_ids.append(string_id(key))
+        key_positions.extend(positions)
+        key_offsets.append(len(key_positions))
+
+    encoded = [s.encode('utf-8') for s in string_ids]
+    str_lengths = array('I', (len(s) for s in encoded))
+    return b"".join([
+        HEADER.pack(MAGIC, len(encoded), len(rules), len(key_ids)),
+        _to_bytes(confidence), _to_bytes(cons_offsets), _to_bytes(cons_ids),
+        _to_bytes(key_ids), _to_bytes(key_offsets), _to_bytes(key_positions),
+        _to_bytes(str_lengths), *encoded,
+    ])
+
+
+class PackedRules:
+    """
+    Read side of pack_rules(), over any buffer (bytes, or a memory-mapped model
+    file shared by several processes). The numeric sections are read in place;
+    only the antecedent keys are decoded up front, consequent strings on first use.
+    """
+
+    def __init__(self, data):
+        magic, n_strings, n_rules, n_keys = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a packed rule set")
+        offset = HEADER.size
+        self.confidence, offset = _view_array('d', data, offset, n_rules)
+        self._cons_offsets, offset = _view_array('I', data, offset, n_rules + 1)
+        self._cons_ids, offset = _view_array('I', data, offset, self._cons_offsets[-1])
+        key_ids, offset = _view_array('I', data, offset, n_keys)
+        key_offsets, offset = _view_array('I', data, offset, n_keys + 1)
+        key_positions, offset = _view_array('I', data, offset, key_offsets[-1])
+        str_lengths, offset = _view_array('I', data, offset, n_strings)
+
+        self._data = data
+        self._str_offsets = array('Q', accumulate(str_lengths, initial=offset))
+        # id -> str, filled as strings are read: repeated item names share one object
+        self._strings = {}
+        self.keys = [self._string(i) for i in key_ids]
+        self._positions = {key: key_positions[key_offsets[k]:key_offsets[k + 1]] for k, key in enumerate(self.keys)}
+        self.nbytes = len(data)
+
+    def _string(self, i):
+        value = self._strings.get(i)
+        if value is None:
+            value = self._strings[i] = str(self._data[self._str_offsets[i]:self._str_offsets[i + 1]], 'utf-8')
+        return value
+
+    def consequents(self, position):
+        return tuple(self._string(i) for i in
+                     self._cons_ids[self._cons_offsets[position]:self._cons_offsets[position + 1]])
+
+    def __len__(self):
+        return len(self.confidence)
+
+    def positions_for(self, keys):
+        """Positions of the rules with any of `keys` (lowercased) among their antecedents, ascending."""
+        positions = set()
+        for key in keys:
+            found = self._positions.get(key)
+            if found is not None:
+                positions.update(found)
+        return sorted(positions)
+
+    def consequents_for(self, keys):
+        """(consequents, confidence) of the matching rules, in rule order."""
+        return [(self.consequents(p), self.confidence[p]) for p in self.positions_for(keys)]
@@ -0,0 +1,275 @@
+import codecs
+import re
+
+# Incremental reader for SQL dumps (mysqldump / phpMyAdmin): the file is read in
+# chunks and tokenized as it goes, so memory stays flat however large the dump.
+# Only what catalog uploads need is parsed: CREATE TABLE column lists and the
+# rows of INSERT / REPLACE ... VALUES statements. Everything else is skipped.
+CHUNK_BYTES = 1024 * 1024
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--(?:[ \t][^\n]*|(?=\n)|\Z)|\#[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>'(?:[^'\\]|\\.|'')*(?:'|\\?\Z)|"(?:[^"\\]|\\.|"")*(?:"|\\?\Z))
+  | (?P<ident>`(?:[^`]|``)*(?:`|\Z))
+  | (?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<word>[^\W\d][\w$]*)
+  | (?P<punct>.)
+""", re.VERBOSE | re.DOTALL)
+
+# One row of plain literals (the bulk of a dump) with the comma or semicolon after
+# it, matched in one go; anything else (comments, function calls, charset
+# introducers, rows cut by the end of the buffer) goes through the tokens
+_LITERAL = r"""'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'|"[^"\\]*(?:(?:\\.|"")[^"\\]*)*"|[^'"(),\s]+"""
+_ROW = re.compile(rf"\s*\(\s*((?:(?:{_LITERAL})\s*,\s*)*(?:{_LITERAL}))\s*\)\s*([,;])", re.DOTALL)
+_ROW_VALUE = re.compile(_LITERAL, re.DOTALL)
+
+# Backslash escapes of MySQL string literals; \% and \_ keep their backslash
+_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a", "%": "\\%", "_": "\\_"}
+_UNESCAPE = {quote: re.compile(r"\\(.)|" + quote * 2, re.DOTALL) for quote in "'\""}
+# Plain replaces do when the string holds no \\ or doubled quote (most of a dump)
+_COMMON_ESCAPES = [("\\" + c, _ESCAPES.get(c, c)) for c in "rntZ0b'\""]
+
+_INSERT_MODIFIERS = {"LOW_PRIORITY", "DELAYED", "HIGH_PRIORITY", "IGNORE", "INTO"}
+# First word of a CREATE TABLE definition that is not a column
+_TABLE_CONSTRAINTS = {"PRIMARY", "KEY", "INDEX", "UNIQUE", "CONSTRAINT", "FOREIGN", "FULLTEXT", "SPATIAL", "CHECK",
+                      "PERIOD"}
+
+
+class SqlDumpError(ValueError):
+    """A statement the reader cannot make sense of (truncated dump, unbalanced row)."""
+
+
+class _Scanner:
+    """Chunked reader of a binary SQL stream: tokens, or whole rows of literals."""
+
+    def __init__(self, fileobj, encoding="utf-8", chunk_bytes=CHUNK_BYTES):
+        self.fileobj = fileobj
+        self.chunk_bytes = chunk_bytes
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.buf, self.pos, self.eof = "", 0, False
+
+    def fill(self, grow=False):
+        # grow: the buffer from pos holds a token cut by its end. Reading at least as
+        # much again as that part doubles it, so a token spanning many chunks (a long
+        # TEXT / BLOB literal) is rescanned O(log) times, not once per chunk
+        data = self.fileobj.read(max(self.chunk_bytes, len(self.buf) - self.pos) if grow else self.chunk_bytes)
+        self.eof = not data
+        self.buf = self.buf[self.pos:] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+
+    def token(self):
+        """
+        (kind, text) of the next token, (None, None) at the end; kind is string,
+        ident (backquoted), number, word or punct. Whitespace and comments are skipped.
+        """
+        match = _TOKEN.match
+        while True:
+            m = match(self.buf, self.pos)
+            # A token running to the end of the buffer may continue in the next chunk
+            if m is None or (not self.eof and m.end() == len(self.buf)):
+                if self.eof:
+                    return None, None
+                self.fill(grow=m is not None)
+                continue
+            self.pos = m.end()
+            kind = m.lastgroup
+            if kind != "space" and kind != "comment":
+                return kind, m.group()
+
+    def row(self):
+        """(values, "," or ";") of a row of plain literals next, else None (nothing consumed)."""
+        while True:
+            m = _ROW.match(self.buf, self.pos)
+            if m is not None:
+                self.pos = m.end()
+                return [_literal(text) for text in _ROW_VALUE.findall(m.group(1))], m.group(2)
+            # Maybe cut by the end of the buffer; rows longer than a chunk take the token path
+            if self.eof or len(self.buf) - self.pos >= self.chunk_bytes:
+                return None
+            self.fill()
+
+
+def unquote(kind, text):
+    """Value of a string or backquoted identifier token."""
+    if kind == "ident":
+        return text[1:-1].replace("``", "`")
+    quote, body = text[0], text[1:-1]
+    if "\\" not in body and quote * 2 not in body:
+        return body
+    if "\\\\" not in body and quote * 2 not in body:
+        plain = body
+        for escaped, char in _COMMON_ESCAPES:
+            if escaped in plain:
+                plain = plain.replace(escaped, char)
+        if "\\" not in plain:
+            return plain
+    return _UNESCAPE[quote].sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)) if m.group(1) else quote, body)
+
+
+def _literal(text):
+    if text[0] == "'" or text[0] == '"':
+        return unquote("string", text)
+    return None if text.upper() == "NULL" else text
+
+
+def _value(tokens):
+    # NULL -> None, strings unescaped, numbers and other words as written
+    if len(tokens) == 1:
+        kind, text = tokens[0]
+        if kind == "string":
+            return unquote(kind, text)
+        return None if kind == "word" and text.upper() == "NULL" else text
+    strings = [t for t in tokens if t[0] == "string"]
+    if strings:
+        # _utf8mb4'...' and similar charset introducers
+        return unquote(*strings[-1])
+    return "".join(text for _, text in tokens)
+
+
+class _Statements:
+    """Walks the token stream statement by statement (see iter_insert_rows)."""
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.pushed = []
+        self.columns = {}  # table -> columns, from CREATE TABLE
+
+    def next(self):
+        if self.pushed:
+            return self.pushed.pop()
+        return self.scanner.token()
+
+    def skip_statement(self):
+        kind, text = self.next()
+        while kind is not None and not (kind == "punct" and text == ";"):
+            kind, text = self.next()
+
+    def name(self):
+        """A table name, without the database of `db`.`table`."""
+        kind, text = self.next()
+        name = unquote(kind, text) if kind == "ident" else text
+        following = self.next()
+        if following == ("punct", "."):
+            return self.name()
+        self.pushed.append(following)
+        return name
+
+    def identifier_list(self):
+        """Names between parentheses, after the opening one."""
+        names = []
+        kind, text = self.next()
+        while kind is not None and text != ")":
+            if kind == "ident" or kind == "word":
+                names.append(unquote(kind, text) if kind == "ident" else text)
+            kind, text = self.next()
+        return names
+
+    def create_table(self):
+        kind, text = self.next()
+        if kind == "word" and text.upper() == "TEMPORARY":
+            kind, text = self.next()
+        if not (kind == "word" and text.upper() == "TABLE"):
+            return self.skip_statement()
+        kind, text = self.next()
+        if kind == "word" and text.upper() == "IF":
+            # IF NOT EXISTS
+            self.next()
+            self.next()
+        else:
+            self.pushed.append((kind, text))
+        table = self.name()
+        if self.next() != ("punct", "("):
+            return self.skip_statement()
+        columns, depth, starting = [], 0, True
+        while True:
+            kind, text = self.next()
+            if kind is None:
+                return
+            if starting and (kind == "ident" or (kind == "word" and text.upper() not in _TABLE_CONSTRAINTS)):
+                columns.append(unquote(kind, text) if kind == "ident" else text)
+            starting = False
+            if kind == "punct":
+                if text == "(":
+                    depth += 1
+                elif text == ")":
+                    if depth == 0:
+                        break
+                    depth -= 1
+                elif text == "," and depth == 0:
+                    starting = True
+        self.columns[table] = columns
+        self.skip_statement()
+
+    def row(self):
+        """Values of one row, after its opening parenthesis."""
+        values, current, depth = [], [], 0
+        while True:
+            kind, text = self.next()
+            if kind is None:
+                raise SqlDumpError("SQL dump ends inside a row of values")
+            if kind == "punct":
+                if text == "(":
+                    depth += 1
+                elif text == ")":
+                    if depth == 0:
+                        values.append(_value(current))
+                        return values
+                    depth -= 1
+                elif text == "," and depth == 0:
+                    values.append(_value(current))
+                    current = []
+                    continue
+            current.append((kind, text))
+
+    def insert_rows(self):
+        kind, text = self.next()
+        while kind == "word" and text.upper() in _INSERT_MODIFIERS:
+            kind, text = self.next()
+        self.pushed.append((kind, text))
+        table = self.name()
+        kind, text = self.next()
+        columns = None
+        if (kind, text) == ("punct", "("):
+            columns = self.identifier_list()
+            kind, text = self.next()
+        if not (kind == "word" and text.upper() in ("VALUES", "VALUE")):
+            # INSERT ... SELECT / INSERT ... SET: no literal rows
+            return self.skip_statement()
+        columns = columns or self.columns.get(table)
+        while True:
+            fast = None if self.pushed else self.scanner.row()
+            if fast is not None:
+                yield table, columns, fast[0]
+                if fast[1] == ";":
+                    return
+                continue
+            if self.next() != ("punct", "("):
+                raise SqlDumpError(f"Expected a row of values in INSERT INTO {table}")
+            yield table, columns, self.row()
+            kind, text = self.next()
+            if (kind, text) != ("punct", ","):
+                if kind is not None and text != ";":
+                    self.skip_statement()  # ON DUPLICATE KEY UPDATE ...
+                return
+
+
+def iter_insert_rows(fileobj, encoding="utf-8", chunk_bytes=CHUNK_BYTES):
+    """
+    (table, columns, values) for every row of the INSERT / REPLACE ... VALUES
+    statements of a binary SQL dump stream, one at a time. `columns` come from
+    the statement's column list, else the table's CREATE TABLE earlier in the
+    dump, else None. Values are str, or None for NULL.
+    """
+    statements = _Statements(_Scanner(fileobj, encoding, chunk_bytes))
+    while True:
+        kind, text = statements.next()
+        if kind is None:
+            return
+        keyword = text.upper() if kind == "word" else None
+        if keyword in ("INSERT", "REPLACE"):
+            yield from statements.insert_rows()
+        elif keyword == "CREATE":
+            statements.create_table()
+        elif text != ";":
+            statements.skip_statement()
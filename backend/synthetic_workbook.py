@@ -0,0 +1,179 @@
+"""
+Synthetic "Database Client" workbooks for benchmarks: bookings shaped like the
+studio's real sheet (title rows above the header, a sub-header row, month
+labels, blank rows, formulas, inconsistent spelling) with package names taken
+from packages.sql.
+
+    python synthetic_workbook.py ROWS [long|wide] [out.xlsx|out.csv]
+"""
+import csv
+import datetime
+import os
+import random
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PACKAGES_SQL = os.path.join(os.path.dirname(HERE), "packages.sql")
+
+MONTHS = ["Januari", "Februari", "Maret", "April", "Mei", "Juni", "Juli",
+          "Agustus", "September", "Oktober", "November", "Desember"]
+# Event sequences a client books, with weights (engagement first, wedding last)
+JOURNEYS = [
+    (["Wedding"], 30),
+    (["Engagement", "Wedding"], 25),
+    (["Prewedding", "Wedding"], 15),
+    (["Engagement", "Prewedding", "Wedding"], 10),
+    (["Siraman", "Pengajian", "Wedding"], 8),
+    (["Lamaran", "Akad", "Wedding"], 7),
+    (["Engagement"], 5),
+]
+# How people actually type events and packages in the sheet
+SPELLINGS = {
+    "Wedding": ["WEDDING", "Wedding", "wedding"],
+    "Engagement": ["ENGAGEMENT", "engagement", "Engagement"],
+    "Prewedding": ["PREWEDDING", "Prewedding", "prewedd"],
+    "Siraman": ["SIRAMAN", "siraman"],
+    "Pengajian": ["pengajian", "Pengajian"],
+    "Lamaran": ["lamaran", "LAMARAN"],
+    "Akad": ["Akad", "AKAD"],
+}
+EXTRAS = ["Photo Only", "foto video", "Photo Video", "Additional", None]
+HEADER_LONG = ["Januari", "Tanggal", "Event", "Client", None, "Paket", "Dp", "Harga Paket",
+               "Pengeluaran cetak foto dll", "Total Pendapatan", "Status Pembayaran"]
+HEADER_WIDE = ["No", "Client", "Tanggal", "Event Utama", "Paket Utama", "Paket Tambahan", "Layanan",
+               "Harga Paket", "Status Pembayaran"]
+
+
+def load_package_names(path=PACKAGES_SQL):
+    """Package names from the INSERT rows of a packages.sql dump (read like /upload-catalog)."""
+    from sql_dump import iter_insert_rows
+    with open(path, "rb") as f:
+        return [values[columns.index("name")].strip() for _, columns, values in iter_insert_rows(f)
+                if columns and "name" in columns]
+
+
+def _tiers(package_names):
+    # Plain package tiers ("Platinum", "Signature Plus", ...), not the event-specific bundles
+    return [n for n in package_names if "," not in n and not n.lower().startswith(("prewedding", "akad"))]
+
+
+def generate_bookings(n_rows, seed=0, package_names=None):
+    """
+    Yield booking dicts (client, date, event, paket, price, paid) until n_rows.
+    Clients follow a journey of events and mostly stay with one package tier,
+    so the data has real associations to mine.
+    """
+    rng = random.Random(seed)
+    package_names = package_names or load_package_names()
+    tiers = _tiers(package_names) or package_names
+    journeys, weights = zip(*JOURNEYS)
+    start = datetime.datetime(2019, 1, 1)
+    produced = 0
+    client = 0
+    while produced < n_rows:
+        client += 1
+        name = f"Client {client:06d}"
+        tier = rng.choice(tiers)
+        day = start + datetime.timedelta(days=rng.randrange(365 * 6))
+        for event in rng.choices(journeys, weights)[0]:
+            if produced >= n_rows:
+                return
+            # Prewedding / Akad have their own catalog packages; others reuse the tier, sometimes switching
+            if event == "Prewedding" and rng.random() < 0.7:
+                paket = rng.choice([n for n in package_names if n.lower().startswith("prewedding")] or [tier])
+            elif event == "Akad" and rng.random() < 0.8:
+                paket = "Akad"
+            elif rng.random() < 0.15:
+                paket = rng.choice(EXTRAS)
+            else:
+                paket = tier if rng.random() < 0.85 else rng.choice(tiers)
+            if paket is not None and rng.random() < 0.4:
+                paket = rng.choice([paket.upper(), paket.lower()])
+            yield {
+                "client": name,
+                "date": day,
+                "event": rng.choice(SPELLINGS[event]),
+                "paket": paket,
+                "price": rng.choice([1000000, 1250000, 2500000, 3500000, 5000000, 15000000]),
+                "paid": rng.choice(["Lunas", "lunas", "DP", None]),
+            }
+            produced += 1
+            day += datetime.timedelta(days=rng.randint(7, 90))
+
+
+def _long_rows(bookings, rng):
+    month = None
+    for i, b in enumerate(bookings):
+        label = MONTHS[b["date"].month - 1] if b["date"].month != month else None
+        month = b["date"].month
+        row_number = i + 6  # after title, blanks, header and sub-header
+        yield [label, b["date"], b["event"], b["client"], None, b["paket"],
+               b["price"] // 5, b["price"], 150000, f"=H{row_number}-I{row_number}", b["paid"]]
+        if rng.random() < 0.01:
+            yield []
+
+
+def _wide_rows(bookings):
+    # One row per client: first event + package, second package, remaining events as "Layanan"
+    current, number = None, 0
+    for b in bookings:
+        if current is not None and b["client"] != current[1]:
+            yield current
+            current = None
+        if current is None:
+            number += 1
+            current = [number, b["client"], b["date"], b["event"], b["paket"], None, None, b["price"], b["paid"]]
+        elif current[5] is None:
+            current[5] = b["paket"]
+        else:
+            current[6] = ", ".join(filter(None, [current[6], b["event"]]))
+    if current is not None:
+        yield current
+
+
+def workbook_rows(n_rows, layout="long", seed=0, package_names=None):
+    """All sheet rows, messy preamble included. n_rows counts bookings (long) or clients' bookings (wide)."""
+    rng = random.Random(seed + 1)
+    bookings = generate_bookings(n_rows, seed, package_names)
+    yield [f"Schedule Ranah Creative {2019} (synthetic)"]
+    yield []
+    yield []
+    if layout == "long":
+        yield HEADER_LONG
+        yield [None, None, None, None, "No Hp"]
+        yield from _long_rows(bookings, rng)
+    elif layout == "wide":
+        yield HEADER_WIDE
+        yield from _wide_rows(bookings)
+    else:
+        raise ValueError("layout must be 'long' or 'wide'")
+
+
+def write_workbook(path, n_rows, layout="long", seed=0, package_names=None):
+    """Write a synthetic workbook (.xlsx, streamed with openpyxl's write-only mode) or .csv. Returns path."""
+    rows = workbook_rows(n_rows, layout, seed, package_names)
+    if path.endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            # CSV uploads have no preamble: start at the header
+            for _ in range(3):
+                next(rows)
+            for row in rows:
+                writer.writerow(["" if v is None else v for v in row])
+        return path
+
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Database Client")
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return path
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    layout = sys.argv[2] if len(sys.argv) > 2 else "long"
+    out = sys.argv[3] if len(sys.argv) > 3 else f"synthetic_{layout}_{rows}.xlsx"
+    print(write_workbook(out, rows, layout))
@@ -0,0 +1,258 @@
+import random
+import time
+
+import pandas as pd
+import pytest
+
+import main
+from analysis import run_analysis
+from dataset_cache import DatasetCache
+from mining import MINING_ENGINES
+from model_store import ModelStore
+from result_cache import AnalysisCache, dataset_fingerprint
+
+PACKAGES = ['Signature Plus', 'Signature', 'Platinum', 'Titanium', 'Gold', 'Akad',
+            'Prewedding Platinum', 'Prewedding Signature']
+
+
+def make_bookings(n_clients, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for c in range(n_clients):
+        for pkg in rng.sample(PACKAGES, rng.randint(1, 4)):
+            rows.append({'Client': f"Client {c}", 'Event': rng.choice(['Wedding', 'Engagement', None]), 'Paket': pkg})
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def analysis_state(monkeypatch, tmp_path):
+    """Isolated model state: catalog + dataset in memory, model store and files in a temp dir."""
+    monkeypatch.chdir(tmp_path)
+    for name in ('DATASET', 'DATASET_KEY', 'DATASET_HASH', 'PRODUCTS', 'CATALOG_MATCHER', 'CATALOG_INDEX',
+                 'CATALOG_HASH', 'CATALOG_KEYS_HASH', 'SNAPSHOT', 'ANALYSIS_PARAMS', 'INCREMENTAL_STATE'):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    main.PRODUCTS = {p: {"id": str(i), "name": p} for i, p in enumerate(PACKAGES)}
+    main.build_catalog_indexes()
+    main.DATASET = make_bookings(300)
+    monkeypatch.setattr(main, 'ANALYSIS_CACHE', AnalysisCache(directory=str(tmp_path / "analysis_cache")))
+    monkeypatch.setattr(main, 'MODEL_STORE', ModelStore(str(tmp_path / "model.db")))
+    main.MODEL_STORE.save_products(main.PRODUCTS)
+    return main
+
+
+def analyze(**params):
+    request = main.AnalysisRequest(**params)
+    return run_analysis(main.DATASET, main.PRODUCTS, request.model_dump())
+
+
+def wait_for(job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = main.get_analysis_job(job_id)
+        if status['status'] in ('completed', 'failed', 'cancelled'):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def rule_set(rules):
+    return sorted((tuple(sorted(r['antecedents'])), tuple(sorted(r['consequents'])),
+                   round(r['support'], 9), round(r['confidence'], 9), round(r['lift'], 9)) for r in rules)
+
+
+def test_sparse_encoding_matches_dense(analysis_state):
+    dense = analyze(min_support=0.05, min_confidence=0.3)
+    sparse = analyze(min_support=0.05, min_confidence=0.3, sparse=True, trace_memory=True)
+    assert dense['encoding'] == 'dense' and sparse['encoding'] == 'sparse'
+    assert dense['rules']
+    assert rule_set(sparse['rules']) == rule_set(dense['rules'])
+    assert sparse['peak_memory_mb'] > 0 and dense['peak_memory_mb'] is None
+
+
+def test_engines_agree(analysis_state):
+    results = {algorithm: analyze(min_support=0.03, min_confidence=0.2, algorithm=algorithm)
+               for algorithm in MINING_ENGINES}
+    assert results['apriori']['rules']
+    for algorithm, result in results.items():
+        assert result['algorithm'] == algorithm
+        assert rule_set(result['rules']) == rule_set(results['apriori']['rules']), algorithm
+
+
+def test_unknown_algorithm_is_rejected(analysis_state):
+    with pytest.raises(main.HTTPException) as exc:
+        main.analyze_data(main.AnalysisRequest(min_support=0.1, min_confidence=0.5, algorithm="magic"))
+    assert exc.value.status_code == 400
+
+
+def test_analysis_job_publishes_rules(analysis_state):
+    expected = analyze(min_support=0.05, min_confidence=0.3)
+    submitted = main.analyze_data(main.AnalysisRequest(min_support=0.05, min_confidence=0.3))
+    assert submitted['status'] == 'queued'
+
+    status = wait_for(submitted['job_id'])
+    assert status['status'] == 'completed', status
+    assert status['percent'] == 100.0
+    assert all(stage['state'] == 'done' for stage in status['stages'].values())
+
+    result = main.get_analysis_result(submitted['job_id'])
+    # The result is a summary; the rules are read from the store (/rules)
+    assert 'rules' not in result and result['rules_count'] == len(expected['rules'])
+    assert rule_set(main.MODEL_STORE.load_rules()) == rule_set(expected['rules'])
+    assert main.MODEL_STORE.load_items() == expected['items']
+    assert result['generation'] == main.MODEL_STORE.active_generation()
+
+
+def test_cancelled_job_leaves_model_untouched(analysis_state):
+    # Occupy the single worker so the second job is still queued when cancelled
+    first = main.analyze_data(main.AnalysisRequest(min_support=0.05, min_confidence=0.3))
+    second = main.analyze_data(main.AnalysisRequest(min_support=0.01, min_confidence=0.1))
+    main.cancel_analysis_job(second['job_id'])
+
+    assert wait_for(second['job_id'])['status'] == 'cancelled'
+    with pytest.raises(main.HTTPException) as exc:
+        main.get_analysis_result(second['job_id'])
+    assert exc.value.status_code == 409
+    assert wait_for(first['job_id'])['status'] == 'completed'
+    assert [g['params']['min_support'] for g in main.MODEL_STORE.generations()] == [0.05]
+
+
+def test_stage_progress_cancellation():
+    from jobs import JobCancelled, StageProgress
+    shared = {}
+    tracker = StageProgress(shared, ("extract", "mine"))
+    tracker.stage("extract")
+    tracker.update(0.5)
+    assert shared['stage'] == 'extract' and shared['fraction'] == 0.5
+    shared['cancel'] = True
+    with pytest.raises(JobCancelled):
+        tracker.stage("mine")
+    assert shared['stages']['extract']['state'] == 'running'
+
+
+def test_repeat_analysis_is_served_from_cache(analysis_state):
+    first = main.analyze_data(main.AnalysisRequest(min_support=0.05, min_confidence=0.3))
+    assert first['cached'] is False
+    assert wait_for(first['job_id'])['status'] == 'completed'
+    expected = main.get_analysis_result(first['job_id'])
+    expected_rules = main.MODEL_STORE.load_rules()
+
+    again = main.analyze_data(main.AnalysisRequest(min_support=0.05, min_confidence=0.3))
+    assert again['cached'] is True and again['status'] == 'completed'
+    republished = main.get_analysis_result(again['job_id'])
+    assert republished['rules_count'] == expected['rules_count']
+    assert republished['generation'] == expected['generation'] + 1
+    assert main.MODEL_STORE.load_rules(republished['generation']) == expected_rules
+
+    # Different parameters are a different entry
+    other = main.analyze_data(main.AnalysisRequest(min_support=0.05, min_confidence=0.5))
+    assert other['cached'] is False
+    wait_for(other['job_id'])
+
+    # A changed dataset drops the entries of the old one
+    main.DATASET = make_bookings(300, seed=1)
+    main.ANALYSIS_CACHE.invalidate(dataset_hash=main.current_dataset_hash())
+    assert main.ANALYSIS_CACHE.stats()['memory_entries'] == 0
+    fresh = main.analyze_data(main.AnalysisRequest(min_support=0.05, min_confidence=0.3))
+    assert fresh['cached'] is False
+    wait_for(fresh['job_id'])
+
+
+def test_append_matches_full_analysis(analysis_state, monkeypatch, tmp_path):
+    params = main.AnalysisRequest(min_support=0.05, min_confidence=0.3).model_dump()
+    main.apply_analysis_result(run_analysis(main.DATASET, main.PRODUCTS, params), params=params)
+    monkeypatch.setattr(main, 'DATASET_CACHE', DatasetCache(directory=str(tmp_path / "dataset_cache")))
+    main.DATASET_CACHE.put("history", main.DATASET)
+    main.set_dataset(main.DATASET, "history")
+
+    # New clients plus extra rows for a client already in the history
+    batch = make_bookings(330, seed=1).iloc[-60:]
+    batch = pd.concat([batch, pd.DataFrame([{'Client': 'Client 0', 'Event': 'Wedding', 'Paket': 'Akad'}])])
+    history_rows = len(main.DATASET)
+    for part in (batch.iloc[:50], batch.iloc[50:]):
+        response = main.append_rows(part)
+        assert response['rows_appended'] == len(part)
+
+    assert response['rescanned'] is False
+    assert len(main.DATASET) == history_rows + len(batch)
+    full = run_analysis(main.DATASET, main.PRODUCTS, params)
+    assert rule_set(main.MODEL_STORE.load_rules()) == rule_set(full['rules'])
+    assert main.MODEL_STORE.load_items() == full['items']
+    assert main.MODEL_STORE.generations()[0]['source'] == 'append'
+    # Only the appended rows were hashed and stored; the dataset reads back whole
+    assert main.current_dataset_hash() == dataset_fingerprint(main.DATASET)
+    assert main.DATASET_KEY.startswith("history+") and main.DATASET_KEY.count("+") == 2
+    pd.testing.assert_frame_equal(main.DATASET_CACHE.get(main.DATASET_KEY), main.DATASET)
+
+
+def test_append_requires_an_analysis(analysis_state):
+    with pytest.raises(main.HTTPException) as exc:
+        main.append_rows(make_bookings(5))
+    assert exc.value.status_code == 400
+
+
+def test_sweep_cells_match_full_analyses(analysis_state):
+    supports, confidences = [0.1, 0.03, 0.05], [0.6, 0.2, 0.4]
+    response = main.sweep_analysis(main.SweepRequest(supports=supports, confidences=confidences))
+    assert response['cached'] is False
+    assert response['supports'] == sorted(supports) and response['confidences'] == sorted(confidences)
+    assert len(response['cells']) == 9
+
+    for cell in response['cells']:
+        full = analyze(min_support=cell['min_support'], min_confidence=cell['min_confidence'])
+        assert cell['rules_count'] == len(full['rules']), cell
+        assert cell['itemsets_count'] == len(full['frequent_itemsets']), cell
+        if full['rules']:
+            assert cell['max_lift'] == round(max(r['lift'] for r in full['rules']), 4)
+            covered = {i for r in full['rules'] for i in r['antecedents'] + r['consequents']}
+            assert cell['items_covered'] == len(covered)
+        else:
+            assert cell['top_rule'] is None
+
+    again = main.sweep_analysis(main.SweepRequest(supports=supports, confidences=confidences))
+    assert again['cached'] is True and again['cells'] == response['cells']
+    # Sweeps never publish a model
+    assert main.MODEL_STORE.active_generation() is None
+
+
+def test_sweep_rejects_bad_grids(analysis_state):
+    for supports, confidences in (([], [0.5]), ([0.1, 1.5], [0.5]), ([i / 100 for i in range(1, 41)], [i / 100 for i in range(1, 12)])):
+        with pytest.raises(main.HTTPException) as exc:
+            main.sweep_analysis(main.SweepRequest(supports=supports, confidences=confidences))
+        assert exc.value.status_code == 400
+
+
+def test_budget_adjusts_run_and_reports_limits(analysis_state):
+    unlimited = analyze(min_support=0.01, min_confidence=0.2)
+    assert unlimited['limits']['applied'] == []
+    # A third of the itemsets: capping the length is enough; 20: support has to go up too
+    for budget, applied in ((len(unlimited['frequent_itemsets']) // 3, ['max_len']), (20, ['max_len', 'min_support'])):
+        result = analyze(min_support=0.01, min_confidence=0.2, max_itemsets=budget)
+        limits = result['limits']
+        assert limits['applied'] == applied
+        assert limits['estimated_itemsets'] <= budget
+        assert len(result['frequent_itemsets']) <= budget
+        # Same rules as an unbudgeted run with the parameters the budget chose
+        rerun = analyze(min_support=limits['min_support'], min_confidence=0.2, max_len=limits['max_len'])
+        assert rule_set(result['rules']) == rule_set(rerun['rules'])
+
+
+def test_budget_refusal_fails_job_with_422(analysis_state):
+    submitted = main.analyze_data(main.AnalysisRequest(min_support=0.01, min_confidence=0.2, max_itemsets=5,
+                                                       on_budget="refuse"))
+    assert wait_for(submitted['job_id'])['status'] == 'failed'
+    with pytest.raises(main.HTTPException) as exc:
+        main.get_analysis_result(submitted['job_id'])
+    assert exc.value.status_code == 422 and "budget" in exc.value.detail
+    assert main.MODEL_STORE.active_generation() is None
+
+
+def test_top_k_keeps_best_rules_in_order(analysis_state):
+    full = analyze(min_support=0.03, min_confidence=0.2)
+    top = analyze(min_support=0.03, min_confidence=0.2, top_k=5, rank_by="confidence")
+    assert len(top['rules']) == 5 and top['limits']['applied'] == ['top_k']
+    assert top['limits']['rules_before_top_k'] == len(full['rules'])
+    cutoff = sorted((r['confidence'] for r in full['rules']), reverse=True)[4]
+    assert all(r['confidence'] >= cutoff for r in top['rules'])
+    assert top['rules'] == [r for r in full['rules'] if r in top['rules']]
+    with pytest.raises(main.HTTPException):
+        main.analyze_data(main.AnalysisRequest(min_support=0.03, min_confidence=0.2, rank_by="support"))
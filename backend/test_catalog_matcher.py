@@ -0,0 +1,125 @@
+import json
+import os
+import random
+import re
+
+from catalog_matcher import KEY_END, CatalogMatcher, CatalogIndex, WordIndex, suffix_array
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def legacy_extract_catalog_items(text_soup, known_products_sorted):
+    # Reference: the original per-product scan from analyze_data
+    found = set()
+    soup_lower = text_soup.lower()
+    for product in known_products_sorted:
+        if product.lower() in soup_lower:
+            found.add(product)
+    for product in known_products_sorted:
+        if product in found:
+            continue
+        ignore_words = {'dan', 'lain-lain', 'lain', 'dll', 'dan lain-lain', '(', ')', ','}
+        components = [c.strip().lower() for c in product.replace(',', ' ').replace('(', ' ').replace(')', ' ').split()
+                      if c.strip().lower() not in ignore_words and len(c.strip()) > 3]
+        if not components:
+            continue
+        if any(comp in soup_lower for comp in components):
+            found.add(product)
+    return found
+
+
+def load_catalog():
+    with open(os.path.join(HERE, 'products.json'), 'r') as f:
+        return list(json.load(f).keys())
+
+
+def test_matches_legacy_on_catalog_soups():
+    products = load_catalog()
+    known_products_sorted = sorted(products, key=len, reverse=True)
+    matcher = CatalogMatcher(products)
+
+    words = [w for p in products for w in p.replace(',', ' ').split()]
+    words += ['wedding', 'Prewed', 'akad nikah', 'PLATINUM', 'sig', 'nan', '-', 'Gold/Titan']
+    rng = random.Random(42)
+    for _ in range(2000):
+        soup = " ".join(rng.choice(words) for _ in range(rng.randint(0, 8)))
+        assert matcher.match(soup) == legacy_extract_catalog_items(soup, known_products_sorted), soup
+
+
+def test_overlapping_and_nested_names():
+    products = ['Signature Plus', 'Signature', 'Plus Size', 'Akad', 'ab', 'bc', 'abcd', '']
+    known_products_sorted = sorted(products, key=len, reverse=True)
+    matcher = CatalogMatcher(products)
+    for soup in ['signature plus size', 'xabcdx', 'abc', 'AKAD (Signature)', '', 'plu']:
+        assert matcher.match(soup) == legacy_extract_catalog_items(soup, known_products_sorted), soup
+
+
+def test_empty_catalog():
+    assert CatalogMatcher([]).match("Wedding Platinum") == set()
+
+
+def legacy_is_valid(item_name, products):
+    item_lower = str(item_name).lower().strip()
+    if not item_lower or len(item_lower) < 2:
+        return False
+    for product_key in products.keys():
+        prod_lower = product_key.lower().strip()
+        if item_lower == prod_lower or prod_lower in item_lower or item_lower in prod_lower:
+            return True
+    return False
+
+
+def legacy_product_details(item_name, products):
+    item_lower = item_name.lower()
+    for k, v in products.items():
+        if k.lower() == item_lower:
+            return v
+    best_match = None
+    longest_len = 0
+    for k, v in products.items():
+        k_lower = k.lower()
+        if k_lower in item_lower and len(k_lower) > longest_len:
+            longest_len = len(k_lower)
+            best_match = v
+    return best_match
+
+
+def test_catalog_index_matches_legacy_lookups():
+    with open(os.path.join(HERE, 'products.json'), 'r') as f:
+        products = json.load(f)
+    products[' Gold '] = {"name": "Gold padded"}
+    products['GOLD'] = {"name": "Gold upper"}
+    index = CatalogIndex(products)
+
+    words = [w for p in products for w in p.replace(',', ' ').split()]
+    words += ['wedding', 'prewed', 'ture', 'Pl', 'g', 'nan', 'Signature Plus', ' gold ']
+    rng = random.Random(3)
+    items = list(products) + [k.upper() for k in products]
+    items += [" ".join(rng.choice(words) for _ in range(rng.randint(1, 4))) for _ in range(2000)]
+    items += [w[i:j] for w in words for i in range(len(w)) for j in range(i + 1, len(w) + 1)]
+    for item in items:
+        item_lower = item.lower().strip()
+        if len(item_lower) >= 2:
+            assert index.is_valid(item_lower) == legacy_is_valid(item, products), item
+        assert index.details(item) is legacy_product_details(item, products), item
+
+
+def test_suffix_array_orders_suffixes_up_to_their_key_end():
+    rng = random.Random(5)
+    # Small alphabet and chunk width: long tied runs, sorted over several rounds
+    keys = ["".join(rng.choice("ab ") for _ in range(rng.randint(0, 40))) for _ in range(60)] + ["abab"] * 20
+    text, starts = suffix_array(keys, width=2)
+    suffixes = [text[i:text.index(KEY_END, i)] for i in starts]
+    assert suffixes == sorted(k[i:] for k in keys for i in range(len(k)))
+
+
+def test_word_index_search_matches_a_regex_scan():
+    rows = [("signature plus", "• 2 fotografer & 2 videografer.\n• liputan pernikahan"),
+            ("engagement, siraman (platinum)", "prewedding platinum; straße"),
+            ("gold akad", ""), ("c++ paket", "akad-nikah 100%")]
+    index = WordIndex(range(len(rows)), rows)
+    for kw in ["signature plus", "plus", "platinum", "(platinum)", "siraman (platinum)", "wedding", "prewedding",
+               "akad", "akad-nikah", "100%", "c++", "++", "straße", "strasse", "2 fotografer", "missing"]:
+        regex = re.compile(rf"\b{re.escape(kw)}\b", re.IGNORECASE)
+        expected = [pos for pos, texts in enumerate(rows) if any(regex.search(text) for text in texts)]
+        assert index.search(regex, kw) == expected, kw
@@ -0,0 +1,129 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+import main
+from model_snapshot import Catalog
+from model_store import ModelStore
+from result_cache import AnalysisCache
+from test_recommendations import published_rules  # noqa: F401 (fixture)
+
+
+def legacy_sheet_products(df):
+    # Reference: the old row-by-row loop of upload_catalog
+    products = {}
+    for _, row in df.iterrows():
+        category = str(row.get('category', '')).strip()
+        name = str(row.get('name', '')).strip()
+        if not name:
+            name = str(row.get('nama', '')).strip()
+        key = " ".join(part for part in (category, name) if part).strip()
+        if not key:
+            continue
+        products[key] = {"id": str(row.get('id', '')), "name": name, "category": category,
+                         "price": str(row.get('price', '')), "description": str(row.get('description', '')),
+                         "image": str(row.get('image', ''))}
+    return products
+
+
+def workbook(rows):
+    buf = io.BytesIO()
+    pd.DataFrame(rows).to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def test_sheet_reads_like_the_row_loop():
+    contents = workbook({
+        " ID": [1, 2, 3, 4, 5, 6],
+        "Category": ["Wedding", None, " ", "Wedding", "Akad", ""],
+        "Name": [" Gold", "Silver", None, "Gold", "", None],
+        "Nama": ["x", "y", "Zumba", "z", "Kabul", None],
+        "Price": [1.5, np.nan, 3, 4, 5, 6],
+        "Description": ["2 fotografer\n6 jam", None, "c", "d", "e", "f"],
+    })
+    df = pd.read_excel(io.BytesIO(contents))
+    df.columns = df.columns.astype(str).str.strip().str.lower()
+    assert list(main.sheet_catalog_products(df)) != []
+    assert dict(main.sheet_catalog_products(df)) == legacy_sheet_products(df)
+
+
+def test_diff_catalog():
+    old = {"A": {"price": "1"}, "B": {"price": "2"}, "C": {"price": "3"}}
+    new = {"B": {"price": "9"}, "C": {"price": "3"}, "D": {"price": "4"}}
+    assert main.diff_catalog(old, new, replace=False) == (
+        {"A": {"price": "1"}, "B": {"price": "9"}, "C": {"price": "3"}, "D": {"price": "4"}},
+        {"B": {"price": "9"}, "D": {"price": "4"}}, [])
+    assert main.diff_catalog(old, new, replace=True) == (new, {"B": {"price": "9"}, "D": {"price": "4"}}, ["A"])
+    # Another order than the current catalog's: replaced whole
+    assert main.diff_catalog(old, {"C": {"price": "3"}, "B": {"price": "2"}}, replace=True)[0] is None
+
+
+def test_patched_table_matches_a_full_build(published_rules, monkeypatch, tmp_path):
+    rules, products = published_rules
+    monkeypatch.setattr(main, 'ANALYSIS_CACHE', AnalysisCache(directory=str(tmp_path / "analysis_cache")))
+    generation = main.MODEL_STORE.active_generation()
+    main.materialized_recommendations(generation)
+
+    edited = json.loads(json.dumps(products))
+    edited["Gold"]["price"] = "4500000.00"
+    edited["Titanium"]["description"] += "\n· Liputan wedding & akad."
+    del edited["Akad"]
+    edited["Zumba Platinum"] = {"id": "99", "name": "Zumba Platinum", "category": "", "price": "1",
+                                "description": "Kelas pengajian", "image": ""}
+    computed = []
+    recommend_service = main.recommend_service
+    monkeypatch.setattr(main, 'recommend_service', lambda *a, **kw: computed.append(a[0]) or recommend_service(*a, **kw))
+
+    main.update_catalog(*main.diff_catalog(main.PRODUCTS, edited, replace=True))
+    assert main.PRODUCTS == edited and main.MODEL_STORE.load_products() == edited
+    table = main.MODEL_STORE.recommendations(generation, main.CATALOG_HASH)
+    # Only the queries the edits reach were recomputed
+    assert 0 < len(computed) < len(table)
+    full = main.build_recommendation_table(main.MODEL_STORE.packed_rules(generation),
+                                           main.MODEL_STORE.load_items(generation), Catalog(edited))
+    assert json.loads(json.dumps(table)) == json.loads(json.dumps(full))
+
+
+def test_upsert_keeps_other_products_and_cached_analyses(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    for name in ('PRODUCTS', 'CATALOG_MATCHER', 'CATALOG_INDEX', 'CATALOG_HASH', 'CATALOG_KEYS_HASH'):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    monkeypatch.setattr(main, 'MODEL_STORE', ModelStore(str(tmp_path / "model.db")))
+    monkeypatch.setattr(main, 'ANALYSIS_CACHE', AnalysisCache(directory=str(tmp_path / "analysis_cache")))
+    client = TestClient(main.app)
+
+    sheet = {"category": ["Wedding", "Wedding", "Paket"], "name": ["Gold", "Silver", "Akad"],
+             "price": [4000000, 3000000, 6000000], "description": ["6 jam", "4 jam", "4 jam"]}
+    response = client.post("/upload-catalog", files={"file": ("catalog.xlsx", workbook(sheet))})
+    assert response.status_code == 200 and response.json()["changed"] == 3
+    analysis = main.ANALYSIS_CACHE.key("d", main.CATALOG_KEYS_HASH, {})
+    main.ANALYSIS_CACHE.put(analysis, {"rules": [], "items": ["Wedding Gold"]})
+    matcher = main.CATALOG_MATCHER
+
+    # A price change: one row written, nothing keyed by the catalog keys invalidated
+    price = {"category": ["Wedding"], "name": ["Gold"], "price": [4500000], "description": ["6 jam"]}
+    response = client.post("/upload-catalog?mode=upsert", files={"file": ("price.xlsx", workbook(price))})
+    assert response.json()["changed"] == 1 and response.json()["removed"] == 0
+    assert list(main.PRODUCTS) == ["Wedding Gold", "Wedding Silver", "Paket Akad"]
+    assert main.PRODUCTS["Wedding Gold"]["price"] == "4500000"
+    assert main.MODEL_STORE.load_products() == main.PRODUCTS and main.SNAPSHOT.catalog.hash == main.CATALOG_HASH
+    assert main.CATALOG_MATCHER is matcher and main.CATALOG_INDEX.details("wedding gold")["price"] == "4500000"
+    assert main.ANALYSIS_CACHE.get(analysis) is not None
+
+    # Removing a key the analysis never matched keeps it; removing one it did drops it
+    sheet["price"][0] = 4500000
+    del sheet["category"][1], sheet["name"][1], sheet["price"][1], sheet["description"][1]
+    response = client.post("/upload-catalog", files={"file": ("catalog.xlsx", workbook(sheet))})
+    assert response.json()["removed"] == 1 and list(main.PRODUCTS) == ["Wedding Gold", "Paket Akad"]
+    assert main.CATALOG_MATCHER is not matcher
+    assert main.ANALYSIS_CACHE.get(main.ANALYSIS_CACHE.key("d", main.CATALOG_KEYS_HASH, {})) is not None
+    response = client.post("/upload-catalog", files={"file": ("catalog.xlsx", workbook(
+        {"category": ["Paket"], "name": ["Akad"], "price": [6000000], "description": ["4 jam"]}))})
+    assert response.json()["removed"] == 1 and list(main.PRODUCTS) == ["Paket Akad"]
+    assert main.ANALYSIS_CACHE.stats()["disk_entries"] == 0
+
+    response = client.post("/upload-catalog?mode=merge", files={"file": ("catalog.xlsx", workbook(sheet))})
+    assert response.status_code == 400
@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import DatasetCache
+from ingest import read_upload_cached
+from result_cache import dataset_fingerprint
+from test_ingest import messy_workbook
+
+
+def bookings(n):
+    return pd.DataFrame({
+        "Client": [f"Klien {i % 37} é" for i in range(n)],
+        "Paket": [["Signature", None, "Gold Akad", ""][i % 4] for i in range(n)],
+        "Tanggal": pd.date_range("2024-01-01", periods=n, freq="h"),
+        "Harga": np.arange(n) * 1.5,
+        "Lunas": np.arange(n) % 2 == 0,
+    }).astype({"Client": "str", "Paket": "str"})
+
+
+def test_round_trip_keeps_columns_dtypes_and_index(tmp_path):
+    cache = DatasetCache(directory=str(tmp_path))
+    df = bookings(500)
+    df = df[df.index % 3 != 0]  # row labels with gaps, like dropna() leaves
+    assert cache.put("k", df)
+
+    restored = DatasetCache(directory=str(tmp_path)).get("k")
+    pd.testing.assert_frame_equal(restored, df)
+    assert dataset_fingerprint(restored) == dataset_fingerprint(df)
+    # Numeric columns are read from the mapped file
+    base = restored["Harga"].to_numpy()
+    while base.base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert isinstance(base, np.memmap)
+    assert cache.get("missing") is None
+
+
+def test_identical_upload_skips_parsing(tmp_path, monkeypatch):
+    cache = DatasetCache(directory=str(tmp_path))
+    contents = messy_workbook()
+    first, key = read_upload_cached(io.BytesIO(contents), "bookings.xlsx", cache)
+
+    monkeypatch.setattr("ingest.read_excel_streaming", lambda path: 1 / 0)
+    again, same_key = read_upload_cached(io.BytesIO(contents), "copy.xlsx", cache)
+    assert same_key == key
+    pd.testing.assert_frame_equal(again, first)
+    # Mixed-type columns (times, bools, numbers with errors) round-trip too, read back from disk
+    restored, _ = read_upload_cached(io.BytesIO(contents), "bookings.xlsx", DatasetCache(directory=str(tmp_path)))
+    pd.testing.assert_frame_equal(restored, first)
+    # Same bytes as another file type: parsed by that type's reader
+    assert cache.upload_key("ab" * 32, "x.csv") != cache.upload_key("ab" * 32, "x.xlsx")
+
+
+def test_disk_budget_evicts_least_recently_used(tmp_path):
+    cache = DatasetCache(directory=str(tmp_path), disk_budget_mb=0.25)
+    df = bookings(3000)  # ~100 KB on disk
+    for key in ("a", "b", "c"):
+        cache.put(key, df)
+    assert cache.get("a") is None and cache.get("c") is not None
+    assert cache.stats()["disk_bytes"] <= cache.disk_budget
@@ -0,0 +1,70 @@
+import random
+
+import pandas as pd
+from mlxtend.frequent_patterns import apriori, association_rules
+from mlxtend.preprocessing import TransactionEncoder
+
+from incremental import IncrementalMiner
+
+ITEMS = ['Signature', 'Platinum', 'Titanium', 'Gold', 'Akad', 'Prewedding', 'Henna', 'Siraman']
+
+
+def random_transactions(n, rng, start=0):
+    return {f"c{start + i}": set(rng.sample(ITEMS, rng.randint(1, 4))) for i in range(n)}
+
+
+def full_rules(transactions, min_support, min_confidence):
+    mined = [sorted(t) for t in transactions.values() if len(t) > 1]
+    te = TransactionEncoder()
+    one_hot_df = pd.DataFrame(te.fit(mined).transform(mined), columns=te.columns_)
+    frequent = apriori(one_hot_df, min_support=min_support, use_colnames=True)
+    rules = association_rules(frequent, metric="confidence", min_threshold=min_confidence)
+    return sorted((tuple(sorted(r.antecedents)), tuple(sorted(r.consequents)),
+                   round(r.support, 9), round(r.confidence, 9), round(r.lift, 9)) for r in rules.itertuples())
+
+
+def miner_rules(miner):
+    return sorted((tuple(r['antecedents']), tuple(r['consequents']),
+                   round(r['support'], 9), round(r['confidence'], 9), round(r['lift'], 9)) for r in miner.rules())
+
+
+def test_small_delta_updates_without_rescan():
+    rng = random.Random(1)
+    history = random_transactions(2000, rng)
+    miner = IncrementalMiner(history, 0.05, 0.3)
+
+    # Inserts, a modified client and a removed one
+    delta = random_transactions(20, rng, start=2000)
+    delta["c0"] = {'Gold', 'Akad', 'Henna'}
+    delta["c1"] = None
+    summary = miner.update(delta)
+    assert summary == {"transactions_changed": 22, "rescanned": False, "itemsets_touched": summary["itemsets_touched"]}
+    assert miner.rescans == 1
+
+    history.update(delta)
+    expected = {k: v for k, v in history.items() if v is not None}
+    assert miner_rules(miner) == full_rules(expected, 0.05, 0.3)
+    assert miner.items() == sorted({i for t in expected.values() for i in t})
+
+
+def test_rescans_once_the_pre_large_budget_is_spent():
+    rng = random.Random(2)
+    history = random_transactions(200, rng)
+    miner = IncrementalMiner(history, 0.1, 0.4)
+
+    total = dict(history)
+    for batch in range(10):
+        delta = random_transactions(30, rng, start=200 + 30 * batch)
+        miner.update(delta)
+        total.update(delta)
+        assert miner_rules(miner) == full_rules(total, 0.1, 0.4)
+    assert miner.rescans > 1
+
+
+def test_unchanged_transactions_are_ignored():
+    rng = random.Random(3)
+    history = random_transactions(100, rng)
+    miner = IncrementalMiner(history, 0.1, 0.4)
+    before = miner.rules()
+    assert miner.update({"c5": history["c5"], "missing": None})["transactions_changed"] == 0
+    assert miner.rules() == before
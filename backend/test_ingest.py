@@ -0,0 +1,161 @@
+import datetime
+import glob
+import io
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from ingest import HEADER_SCAN_ROWS, header_score, parse_spooled, pick_sheet, read_upload_cached, read_xls, upload_reader
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_upload_legacy(contents, filename):
+    # Reference: the old reader on in-memory bytes, the workbook parsed three times (also timed by bench_ingest)
+    if filename.endswith('.csv'):
+        df = pd.read_csv(io.BytesIO(contents))
+    elif filename.endswith(('.xls', '.xlsx')):
+        xl = pd.ExcelFile(io.BytesIO(contents))
+        target_sheet = pick_sheet(xl.sheet_names)
+        preview = pd.read_excel(io.BytesIO(contents), sheet_name=target_sheet, header=None, nrows=HEADER_SCAN_ROWS)
+        best_row = 0
+        max_score = -1
+        for i, row in preview.iterrows():
+            row_values = [str(val).lower().strip() for val in row.values if pd.notnull(val)]
+            if not row_values:
+                continue
+            score = header_score(row_values)
+            if score > max_score and score > 0:
+                max_score = score
+                best_row = i
+        df = pd.read_excel(io.BytesIO(contents), sheet_name=target_sheet, skiprows=best_row)
+        df = df.dropna(how='all').reset_index(drop=True)
+    else:
+        raise ValueError("Invalid file format")
+    return df.dropna(how='all').dropna(axis=1, how='all')
+
+
+def messy_workbook():
+    """Title rows above the header, mixed cell types, gaps, errors and a distractor sheet."""
+    wb = Workbook()
+    wb.active.title = "Notes"
+    wb.active.append(["nothing to see"])
+    ws = wb.create_sheet("Database Client")
+    ws.append(["Laporan Klien 2024"])
+    ws.append([])
+    ws.append(["Tanggal", "Client", None, "Paket", "Harga", "Lunas", "Jam"])
+    for i in range(60):
+        ws.append([
+            datetime.datetime(2024, 1, 1) + datetime.timedelta(days=i, hours=i % 5),
+            f"Client {i % 17}",
+            None,
+            ["Signature", "Platinum", "Gold Akad", None][i % 4],
+            [1500000, 2500000.5, 3000000.0, None][i % 3],
+            i % 2 == 0,
+            datetime.time(9 + i % 8, 30),
+        ])
+    ws.append([])
+    ws["C10"] = "=1/0"  # formula without a cached value: empty
+    ws["E12"] = "#DIV/0!"  # error cell inside a data column
+    ws.cell(row=70, column=2, value="  spaced  ")
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def parse_file(path):
+    return parse_spooled(str(path), upload_reader(str(path)))
+
+
+def test_streaming_excel_matches_pandas_reader(tmp_path):
+    contents = messy_workbook()
+    expected = read_upload_legacy(contents, "bookings.xlsx")
+    (tmp_path / "bookings.xlsx").write_bytes(contents)
+    got = parse_file(tmp_path / "bookings.xlsx")
+    assert list(got.columns) == ["Tanggal", "Client", "Paket", "Harga", "Lunas", "Jam"]
+    pd.testing.assert_frame_equal(got, expected)
+
+
+@pytest.mark.parametrize("path", glob.glob(os.path.join(REPO_ROOT, "*.xlsx")))
+def test_streaming_excel_matches_pandas_on_repo_workbooks(path):
+    with open(path, 'rb') as f:
+        contents = f.read()
+    pd.testing.assert_frame_equal(parse_file(path), read_upload_legacy(contents, path))
+
+
+def test_csv_matches_single_read(tmp_path):
+    df = pd.DataFrame({"Client": [f"C{i % 40}" for i in range(250)],
+                       "Paket": ["Signature", "Platinum", None, "Gold"] * 62 + ["Akad", "Akad"],
+                       "Harga": range(250)})
+    contents = df.to_csv(index=False).encode()
+    (tmp_path / "data.csv").write_bytes(contents)
+    pd.testing.assert_frame_equal(parse_file(tmp_path / "data.csv"), read_upload_legacy(contents, "data.csv"))
+
+
+def test_xls_reader_parses_the_sheet_once(tmp_path, monkeypatch):
+    # pandas picks the engine from the file's content: an .xlsx stands in for a legacy .xls
+    path = tmp_path / "bookings.xlsx"
+    path.write_bytes(messy_workbook())
+    skiprows = pd.read_excel(path, sheet_name="Database Client", skiprows=2).dropna(how='all').reset_index(drop=True)
+    parses = []
+    parse = pd.ExcelFile.parse
+    monkeypatch.setattr(pd.ExcelFile, "parse", lambda self, *a, **kw: parses.append(a) or parse(self, *a, **kw))
+    pd.testing.assert_frame_equal(read_xls(str(path)), skiprows)
+    assert len(parses) == 1
+
+
+def test_unknown_extension_is_rejected(tmp_path):
+    from dataset_cache import DatasetCache
+
+    with pytest.raises(ValueError):
+        read_upload_cached(io.BytesIO(b"x"), "data.txt", DatasetCache(directory=str(tmp_path)))
+
+
+def test_upload_endpoint_streams_workbook(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import main
+    from result_cache import AnalysisCache
+
+    from dataset_cache import DatasetCache
+    from model_store import ModelStore
+
+    for name in ('DATASET', 'DATASET_KEY', 'INCREMENTAL_STATE'):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    monkeypatch.setattr(main, 'ANALYSIS_CACHE', AnalysisCache(directory=str(tmp_path / "analysis_cache")))
+    monkeypatch.setattr(main, 'DATASET_CACHE', DatasetCache(directory=str(tmp_path / "dataset_cache")))
+    monkeypatch.setattr(main, 'MODEL_STORE', ModelStore(str(tmp_path / "model.db")))
+    client = TestClient(main.app)
+
+    response = client.post("/upload", files={"file": ("bookings.xlsx", messy_workbook())})
+    assert response.status_code == 200
+    assert response.json()["rows"] == len(main.DATASET) == 61
+    uploaded = main.DATASET
+
+    # A restarted server (or another worker) restores the dataset on first use
+    main.DATASET, main.DATASET_KEY = None, None
+    assert client.get("/status").json()["rows"] == 61
+    pd.testing.assert_frame_equal(main.DATASET, uploaded)
+
+    response = client.post("/upload", files={"file": ("bookings.txt", b"nope")})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("layout", ["long", "wide"])
+def test_synthetic_workbooks_read_like_the_real_sheet(layout, tmp_path):
+    from analysis import prepare_dataset
+    from synthetic_workbook import HEADER_LONG, HEADER_WIDE, write_workbook
+
+    header = [c for c in (HEADER_LONG if layout == "long" else HEADER_WIDE) if c]
+    frames = {}
+    for ext in ("xlsx", "csv"):
+        path = write_workbook(str(tmp_path / f"bookings.{ext}"), 300, layout)
+        frames[ext] = parse_file(path)
+    # Header found below the title rows; formula-only columns come back empty
+    assert [c for c in header if c in frames["xlsx"].columns] == [c for c in header if c != "Total Pendapatan"]
+    _, id_col, item_cols, is_long_format = prepare_dataset(frames["xlsx"])
+    assert is_long_format == (layout == "long")
+    assert any("Paket" in c for c in item_cols) and any("Event" in c for c in item_cols)
+    # Same bookings whatever the file type
+    assert frames["csv"][id_col].nunique() == frames["xlsx"][id_col].nunique()
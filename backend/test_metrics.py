@@ -0,0 +1,60 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import metrics
+from test_analyze import analysis_state, make_bookings, wait_for  # noqa: F401 (fixture)
+from test_ingest import messy_workbook
+
+
+def sample(text, line_start):
+    """Value of the first exposition line starting with `line_start`."""
+    return next(float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(line_start))
+
+
+def test_exposition_format():
+    counter = metrics.Counter("test_things_total", "Things.", ["kind"])
+    histogram = metrics.Histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    try:
+        counter.inc(kind='a "quoted"\nname')
+        counter.inc(2, kind='a "quoted"\nname')
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        text = metrics.render()
+        assert '# TYPE test_things_total counter\ntest_things_total{kind="a \\"quoted\\"\\nname"} 3' in text
+        assert 'test_latency_seconds_bucket{le="0.1"} 2' in text
+        assert 'test_latency_seconds_bucket{le="1.0"} 3' in text
+        assert 'test_latency_seconds_bucket{le="+Inf"} 4' in text
+        assert 'test_latency_seconds_count 4' in text and 'test_latency_seconds_sum 3.65' in text
+        assert histogram.value() == (4, 3.65)
+        with pytest.raises(ValueError):
+            counter.inc(other="label")
+    finally:
+        metrics.REGISTRY.remove(counter)
+        metrics.REGISTRY.remove(histogram)
+
+
+def test_pipeline_stages_reach_metrics_and_server_timing(analysis_state):
+    main = analysis_state
+    client = TestClient(main.app)
+    before = metrics.STAGE_SECONDS.value(stage="mine") or (0, 0.0)
+
+    response = client.post("/upload", files={"file": ("bookings.xlsx", messy_workbook())})
+    timing = response.headers["Server-Timing"]
+    assert all(f"{name};dur=" in timing for name in ("spool", "header_detection", "parse", "total"))
+
+    # Bookings the catalog knows, in place of the uploaded sheet
+    main.DATASET = make_bookings(300)
+    job = client.post("/analyze", json={"min_support": 0.05, "min_confidence": 0.3}).json()
+    assert wait_for(job["job_id"])["status"] == "completed"
+    response = client.get(f"/analyze/{job['job_id']}/result")
+    assert "job-mine;dur=" in response.headers["Server-Timing"]
+
+    client.get("/recommendations", params={"service": "Platinum"})
+    text = client.get("/metrics").text
+    assert metrics.STAGE_SECONDS.value(stage="mine")[0] == before[0] + 1
+    for name in ("extract", "encode", "rules", "validate", "persist"):
+        assert metrics.STAGE_SECONDS.value(stage=name) is not None, name
+    assert sample(text, 'apriori_http_request_seconds_count{method="GET",route="/recommendations",status="200"}') >= 1
+    assert sample(text, "apriori_model_rules ") == response.json()["rules_count"]
+    assert sample(text, "apriori_model_transactions ") > 0
+    assert sample(text, "apriori_model_frequent_itemsets ") > 0
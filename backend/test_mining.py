@@ -0,0 +1,75 @@
+import random
+
+import numpy as np
+import pandas as pd
+from mlxtend.preprocessing import TransactionEncoder
+
+from mining import MINING_ENGINES, MiningPreflight, item_bitsets
+
+
+def one_hot(transactions, sparse=False):
+    te = TransactionEncoder().fit(transactions)
+    if sparse:
+        return pd.DataFrame.sparse.from_spmatrix(te.transform(transactions, sparse=True), columns=te.columns_)
+    return pd.DataFrame(te.transform(transactions), columns=te.columns_)
+
+
+def itemset_supports(frequent_itemsets):
+    return {itemset: round(support, 12) for itemset, support in zip(frequent_itemsets['itemsets'], frequent_itemsets['support'])}
+
+
+def random_transactions(seed=1, n=130):
+    rng = random.Random(seed)
+    items = [f"Paket {i}" for i in range(25)]
+    return [rng.sample(items[:8], rng.randint(1, 5)) + rng.sample(items, 2) for _ in range(n)]
+
+
+def test_engines_find_identical_itemsets():
+    transactions = random_transactions()
+    for sparse in (False, True):
+        df = one_hot(transactions, sparse)
+        for min_support in (0.02, 0.1, 0.5):
+            expected = itemset_supports(MINING_ENGINES['apriori'](df, min_support))
+            for name, engine in MINING_ENGINES.items():
+                assert itemset_supports(engine(df, min_support)) == expected, (name, sparse, min_support)
+
+
+def test_sparse_bitsets_match_dense():
+    for n in (1, 64, 130):  # word boundaries
+        transactions = random_transactions(seed=n, n=n)
+        dense, sparse = item_bitsets(one_hot(transactions)), item_bitsets(one_hot(transactions, sparse=True))
+        assert len(dense) == len(sparse) and all(np.array_equal(d, s) for d, s in zip(dense, sparse))
+
+
+def test_eclat_output_layout():
+    df = one_hot([['a', 'b'], ['a', 'b', 'c'], ['a']])
+    result = MINING_ENGINES['eclat'](df, 0.5)
+    assert list(result.columns) == ['support', 'itemsets']
+    assert list(result['itemsets']) == [frozenset({'a'}), frozenset({'b'}), frozenset({'a', 'b'})]
+    assert list(result['support']) == [1.0, 2 / 3, 2 / 3]
+
+
+def test_engines_respect_max_len():
+    df = one_hot(random_transactions())
+    full = itemset_supports(MINING_ENGINES['apriori'](df, 0.02))
+    for max_len in (1, 2, 3):
+        expected = {itemset: support for itemset, support in full.items() if len(itemset) <= max_len}
+        for name, engine in MINING_ENGINES.items():
+            assert itemset_supports(engine(df, 0.02, max_len)) == expected, (name, max_len)
+
+
+def test_preflight_bounds_the_itemset_count():
+    for sparse in (False, True):
+        df = one_hot(random_transactions(seed=2, n=400), sparse)
+        preflight = MiningPreflight(df)
+        for min_support in (0.005, 0.02, 0.1, 0.6):
+            for max_len in (None, 2, 3):
+                found = MINING_ENGINES['eclat'](df, min_support, max_len)
+                per_length = pd.Series([len(i) for i in found['itemsets']]).value_counts().sort_index().tolist()
+                bounds = preflight.itemset_bounds(min_support, max_len)
+                assert len(bounds) >= len(per_length)
+                # Items and pairs are exact, longer itemsets bounded
+                assert bounds[:2] == per_length[:2]
+                assert all(b >= c for b, c in zip(bounds, per_length))
+                estimate = preflight.estimate(min_support, max_len)
+                assert estimate["itemsets"] == sum(bounds) and estimate["memory_mb"] > 0
@@ -0,0 +1,378 @@
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+
+import pytest
+
+import main
+from model_store import ModelStore
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def legacy_recommended_items(service, rules, products):
+    # Reference: the original full scan over every rule
+    query_lower = service.lower().strip()
+    search_keywords = [query_lower]
+    if query_lower == "wedding":
+        search_keywords.append("pernikahan")
+
+    def regex(kw):
+        if kw == "wedding":
+            return re.compile(rf"(?<!pre)\b{re.escape(kw)}\b", re.IGNORECASE)
+        return re.compile(rf"\b{re.escape(kw)}\b", re.IGNORECASE)
+
+    matching = []
+    for kw in search_keywords:
+        for key, data in products.items():
+            if regex(kw).search(key.lower()) or regex(kw).search(str(data.get('description', '')).lower()):
+                if key not in matching:
+                    matching.append(key)
+
+    recs = []
+    for rule in rules:
+        ants = [str(a).lower() for a in rule['antecedents']]
+        hit = any(m.lower() in ants for m in matching) or \
+            any(regex(kw).search(a) for kw in search_keywords for a in ants)
+        if hit:
+            for cons in rule['consequents']:
+                item = str(cons).strip()
+                if not any(r[0] == str(cons) for r in recs) and not item.isdigit() and len(item) > 2:
+                    recs.append((item, f"{int(rule['confidence'] * 100)}%"))
+    recs = sorted(recs, key=lambda x: int(x[1].replace('%', '')), reverse=True)
+    return recs[:5]
+
+
+SERVICES = ["wedding", "prewedding", "pengajian", "engagement", "akad", "Platinum", "signature plus", "xyz"]
+
+
+@pytest.fixture
+def published_rules(monkeypatch, tmp_path):
+    """The repo's products.json catalog and rules.json (shuffled) published to a temp store."""
+    with open(os.path.join(HERE, 'products.json'), 'r') as f:
+        products = json.load(f)
+    with open(os.path.join(HERE, 'rules.json'), 'r') as f:
+        rules = json.load(f)
+    rng = random.Random(7)
+    rng.shuffle(rules)
+
+    for name in ('PRODUCTS', 'CATALOG_MATCHER', 'CATALOG_INDEX'):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    monkeypatch.setattr(main, 'MODEL_STORE', ModelStore(str(tmp_path / "model.db")))
+    main.PRODUCTS = products
+    main.build_catalog_indexes()
+    main.MODEL_STORE.save_products(products)
+    main.MODEL_STORE.publish(rules, [])
+    return rules, products
+
+
+def test_indexed_recommendations_match_full_scan(published_rules):
+    rules, products = published_rules
+    for service in SERVICES:
+        result = main.get_recommendations(service)
+        got = [(r['item'], r['confidence']) for r in result['recommendations']]
+        assert got == legacy_recommended_items(service, rules, products), service
+
+
+def test_batch_matches_single_requests(published_rules):
+    services = SERVICES + ["PLATINUM", "wedding"]
+    batch = main.get_recommendations_batch(main.BatchRecommendationRequest(services=services))
+    assert batch["generation"] == main.MODEL_STORE.active_generation()
+    assert [r["service"] for r in batch["results"]] == services
+    for result in batch["results"]:
+        assert result == main.get_recommendations(result["service"]), result["service"]
+
+    top = main.get_recommendations_batch(main.BatchRecommendationRequest(services=["wedding"], top_n=2))
+    assert top["results"][0]["recommendations"] == batch["results"][0]["recommendations"][:2]
+
+    for bad in ({"services": []}, {"services": ["a"] * (main.MAX_BATCH_SERVICES + 1)}, {"services": ["a"], "top_n": 0}):
+        with pytest.raises(main.HTTPException) as exc:
+            main.get_recommendations_batch(main.BatchRecommendationRequest(**bad))
+        assert exc.value.status_code == 400
+
+
+def test_recommendation_table_is_stored_with_rules(published_rules, monkeypatch):
+    rules, products = published_rules
+    computed = []
+    recommend_service = main.recommend_service
+    monkeypatch.setattr(main, 'recommend_service', lambda service, *args, **kwargs: (
+        computed.append(service), recommend_service(service, *args, **kwargs))[1])
+
+    # Published without a table: built on first use, then a lookup
+    first = main.get_recommendations("Akad")
+    generation = main.MODEL_STORE.active_generation()
+    table = main.MODEL_STORE.recommendations(generation, main.CATALOG_HASH)
+    assert {"akad", "wedding", "signature plus", "pengajian"} <= set(table)
+    computed.clear()
+    assert main.get_recommendations("Akad") == first
+    assert main.get_recommendations("PENGAJIAN")["recommendations"] == table["pengajian"]["recommendations"][:5]
+    assert computed == []
+    # Free text and lists longer than the table fall back to computing
+    main.get_recommendations("akad wedding")
+    main.get_recommendations_batch(main.BatchRecommendationRequest(services=["akad"], top_n=20))
+    assert computed == ["akad wedding", "akad"]
+
+    # Persisted: a new process reads it back
+    reopened = ModelStore(main.MODEL_STORE.path)
+    assert reopened.recommendations(generation, main.CATALOG_HASH) == json.loads(json.dumps(table))
+    # A catalog change invalidates it
+    main.PRODUCTS = dict(products, Zumba={"name": "Zumba", "description": "zumba class"})
+    main.build_catalog_indexes()
+    main.MODEL_STORE.save_products(main.PRODUCTS)
+    assert reopened.recommendations(generation, main.CATALOG_HASH) is None
+    assert "zumba" in main.materialized_recommendations(generation)
+
+    # Analyses publish the table in the same transaction as the rules
+    result = main.apply_analysis_result({"rules": rules, "items": ["Akad"], "message": ""}, source="test")
+    assert ModelStore(main.MODEL_STORE.path).recommendations(result["generation"], main.CATALOG_HASH) is not None
+
+
+def test_read_endpoints_revalidate_with_model_version(published_rules):
+    from fastapi.testclient import TestClient
+    rules, products = published_rules
+    client = TestClient(main.app)
+
+    first = client.get("/recommendations", params={"service": "akad"})
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "no-cache"
+    for header in (etag, f'"other", W/{etag}', "*"):
+        cached = client.get("/recommendations", params={"service": "akad"}, headers={"If-None-Match": header})
+        assert cached.status_code == 304 and cached.content == b"" and cached.headers["ETag"] == etag
+    assert client.get("/items", headers={"If-None-Match": etag}).status_code == 304
+
+    # Every model write is a new version: publish, rollback, catalog upload
+    tags = {etag}
+    for write in (lambda: main.MODEL_STORE.publish(rules[:10], []),
+                  lambda: main.MODEL_STORE.activate(1),
+                  lambda: main.MODEL_STORE.save_products(products)):
+        write()
+        response = client.get("/recommendations", params={"service": "akad"}, headers={"If-None-Match": etag})
+        assert response.status_code == 200 and response.headers["ETag"] not in tags
+        tags.add(response.headers["ETag"])
+
+    # Job, status and metrics responses are never cached
+    status = client.get("/status", headers={"If-None-Match": "*"})
+    assert status.status_code == 200 and "no-store" in status.headers["Cache-Control"] and "ETag" not in status.headers
+
+
+def read_pages(client, **params):
+    """Every rule of a /rules query, following next_cursor. Returns (rules, page count)."""
+    rules, pages, cursor = [], 0, None
+    while True:
+        body = client.get("/rules", params=dict(params, **({"cursor": cursor} if cursor else {}))).json()
+        rules += body["rules"]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return rules, pages
+
+
+def test_rule_pages_match_sorted_filtered_rules(published_rules):
+    from fastapi.testclient import TestClient
+    rules, _ = published_rules
+    client = TestClient(main.app)
+    item = "Prewedding Signature"
+    queries = [
+        ({"sort": "position"}, lambda r: True, lambda p, r: p),
+        ({"sort": "lift"}, lambda r: True, lambda p, r: (-r["lift"], p)),
+        ({"sort": "confidence", "order": "asc", "min_lift": 1.0}, lambda r: r["lift"] >= 1.0,
+         lambda p, r: (r["confidence"], p)),
+        ({"sort": "support", "item": item.upper(), "max_antecedents": 1},
+         lambda r: item in r["antecedents"] + r["consequents"] and len(r["antecedents"]) <= 1,
+         lambda p, r: (-r["support"], p)),
+        ({"min_confidence": 0.8, "min_support": 0.3, "min_antecedents": 2},
+         lambda r: r["confidence"] >= 0.8 and r["support"] >= 0.3 and len(r["antecedents"]) >= 2,
+         lambda p, r: (-r["lift"], p)),
+    ]
+    for params, keep, key in queries:
+        expected = sorted((p for p, r in enumerate(rules) if keep(r)), key=lambda p: key(p, rules[p]))
+        assert expected, params
+        got, pages = read_pages(client, limit=37, **params)
+        assert [r["position"] for r in got] == expected, params
+        assert pages == len(expected) // 37 + 1
+        assert {k: got[0][k] for k in rules[0]} == rules[expected[0]]
+
+    streamed = client.get("/rules", params={"format": "ndjson", "sort": "lift"})
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in streamed.text.splitlines()] == read_pages(client, limit=1000)[0]
+    assert len(client.get("/rules", params={"format": "ndjson", "limit": 5}).text.splitlines()) == 5
+    for bad in ({"sort": "name"}, {"order": "up"}, {"limit": 0}, {"limit": 5000}, {"format": "xml"}):
+        assert client.get("/rules", params=bad).status_code == 400, bad
+
+
+def test_rule_cursor_stays_on_its_generation(published_rules):
+    from fastapi.testclient import TestClient
+    rules, _ = published_rules
+    client = TestClient(main.app)
+    first = client.get("/rules", params={"limit": 10}).json()
+    assert first["generation"] == 1
+
+    # A newer model doesn't shift pages already being read
+    main.MODEL_STORE.publish(rules[:5], [])
+    second = client.get("/rules", params={"limit": 10, "cursor": first["next_cursor"]}).json()
+    assert second["generation"] == 1
+    assert [r["position"] for r in first["rules"] + second["rules"]] == \
+        [r["position"] for r in read_pages(client, generation=1, limit=20)[0][:20]]
+    assert len(client.get("/rules").json()["rules"]) == 5
+
+    assert client.get("/rules", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/rules", params={"limit": 10, "cursor": first["next_cursor"], "min_lift": 2}).status_code == 400
+    for _ in range(main.MODEL_STORE.keep_generations):
+        main.MODEL_STORE.publish(rules[:5], [])
+    assert client.get("/rules", params={"limit": 10, "cursor": first["next_cursor"]}).status_code == 410
+    assert client.get("/rules", params={"generation": 1}).status_code == 404
+
+
+def test_model_file_maps_rules_catalog_and_table(tmp_path):
+    from model_file import ModelFile, write_model_file
+    from rule_pack import PackedRules, pack_rules
+    with open(os.path.join(HERE, 'rules.json'), 'r') as f:
+        rules = json.load(f)
+    with open(os.path.join(HERE, 'products.json'), 'r') as f:
+        products = json.load(f)
+    table = {"akad": {"service_details": None, "recommendations": [{"item": "Signature", "confidence": "80%"}]},
+             "pernikahan": {"service_details": {"name": "Ñ"}, "recommendations": []}}
+    path = write_model_file(str(tmp_path / "m.rmf"), {"generation": 3}, pack_rules(rules), ["Akad", "Gold"],
+                            products, table)
+
+    model = ModelFile(path)
+    packed = PackedRules(pack_rules(rules))
+    assert model.meta == {"generation": 3} and model.products == products and model.items == ["Akad", "Gold"]
+    assert len(model.packed) == len(rules) and model.packed.keys == packed.keys
+    assert model.packed.consequents_for(packed.keys[:5]) == packed.consequents_for(packed.keys[:5])
+    assert {query: model.recommendation(query) for query in table} == table
+    assert model.recommendation("zumba") is None and model.table_size() == 2
+
+    (tmp_path / "old.rmf").write_bytes(b"RMF1" + bytes(64))
+    with pytest.raises(ValueError):
+        ModelFile(str(tmp_path / "old.rmf"))
+
+
+def test_workers_follow_the_shared_model_version(published_rules, monkeypatch):
+    rules, products = published_rules
+    first = main.get_recommendations("akad")
+    served = main.SNAPSHOT
+    assert served.generation == 1 and served.model_file.path.startswith(main.model_file_dir())
+
+    # Another worker (its own store connection) publishes: the next request maps the new file
+    other_worker = ModelStore(main.MODEL_STORE.path)
+    other_worker.publish([r for r in rules if "akad" not in str(r["antecedents"]).lower()], [])
+    assert main.get_recommendations("akad")["recommendations"] == []
+    assert main.SNAPSHOT.generation == 2
+    # ... and uploads a catalog: adopted with the model file
+    other_worker.save_products(dict(products, Zumba={"name": "Zumba", "description": "zumba class"}))
+    main.get_recommendations("akad")
+    assert "Zumba" in main.PRODUCTS and main.SNAPSHOT.catalog.hash == main.CATALOG_HASH
+
+    # A freshly started worker maps the file already exported, without rebuilding it
+    other_worker.activate(1)
+    main.get_recommendations("akad")
+    monkeypatch.setattr(main, 'SNAPSHOT', None)
+    monkeypatch.setattr(main, 'RECENT_SNAPSHOTS', {})
+    monkeypatch.setattr(main, 'export_model_file', lambda *args: pytest.fail("exported twice"))
+    assert main.get_recommendations("akad") == first
+    assert len(os.listdir(main.model_file_dir())) == main.MODEL_FILES_KEPT + 1
+
+
+def test_snapshot_is_consistent_and_rolls_back_in_place(published_rules, monkeypatch):
+    from fastapi.testclient import TestClient
+    rules, products = published_rules
+    client = TestClient(main.app)
+    first = client.get("/recommendations", params={"service": "akad"}).json()
+    held = main.current_snapshot()
+
+    # A request holding the snapshot keeps reading one model across a publish
+    main.MODEL_STORE.publish([r for r in rules if "akad" not in str(r["antecedents"]).lower()], ["Akad"])
+    assert main.current_snapshot() is not held and main.SNAPSHOT.items == ("Akad",)
+    assert held.generation == 1 and held.items == ()
+    assert main.lookup_recommendations("akad", held, {}) == first
+    assert client.get("/recommendations", params={"service": "akad"}).json()["recommendations"] == []
+    assert client.get("/items").json() == {"items": ["Akad"]}
+
+    # Rolling back to a model served recently swaps the kept snapshot back in
+    monkeypatch.setattr(main, 'export_model_file', lambda *args: pytest.fail("rollback exported a model file"))
+    assert client.post("/model/generations/1/activate").status_code == 200
+    assert main.SNAPSHOT.model_file is held.model_file and main.SNAPSHOT.catalog is held.catalog
+    assert main.SNAPSHOT.version == main.MODEL_STORE.model_state()[0]
+    assert client.get("/recommendations", params={"service": "akad"}).json() == first
+
+
+def test_store_generations_and_rollback(tmp_path):
+    store = ModelStore(str(tmp_path / "model.db"), keep_generations=2)
+    rule = {"antecedents": ["A"], "consequents": ["B"], "support": 0.1, "confidence": 0.5, "lift": 1.0}
+    first = store.publish([rule], ["A", "B"])
+    second = store.publish([rule, dict(rule, antecedents=["B"], consequents=["A"])], ["A", "B"])
+    assert store.active_generation() == second and store.rule_count() == 2
+
+    assert store.activate(first)
+    assert store.load_rules() == [rule] and store.rule_count() == 1
+
+    # Only keep_generations are kept, but never the active one
+    third = store.publish([], [])
+    assert [g["generation"] for g in store.generations()] == [third, second]
+    assert not store.activate(first)
+    assert store.load_items(second) == ["A", "B"]
+
+
+def test_store_imports_json_once(tmp_path):
+    rules = [{"antecedents": ["A"], "consequents": ["B"], "support": 0.1, "confidence": 0.5, "lift": 1.0}]
+    products = {"Platinum": {"id": "1"}, "Gold": {"id": "2"}}
+    for name, data in (("rules.json", rules), ("items.json", ["A", "B"]), ("products.json", products)):
+        with open(tmp_path / name, 'w') as f:
+            json.dump(data, f)
+    store = ModelStore(str(tmp_path / "model.db"))
+    paths = [str(tmp_path / n) for n in ("rules.json", "items.json", "products.json")]
+    store.import_json(*paths)
+    store.import_json(*paths)
+    assert [g["source"] for g in store.generations()] == ["json-import"]
+    assert store.load_rules() == rules
+    assert list(store.load_products()) == ["Platinum", "Gold"]
+
+
+def test_packed_rules_match_a_scan_of_the_rules(tmp_path):
+    with open(os.path.join(HERE, 'rules.json'), 'r') as f:
+        rules = json.load(f)
+    store = ModelStore(str(tmp_path / "model.db"))
+    generation = store.publish(rules, [])
+    packed = store.packed_rules(generation)
+    assert len(packed) == len(rules)
+    antecedent_keys = sorted({str(a).lower() for rule in rules for a in rule["antecedents"]})
+    assert sorted(packed.keys) == antecedent_keys
+    for keys in [{"wedding platinum"}, set(antecedent_keys[:7]), {"missing"}, set()]:
+        expected = [(tuple(rule["consequents"]), rule["confidence"]) for rule in rules
+                    if any(str(a).lower() in keys for a in rule["antecedents"])]
+        assert packed.consequents_for(keys) == expected
+    assert store.packed_rules(generation) is packed
+
+
+def test_packed_rules_built_for_older_generations(tmp_path):
+    store = ModelStore(str(tmp_path / "model.db"))
+    rule = {"antecedents": ["Ä"], "consequents": ["B", "C"], "support": 0.1, "confidence": 0.25, "lift": 1.0}
+    generation = store.publish([rule], [])
+    with store._connect() as conn:
+        conn.execute("DELETE FROM packed_rules")
+
+    reopened = ModelStore(str(tmp_path / "model.db"))
+    assert reopened.packed_rules(generation).consequents_for({"ä"}) == [(("B", "C"), 0.25)]
+    assert reopened.packed_rules(generation + 1) is None
+
+
+def test_server_starts_without_pandas(tmp_path):
+    # Importing main must not load the data stack; /ready reports the warm-up
+    code = (
+        "import sys\n"
+        "from fastapi.testclient import TestClient\n"
+        "import main\n"
+        "assert 'pandas' not in sys.modules and 'mlxtend' not in sys.modules\n"
+        "with TestClient(main.app) as client:\n"
+        "    main.MODEL_READY.wait(30)\n"
+        "    ready = client.get('/ready')\n"
+        "    assert ready.status_code == 200 and ready.json()['catalog_loaded'], ready.json()\n"
+        "    assert client.get('/recommendations', params={'service': 'wedding'}).status_code == 200\n"
+        "assert 'pandas' not in sys.modules\n"
+    )
+    env = dict(os.environ, MODEL_DB=str(tmp_path / "model.db"))
+    subprocess.run([sys.executable, "-c", code], cwd=HERE, env=env, check=True, capture_output=True)
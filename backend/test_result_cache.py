@@ -0,0 +1,61 @@
+import pandas as pd
+
+from result_cache import AnalysisCache, DatasetDigest, catalog_fingerprint, dataset_fingerprint
+
+
+def entry(n_rules):
+    return {"rules": [{"antecedents": ["Gold"], "consequents": ["Akad"], "confidence": 0.5}] * n_rules, "items": ["Gold"]}
+
+
+def test_memory_lru_eviction(tmp_path):
+    cache = AnalysisCache(directory=str(tmp_path), memory_budget_mb=0.01, disk_budget_mb=0)
+    keys = [AnalysisCache.key("d", "c", {"min_support": s}) for s in (0.1, 0.2, 0.3)]
+    for key in keys:
+        cache.put(key, entry(40))  # ~3 KB each, budget ~10 KB
+    assert cache.get(keys[0]) is not None  # now most recently used
+    cache.put(AnalysisCache.key("d", "c", {"min_support": 0.4}), entry(40))
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.memory_bytes <= cache.memory_budget
+
+
+def test_disk_tier_survives_restart_and_respects_budget(tmp_path):
+    cache = AnalysisCache(directory=str(tmp_path), memory_budget_mb=1, disk_budget_mb=0.01)
+    key = AnalysisCache.key("d", "c", {"min_support": 0.1})
+    cache.put(key, entry(10))
+    assert AnalysisCache(directory=str(tmp_path)).get(key) == entry(10)
+
+    for s in (0.2, 0.3, 0.4, 0.5):
+        cache.put(AnalysisCache.key("d", "c", {"min_support": s}), entry(40))
+    assert cache.stats()['disk_bytes'] <= cache.disk_budget
+
+
+def test_invalidate_by_dataset_and_catalog(tmp_path):
+    cache = AnalysisCache(directory=str(tmp_path))
+    cache.put(AnalysisCache.key("d1", "c1", {}), entry(1))
+    cache.put(AnalysisCache.key("d2", "c1", {}), entry(1))
+    cache.put(AnalysisCache.key("d2", "c2", {}), entry(1))
+    cache.invalidate(dataset_hash="d2")
+    cache.invalidate(catalog_hash="c2")
+    assert cache.get(AnalysisCache.key("d2", "c2", {})) is not None
+    assert cache.get(AnalysisCache.key("d1", "c1", {})) is None
+    assert cache.get(AnalysisCache.key("d2", "c1", {})) is None
+
+
+def test_fingerprints_follow_content():
+    df = pd.DataFrame({"Client": ["a", "b"], "Paket": ["Gold", None]})
+    assert dataset_fingerprint(df) == dataset_fingerprint(df.copy())
+    changed = df.copy()
+    changed.loc[1, "Paket"] = "Akad"
+    assert dataset_fingerprint(changed) != dataset_fingerprint(df)
+    assert catalog_fingerprint({"Gold": {"price": "1"}}) != catalog_fingerprint({"Gold": {"price": "2"}})
+
+
+def test_grown_digest_hashes_like_the_whole_dataset():
+    df = pd.DataFrame({"Client": ["a", "b", "c"], "Paket": ["Gold", None, "Akad"], "Harga": [1, 2, 3]})
+    digest = DatasetDigest(df)
+    for rows in (pd.DataFrame({"Client": ["d"], "Paket": ["Gold"], "Harga": [4]}),
+                 pd.DataFrame({"Client": ["e"], "Paket": ["Akad"], "Harga": [None]})):  # Harga turns float
+        df = pd.concat([df, rows], ignore_index=True)
+        digest = digest.grown(df)
+        assert digest.hexdigest() == dataset_fingerprint(df)
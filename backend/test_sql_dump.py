@@ -0,0 +1,100 @@
+import io
+import os
+import re
+
+import pytest
+
+import main
+from model_store import ModelStore
+from sql_dump import SqlDumpError, iter_insert_rows
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PACKAGES_SQL = os.path.join(os.path.dirname(HERE), "packages.sql")
+
+DUMP = """-- mysqldump, no column lists
+/*!40101 SET NAMES utf8mb4 */;
+CREATE TABLE IF NOT EXISTS `shop`.`packages` (
+  `id` int(11) NOT NULL,
+  `category` varchar(64) DEFAULT NULL,
+  `name` varchar(255) NOT NULL,
+  `price` decimal(10,2) NOT NULL,
+  `description` text,
+  PRIMARY KEY (`id`),
+  KEY `name_idx` (`name`(20))
+) ENGINE=InnoDB;
+INSERT INTO `shop`.`packages` VALUES (1,'Wedding','Signature',-1.50,'2 fotografer;\\r\\n8 jam'),
+(2, NULL, 'Akad ''Ijab'' Kabul', 3000000.00, 'It\\'s \\"gold\\" \\\\ 100\\% — café'),
+  (3,_utf8mb4'Wedding','Gold',1e3,NULL);
+# other tables are skipped unless they have a name column
+INSERT INTO users (email, password) VALUES ('a@b.c', 'x);--');
+INSERT IGNORE INTO `packages` (`price`, `nama`, `id`) VALUES (5, 'Zumba', 9) ON DUPLICATE KEY UPDATE price = 5;
+INSERT INTO packages SELECT * FROM old_packages;
+"""
+
+
+def test_rows_are_mapped_by_column_names_whatever_the_chunk_size():
+    for chunk_bytes in (1, 7, 4096):
+        rows = list(iter_insert_rows(io.BytesIO(DUMP.encode("utf-8")), chunk_bytes=chunk_bytes))
+        assert rows == [
+            ("packages", ["id", "category", "name", "price", "description"],
+             ["1", "Wedding", "Signature", "-1.50", "2 fotografer;\r\n8 jam"]),
+            ("packages", ["id", "category", "name", "price", "description"],
+             ["2", None, "Akad 'Ijab' Kabul", "3000000.00", 'It\'s "gold" \\ 100\\% — café']),
+            ("packages", ["id", "category", "name", "price", "description"], ["3", "Wedding", "Gold", "1e3", None]),
+            ("users", ["email", "password"], ["a@b.c", "x);--"]),
+            ("packages", ["price", "nama", "id"], ["5", "Zumba", "9"]),
+        ], chunk_bytes
+
+
+def test_packages_sql_reads_like_the_old_regex():
+    with open(PACKAGES_SQL, encoding="utf-8") as f:
+        content = f.read()
+    pattern = re.compile(r"\(\s*(\d+)\s*,\s*'([^']*)'\s*,\s*'([^']*)'\s*,\s*([\d\.]+)\s*,\s*'([^']*)'\s*\)")
+    expected = {name.strip(): {"id": pid, "name": name.strip(), "category": "", "price": price,
+                               "description": desc.replace('\\r\\n', '\n'), "image": image}
+                for pid, name, desc, price, image in pattern.findall(content)}
+    with open(PACKAGES_SQL, "rb") as f:
+        assert dict(main.sql_catalog_products(f)) == expected
+
+
+def test_long_literals_are_not_rescanned_per_chunk():
+    description = "fotografer \\'x\\' " * 20000  # ~300 KB of escaped text
+    dump = f"INSERT INTO p (id, name, description) VALUES (1, 'Gold', '{description}'), (2, 'Akad', NULL);".encode()
+    reads = []
+
+    class Counted(io.BytesIO):
+        def read(self, size=-1):
+            reads.append(size)
+            return super().read(size)
+
+    rows = list(iter_insert_rows(Counted(dump), chunk_bytes=64))
+    assert rows == [("p", ["id", "name", "description"], ["1", "Gold", "fotografer 'x' " * 20000]),
+                    ("p", ["id", "name", "description"], ["2", "Akad", None])]
+    # The buffer grows geometrically around the literal
+    assert len(reads) < 60
+
+
+def test_truncated_dump_is_rejected():
+    with pytest.raises(SqlDumpError):
+        list(iter_insert_rows(io.BytesIO(b"INSERT INTO p (id, name) VALUES (1, 'Gold'), (2, 'Sig")))
+
+
+def test_catalog_upload_streams_sql_dump(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    from result_cache import AnalysisCache
+
+    for name in ('PRODUCTS', 'CATALOG_MATCHER', 'CATALOG_INDEX', 'CATALOG_HASH', 'CATALOG_KEYS_HASH', 'SNAPSHOT',
+                 'DATASET_KEY'):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    monkeypatch.setattr(main, 'MODEL_STORE', ModelStore(str(tmp_path / "model.db")))
+    monkeypatch.setattr(main, 'ANALYSIS_CACHE', AnalysisCache(directory=str(tmp_path / "analysis_cache")))
+    client = TestClient(main.app)
+
+    response = client.post("/upload-catalog", files={"file": ("dump.sql", DUMP.encode("utf-8"))})
+    assert response.status_code == 200
+    assert list(main.PRODUCTS) == ["Wedding Signature", "Akad 'Ijab' Kabul", "Wedding Gold", "Zumba"]
+    assert main.PRODUCTS["Wedding Signature"]["description"] == "2 fotografer;\n8 jam"
+    assert main.PRODUCTS["Wedding Gold"]["description"] == "" and main.MODEL_STORE.load_products() == main.PRODUCTS
+
+    response = client.post("/upload-catalog", files={"file": ("dump.sql", b"INSERT INTO p (name) VALUES ('Go")})
+    assert response.status_code == 400
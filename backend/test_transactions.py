@@ -0,0 +1,57 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+from transactions import build_text_soups
+
+
+def build_text_soups_rowwise(df, id_col, item_cols, is_long_format):
+    # Reference: the old row-by-row build_text_soups (also timed by bench_assembly)
+    def row_parts(row):
+        parts = []
+        for col in item_cols:
+            val = str(row[col]).strip()
+            if pd.notnull(row[col]) and val.lower() != 'nan' and val:
+                parts.append(val)
+        return parts
+
+    soups = []
+    if is_long_format:
+        for _, group in df.groupby(id_col):
+            full_text_parts = []
+            for _, row in group.iterrows():
+                full_text_parts.extend(row_parts(row))
+            soups.append(" ".join(full_text_parts))
+    else:
+        for _, row in df.iterrows():
+            soups.append(" ".join(row_parts(row)))
+    return soups
+
+
+def make_frame(n_rows, seed):
+    rng = random.Random(seed)
+    cells = ['Wedding', ' Platinum ', 'Prewedding Signature', '', '   ', 'nan', 'NaN', None, np.nan, 1500000, 2.5, 'Akad']
+    return pd.DataFrame({
+        'Client': [rng.choice(['Afra', 'Gre', 'Hudan', 'Cindy', 7, None]) for _ in range(n_rows)],
+        'Event': [rng.choice(cells) for _ in range(n_rows)],
+        'Paket': [rng.choice(cells) for _ in range(n_rows)],
+        'Tanggal': pd.to_datetime(['2019-01-05 10:30'] * (n_rows - 1) + [None]),
+        'Harga Paket': [rng.choice([1000000, np.nan, 2500000.0]) for _ in range(n_rows)],
+    }, index=range(5, 5 + 3 * n_rows, 3))
+
+
+def test_columnar_soups_match_rowwise():
+    item_cols = ['Event', 'Paket', 'Tanggal', 'Harga Paket']
+    for seed in range(5):
+        df = make_frame(200, seed).dropna(subset=['Client'])
+        df['Client'] = df['Client'].astype(str)
+        for is_long_format in (True, False):
+            assert build_text_soups(df, 'Client', item_cols, is_long_format) == \
+                build_text_soups_rowwise(df, 'Client', item_cols, is_long_format)
+
+
+def test_empty_rows_keep_their_transaction():
+    df = pd.DataFrame({'Client': ['a', 'b', 'a'], 'Paket': [None, 'nan', 'Gold']})
+    assert build_text_soups(df, 'Client', ['Paket'], True) == ['Gold', '']
+    assert build_text_soups(df, 'Client', ['Paket'], False) == ['', '', 'Gold']
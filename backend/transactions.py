@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+
+def clean_item_text(series):
+    """
+    Stringify one item column the way the row loop did (str(value).strip()),
+    as NaN where the cell is missing, blank or the literal 'nan'.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+        # astype(str) drops the time part of datetimes; str() per value keeps it
+        text = series.map(str, na_action='ignore')
+    else:
+        text = series.astype(str)
+    text = text.str.strip()
+    valid = series.notna() & (text != '') & (text.str.lower() != 'nan')
+    return text.where(valid)
+
+
+def build_text_soups(df, id_col, item_cols, is_long_format):
+    """
+    Build one text soup per transaction from the item columns, columnar.
+
+    Long format: every row of a client (grouped by id_col, sorted) is joined.
+    Wide format: every row is its own transaction.
+    Cells are joined with a single space in row-major order, skipping empty cells.
+    """
+    # Row soups: concatenate column by column, adding a space only between non-empty parts
+    row_soups = np.full(len(df), '', dtype=object)
+    has_text = np.zeros(len(df), dtype=bool)
+    for col in item_cols:
+        text = clean_item_text(df[col])
+        valid = text.notna().to_numpy()
+        values = text.to_numpy(dtype=object, na_value='')
+        sep = np.where(has_text & valid, ' ', '').astype(object)
+        row_soups = row_soups + sep + values
+        has_text |= valid
+
+    if not is_long_format:
+        return row_soups.tolist()
+
+    # Same group numbering (and order) as df.groupby(id_col); rows keep their order inside a group
+    keys = df.groupby(id_col).ngroup().to_numpy()
+    n_transactions = keys.max() + 1 if len(keys) else 0
+    group_parts = [[] for _ in range(n_transactions)]
+    # ngroup() gives -1 to rows with a missing id; groupby drops those
+    keep = has_text & (keys >= 0)
+    for key, soup in zip(keys[keep].tolist(), row_soups[keep].tolist()):
+        group_parts[key].append(soup)
+    return [" ".join(parts) for parts in group_parts]
+
+
+def transaction_keys(df, id_col, is_long_format):
+    """
+    Key of each soup returned by build_text_soups, in the same order: the client
+    id in long format (sorted groupby order), the row label in wide format.
+    """
+    if is_long_format:
+        return df.groupby(id_col).size().index.tolist()
+    return df.index.tolist()
@@ -0,0 +1,207 @@
+import posixpath
+import zipfile
+from xml.etree.ElementTree import iterparse, parse
+
+import numpy as np
+
+NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+DOC_REL_ATTR = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+SHARED_STRINGS_TYPE = "/sharedStrings"
+STYLES_TYPE = "/styles"
+
+ROW_TAG = NS + "row"
+CELL_TAG = NS + "c"
+VALUE_TAG = NS + "v"
+INLINE_STRING_TAG = NS + "is"
+TEXT_TAG = NS + "t"
+RUN_TAG = NS + "r"
+
+
+def _text_content(element):
+    # Plain <t> plus the <t> of every rich text run; phonetic runs (<rPh>) are skipped
+    snippets = []
+    plain = element.find(TEXT_TAG)
+    if plain is not None and plain.text is not None:
+        snippets.append(plain.text)
+    for run in element.findall(RUN_TAG):
+        t = run.find(TEXT_TAG)
+        if t is not None and t.text is not None:
+            snippets.append(t.text)
+    return "".join(snippets)
+
+
+def _column_index(coordinate):
+    col = 0
+    for ch in coordinate:
+        if ch.isdigit():
+            break
+        col = col * 26 + (ord(ch.upper()) - 64)
+    return col
+
+
+class XlsxStreamReader:
+    """
+    Minimal read-only .xlsx reader: the archive is opened once, the workbook
+    parts (sheet list, shared strings, date styles) are read, and sheet rows
+    are streamed with iterparse. Cell values are converted the way pandas'
+    openpyxl engine converts them (empty -> "", errors -> NaN, integral
+    numbers -> int, date styles -> datetime), using openpyxl's own helpers,
+    without building openpyxl's workbook, style and cell objects.
+    """
+
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path)
+        try:
+            self._read_workbook()
+        except Exception:
+            self.archive.close()
+            raise
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _rels(self, part):
+        """Relationship id -> (type, absolute part path) for `part`."""
+        folder, name = posixpath.split(part)
+        rels_path = posixpath.join(folder, "_rels", name + ".rels")
+        rels = {}
+        if rels_path not in self.archive.namelist():
+            return rels
+        for rel in parse(self.archive.open(rels_path)).getroot().iter(REL_NS + "Relationship"):
+            target = rel.get("Target")
+            if target.startswith("/"):
+                path = target.lstrip("/")
+            else:
+                path = posixpath.normpath(posixpath.join(folder, target))
+            rels[rel.get("Id")] = (rel.get("Type", ""), path)
+        return rels
+
+    def _read_workbook(self):
+        from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+
+        workbook_path = next((path for kind, path in self._rels("").values() if kind.endswith("/officeDocument")),
+                             "xl/workbook.xml")
+        rels = self._rels(workbook_path)
+        root = parse(self.archive.open(workbook_path)).getroot()
+
+        properties = root.find(NS + "workbookPr")
+        date1904 = properties is not None and properties.get("date1904", "").lower() in ("1", "true")
+        self.epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+        self.sheets = {}
+        for sheet in root.iter(NS + "sheet"):
+            self.sheets[sheet.get("name")] = rels[sheet.get(DOC_REL_ATTR)][1]
+        self.sheet_names = list(self.sheets)
+
+        self.shared_strings = []
+        self.date_styles, self.timedelta_styles = set(), set()
+        for kind, path in rels.values():
+            if kind.endswith(SHARED_STRINGS_TYPE):
+                self.shared_strings = self._read_shared_strings(path)
+            elif kind.endswith(STYLES_TYPE):
+                self.date_styles, self.timedelta_styles = self._read_date_styles(path)
+
+    def _read_shared_strings(self, path):
+        strings = []
+        for _, element in iterparse(self.archive.open(path)):
+            if element.tag == NS + "si":
+                strings.append(_text_content(element).replace('x005F_', ''))
+                element.clear()
+        return strings
+
+    def _read_date_styles(self, path):
+        """Indexes of the cell styles (cellXfs) whose number format is a date / a duration."""
+        from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+
+        root = parse(self.archive.open(path)).getroot()
+        custom = {}
+        num_fmts = root.find(NS + "numFmts")
+        if num_fmts is not None:
+            for fmt in num_fmts.iter(NS + "numFmt"):
+                custom[int(fmt.get("numFmtId"))] = fmt.get("formatCode")
+
+        date_styles, timedelta_styles = set(), set()
+        cell_xfs = root.find(NS + "cellXfs")
+        if cell_xfs is None:
+            return date_styles, timedelta_styles
+        for idx, xf in enumerate(cell_xfs.iter(NS + "xf")):
+            fmt_id = int(xf.get("numFmtId", 0))
+            fmt = custom[fmt_id] if fmt_id in custom else builtin_format_code(fmt_id)
+            if fmt is None:
+                continue
+            if is_date_format(fmt):
+                date_styles.add(idx)
+            if is_timedelta_format(fmt):
+                timedelta_styles.add(idx)
+        return date_styles, timedelta_styles
+
+    def _convert(self, element):
+        kind = element.get("t", "n")
+        if kind == "inlineStr":
+            child = element.find(INLINE_STRING_TAG)
+            return _text_content(child) if child is not None else ""
+
+        value = element.findtext(VALUE_TAG) or None
+        if value is None:
+            return ""
+        if kind == "n":
+            number = float(value) if ("." in value or "E" in value or "e" in value) else int(value)
+            style = int(element.get("s") or 0)
+            if style in self.date_styles:
+                from openpyxl.utils.datetime import from_excel
+                try:
+                    return from_excel(number, self.epoch, timedelta=style in self.timedelta_styles)
+                except (OverflowError, ValueError):
+                    return np.nan
+            as_int = int(number)
+            return as_int if as_int == number else float(number)
+        if kind == "s":
+            return self.shared_strings[int(value)]
+        if kind == "b":
+            return bool(int(value))
+        if kind == "str":
+            return value
+        if kind == "d":
+            from openpyxl.utils.datetime import from_ISO8601
+            return from_ISO8601(value)
+        if kind == "e":
+            return np.nan
+        return value
+
+    def rows(self, sheet_name):
+        """
+        Stream the rows of a sheet as lists of converted values, trailing
+        empty cells trimmed. Missing rows come out as [] and missing cells as "".
+        """
+        row_number = 0
+        with self.archive.open(self.sheets[sheet_name]) as source:
+            for _, element in iterparse(source):
+                if element.tag != ROW_TAG:
+                    continue
+                r = element.get("r")
+                index = int(float(r)) if r else row_number + 1
+                while row_number + 1 < index:
+                    row_number += 1
+                    yield []
+                row_number = index
+
+                values = []
+                col = 0
+                for cell in element.iter(CELL_TAG):
+                    coordinate = cell.get("r")
+                    col = _column_index(coordinate) if coordinate else col + 1
+                    value = self._convert(cell)
+                    if value == "":
+                        continue
+                    if len(values) < col - 1:
+                        values.extend([""] * (col - 1 - len(values)))
+                    values.append(value)
+                element.clear()
+                yield values
@@ -2,16 +2,51 @@
 
 import { useState, useEffect } from 'react';
 import axios from 'axios';
-import { Play, Settings2, ArrowRight, Loader2, AlertCircle, Database, CheckCircle, Info } from 'lucide-react';
+import { Play, Settings2, ArrowRight, Loader2, AlertCircle, Database, CheckCircle, Info, XCircle, Grid3x3 } from 'lucide-react';
+
+const STAGE_LABELS: Record<string, string> = {
+    extract: 'Ekstraksi Transaksi',
+    encode: 'One-Hot Encoding',
+    mine: 'Frequent Itemset',
+    rules: 'Association Rules',
+    validate: 'Validasi Katalog',
+    grid: 'Grid Parameter',
+};
+
+// Grid for the tuning heatmap (one mining pass on the backend for all cells)
+const SWEEP_SUPPORTS = [0.01, 0.02, 0.03, 0.05, 0.08, 0.1, 0.15, 0.2];
+const SWEEP_CONFIDENCES = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9];
+// Rules fetched per /rules request
+const RULES_PAGE_SIZE = 100;
+
+type SweepCell = {
+    min_support: number;
+    min_confidence: number;
+    rules_count: number;
+    items_covered: number;
+    avg_lift: number | null;
+};
+
+const backendBase = () => typeof window !== 'undefined'
+    ? `http://${window.location.hostname}:8000`
+    : 'http://localhost:8000';
 
 export default function AnalysisPage() {
     const [minSupport, setMinSupport] = useState(0.05);
     const [minConfidence, setMinConfidence] = useState(0.5);
     const [loading, setLoading] = useState(false);
     const [rules, setRules] = useState<any[]>([]);
+    const [rulesCount, setRulesCount] = useState(0);
+    const [rulesPage, setRulesPage] = useState<{ generation: number, cursor: string | null } | null>(null);
+    const [loadingRules, setLoadingRules] = useState(false);
     const [error, setError] = useState('');
     const [searched, setSearched] = useState(false);
     const [dataStatus, setDataStatus] = useState<{ dataset_loaded: boolean, rows: number } | null>(null);
+    const [jobId, setJobId] = useState<string | null>(null);
+    const [progress, setProgress] = useState<{ stage: string | null, percent: number } | null>(null);
+    const [sweepCells, setSweepCells] = useState<SweepCell[]>([]);
+    const [sweeping, setSweeping] = useState(false);
+    const [limitsNote, setLimitsNote] = useState('');
 
     useEffect(() => {
         const checkStatus = async () => {
@@ -28,27 +63,96 @@ export default function AnalysisPage() {
         checkStatus();
     }, []);
 
+    // Rules come from /rules a page at a time (strongest lift first), not from the analysis result
+    const loadRules = async (generation: number, cursor: string | null) => {
+        setLoadingRules(true);
+        try {
+            const response = await axios.get(`${backendBase()}/rules`, {
+                params: { generation, sort: 'lift', limit: RULES_PAGE_SIZE, ...(cursor ? { cursor } : {}) }
+            });
+            setRules((previous) => cursor ? [...previous, ...response.data.rules] : response.data.rules);
+            setRulesPage({ generation, cursor: response.data.next_cursor });
+        } finally {
+            setLoadingRules(false);
+        }
+    };
+
     const runAnalysis = async () => {
         setLoading(true);
         setError('');
         setSearched(false);
+        setLimitsNote('');
+        setProgress({ stage: null, percent: 0 });
         try {
-            const backendUrl = typeof window !== 'undefined'
-                ? `http://${window.location.hostname}:8000/analyze`
-                : 'http://localhost:8000/analyze';
-
-            const response = await axios.post(backendUrl, {
+            // Mining runs as a background job: submit, poll progress, then page through the rules
+            const submitted = await axios.post(`${backendBase()}/analyze`, {
                 min_support: minSupport,
                 min_confidence: minConfidence
             });
-            setRules(response.data.rules || []);
-            setSearched(true);
+            const id = submitted.data.job_id;
+            setJobId(id);
+
+            let status = submitted.data;
+            while (!['completed', 'failed', 'cancelled'].includes(status.status)) {
+                await new Promise((resolve) => setTimeout(resolve, 500));
+                const response = await axios.get(`${backendBase()}/analyze/${id}`);
+                status = response.data;
+                setProgress({ stage: status.stage, percent: status.percent });
+            }
+
+            if (status.status === 'completed') {
+                const result = await axios.get(`${backendBase()}/analyze/${id}/result`);
+                setRulesCount(result.data.rules_count);
+                await loadRules(result.data.generation, null);
+                // The server caps runs that would exceed its mining budget and says which limit applied
+                const limits = result.data.limits;
+                if (limits?.applied?.length) {
+                    setLimitsNote(`Batas diterapkan (${limits.applied.join(', ')}): min support ${limits.min_support}, panjang itemset maks ${limits.max_len ?? '-'}.`);
+                }
+                setSearched(true);
+            } else if (status.status === 'failed') {
+                setError(status.error || 'Analysis failed.');
+            } else {
+                setError('Analisis dibatalkan.');
+            }
         } catch (err: any) {
             const msg = err.response?.data?.detail || 'Analysis failed. Make sure you have uploaded data.';
             setError(msg);
             console.error(err);
         } finally {
             setLoading(false);
+            setJobId(null);
+            setProgress(null);
+        }
+    };
+
+    const runSweep = async () => {
+        setSweeping(true);
+        setError('');
+        try {
+            const response = await axios.post(`${backendBase()}/analyze/sweep`, {
+                supports: SWEEP_SUPPORTS,
+                confidences: SWEEP_CONFIDENCES
+            });
+            setSweepCells(response.data.cells || []);
+        } catch (err: any) {
+            setError(err.response?.data?.detail || 'Parameter sweep failed.');
+            console.error(err);
+        } finally {
+            setSweeping(false);
+        }
+    };
+
+    const sweepCell = (support: number, confidence: number) =>
+        sweepCells.find((c) => c.min_support === support && c.min_confidence === confidence);
+    const maxSweepRules = Math.max(1, ...sweepCells.map((c) => c.rules_count));
+
+    const cancelAnalysis = async () => {
+        if (!jobId) return;
+        try {
+            await axios.post(`${backendBase()}/analyze/${jobId}/cancel`);
+        } catch (err) {
+            console.error("Failed to cancel analysis", err);
         }
     };
 
@@ -126,6 +230,41 @@ export default function AnalysisPage() {
                                 {loading ? <Loader2 className="animate-spin" /> : <Play size={18} fill="currentColor" />}
                                 {loading ? 'Start Mining' : 'Start Mining'}
                             </button>
+                            {loading && progress && (
+                                <div className="space-y-2">
+                                    <div className="flex justify-between text-xs text-slate-500 font-medium">
+                                        <span>{progress.stage ? STAGE_LABELS[progress.stage] || progress.stage : 'Menunggu antrian...'}</span>
+                                        <span>{Math.round(progress.percent)}%</span>
+                                    </div>
+                                    <div className="w-full h-2 bg-slate-100 rounded-full overflow-hidden">
+                                        <div
+                                            className="h-full bg-blue-600 transition-all duration-300"
+                                            style={{ width: `${progress.percent}%` }}
+                                        />
+                                    </div>
+                                    <button
+                                        onClick={cancelAnalysis}
+                                        className="w-full py-2 text-sm text-slate-500 hover:text-red-600 flex items-center justify-center gap-1 transition-colors"
+                                    >
+                                        <XCircle size={14} />
+                                        Batalkan
+                                    </button>
+                                </div>
+                            )}
+                            <button
+                                onClick={runSweep}
+                                disabled={loading || sweeping}
+                                className="w-full py-2 border border-slate-200 hover:bg-slate-50 text-slate-700 rounded-xl text-sm font-medium flex items-center justify-center gap-2 transition-all disabled:opacity-50"
+                            >
+                                {sweeping ? <Loader2 size={16} className="animate-spin" /> : <Grid3x3 size={16} />}
+                                Heatmap Parameter
+                            </button>
+                            {limitsNote && (
+                                <div className="p-3 bg-amber-50 text-amber-700 rounded-lg text-sm flex items-start gap-2 border border-amber-100">
+                                    <Info size={16} className="mt-0.5 shrink-0" />
+                                    {limitsNote}
+                                </div>
+                            )}
                             {error && (
                                 <div className="p-3 bg-red-50 text-red-600 rounded-lg text-sm flex items-start gap-2 border border-red-100">
                                     <AlertCircle size={16} className="mt-0.5 shrink-0" />
@@ -137,10 +276,52 @@ export default function AnalysisPage() {
                 </div>
 
                 {/* Results Panel */}
-                <div className="lg:col-span-2">
+                <div className="lg:col-span-2 space-y-8">
+                    {sweepCells.length > 0 && (
+                        <div className="bg-white p-6 rounded-2xl shadow-sm border border-slate-100">
+                            <h2 className="text-xl font-bold text-slate-900 mb-1">Heatmap Parameter</h2>
+                            <p className="text-sm text-slate-500 mb-4">Jumlah rules per kombinasi support (baris) dan confidence (kolom). Klik sel untuk memakai parameternya.</p>
+                            <div className="overflow-x-auto">
+                                <table className="text-xs text-center">
+                                    <thead>
+                                        <tr>
+                                            <th className="px-2 py-1 text-slate-400">sup \ conf</th>
+                                            {SWEEP_CONFIDENCES.map((c) => (
+                                                <th key={c} className="px-2 py-1 text-slate-500">{c}</th>
+                                            ))}
+                                        </tr>
+                                    </thead>
+                                    <tbody>
+                                        {SWEEP_SUPPORTS.map((s) => (
+                                            <tr key={s}>
+                                                <th className="px-2 py-1 text-slate-500">{s}</th>
+                                                {SWEEP_CONFIDENCES.map((c) => {
+                                                    const cell = sweepCell(s, c);
+                                                    const count = cell?.rules_count ?? 0;
+                                                    const selected = s === minSupport && c === minConfidence;
+                                                    return (
+                                                        <td key={c} className="p-0.5">
+                                                            <button
+                                                                onClick={() => { setMinSupport(s); setMinConfidence(c); }}
+                                                                title={cell ? `${count} rules, ${cell.items_covered} item${cell.avg_lift !== null ? `, avg lift ${cell.avg_lift}` : ''}` : ''}
+                                                                className={`w-12 h-8 rounded font-medium ${selected ? 'ring-2 ring-slate-900' : ''} ${count / maxSweepRules > 0.5 ? 'text-white' : 'text-slate-700'}`}
+                                                                style={{ backgroundColor: `rgba(37, 99, 235, ${count ? 0.1 + 0.9 * count / maxSweepRules : 0.03})` }}
+                                                            >
+                                                                {count}
+                                                            </button>
+                                                        </td>
+                                                    );
+                                                })}
+                                            </tr>
+                                        ))}
+                                    </tbody>
+                                </table>
+                            </div>
+                        </div>
+                    )}
                     {rules.length > 0 ? (
                         <div className="bg-white p-6 rounded-2xl shadow-sm border border-slate-100 animate-in fade-in slide-in-from-bottom-4">
-                            <h2 className="text-xl font-bold text-slate-900 mb-4">Generated Rules ({rules.length})</h2>
+                            <h2 className="text-xl font-bold text-slate-900 mb-4">Generated Rules ({rulesCount})</h2>
                             <div className="overflow-x-auto">
                                 <table className="w-full text-sm text-left">
                                     <thead className="text-xs text-slate-500 uppercase bg-slate-50">
@@ -174,6 +355,15 @@ export default function AnalysisPage() {
                                     </tbody>
                                 </table>
                             </div>
+                            {rulesPage?.cursor && (
+                                <button
+                                    onClick={() => loadRules(rulesPage.generation, rulesPage.cursor)}
+                                    disabled={loadingRules}
+                                    className="mt-4 w-full py-2 rounded-lg border border-slate-200 text-sm font-medium text-slate-600 hover:bg-slate-50 disabled:opacity-50"
+                                >
+                                    {loadingRules ? 'Memuat...' : `Tampilkan lebih banyak (${rules.length} dari ${rulesCount})`}
+                                </button>
+                            )}
                         </div>
                     ) : searched ? (
                         <div className="h-full min-h-[400px] flex flex-col items-center justify-center text-slate-400 border-2 border-dashed border-slate-200 rounded-2xl bg-slate-50/50 animate-in fade-in">
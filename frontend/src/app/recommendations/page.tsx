@@ -56,11 +56,11 @@ export default function RecommendationsPage() {
                 ? `http://${window.location.hostname}:8000`
                 : 'http://localhost:8000';
 
-            // Add timestamp as cache-buster
+            // The backend tags answers with the model version (ETag), so the browser
+            // may reuse a cached answer until the next analysis or catalog upload
             const response = await axios.get(`${backendUrl}/recommendations`, {
                 params: {
-                    service: query,
-                    _t: new Date().getTime()
+                    service: query
                 }
             });
 
@@ -39,15 +39,27 @@ try:
     }
     response = requests.post(f"{BASE_URL}/analyze", json=payload)
     print(f"   Status: {response.status_code}")
-    result = response.json()
+    job_id = response.json()["job_id"]
+    
+    # Analysis runs in the background: poll until the job finishes
+    import time
+    while True:
+        job = requests.get(f"{BASE_URL}/analyze/{job_id}").json()
+        print(f"   Progress: {job['percent']}% ({job['stage'] or job['status']})")
+        if job["status"] in ("completed", "failed", "cancelled"):
+            break
+        time.sleep(0.5)
+    
+    result = requests.get(f"{BASE_URL}/analyze/{job_id}/result").json()
     print(f"   Message: {result.get('message')}")
-    print(f"   Rules found: {len(result.get('rules', []))}")
+    print(f"   Rules found: {result.get('rules_count')}")
     print(f"   Items found: {len(result.get('items', []))}")
     
-    # Show first 5 rules
-    if result.get('rules'):
+    # Show the 5 strongest rules (the result is a summary; rules are paged from /rules)
+    if result.get('rules_count'):
+        top = requests.get(f"{BASE_URL}/rules", params={"generation": result['generation'], "sort": "lift", "limit": 5}).json()
         print("\n   Sample rules:")
-        for i, rule in enumerate(result['rules'][:5], 1):
+        for i, rule in enumerate(top['rules'], 1):
             print(f"   {i}. {rule['antecedents']} → {rule['consequents']} (confidence: {rule['confidence']:.2%})")
             
 except Exception as e:
@@ -57,16 +69,16 @@ except Exception as e:
 print("\n4. Testing recommendations...")
 test_queries = ["wedding", "prewedding", "pengajian", "engagement", "akad"]
 
-for query in test_queries:
-    try:
-        response = requests.get(f"{BASE_URL}/recommendations?service={query}")
-        result = response.json()
+try:
+    # One call for every query (shared keyword and rule lookups on the server)
+    response = requests.post(f"{BASE_URL}/recommendations/batch", json={"services": test_queries})
+    for result in response.json().get('results', []):
         recs = result.get('recommendations', [])
-        print(f"\n   Query: '{query}' → {len(recs)} recommendations")
+        print(f"\n   Query: '{result['service']}' → {len(recs)} recommendations")
         for rec in recs[:3]:
             print(f"      - {rec['item']} ({rec['confidence']})")
-    except Exception as e:
-        print(f"   Error for '{query}': {e}")
+except Exception as e:
+    print(f"   Error: {e}")
 
 print("\n" + "=" * 60)
 print("ANALYSIS COMPLETE!")